@@ -1,10 +1,25 @@
 #!/usr/bin/python3
 """Contains the blueprint for the API."""
 
-from flask import Blueprint
+from flask import Blueprint, Response, current_app, stream_with_context
 
 app_views = Blueprint("app_views", __name__, url_prefix="/api/v1")
 
+
+def jsonify_stream(objs):
+    """returns a response with the JSON array of the to_dict() of the
+    iterable objs, encoded and sent one object at a time, so a list of
+    any size never sits whole in memory"""
+    def generate():
+        """yields the array a piece at a time"""
+        separator = "["
+        for obj in objs:
+            yield separator + current_app.json.dumps(obj.to_dict())
+            separator = ","
+        yield "[]" if separator == "[" else "]"
+    return Response(stream_with_context(generate()),
+                    mimetype="application/json")
+
 # import storage engine and classes
 from models import storage
 from models.state import State
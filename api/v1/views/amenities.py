@@ -6,7 +6,7 @@ module: api/v1/views/amenities
 
 from flask import jsonify, abort, request
 from models import storage
-from . import app_views
+from . import app_views, jsonify_stream
 from models.amenity import Amenity
 
 
@@ -14,9 +14,7 @@ from models.amenity import Amenity
                  strict_slashes=False)
 def get_amenities():
     """Gets all Amenity objects. Return objects in JSON."""
-    amenities = storage.all(Amenity)
-    amenity_js = [amenity.to_dict() for amenity in amenities.values()]
-    return jsonify(amenity_js)
+    return jsonify_stream(storage.iter(Amenity))
 
 
 @app_views.route('/amenities/<amenity_id>', methods=['GET'],
@@ -36,8 +34,9 @@ def del_amenity(amenity_id):
     amenity = storage.get(Amenity, amenity_id)
     if amenity is None:
         abort(404)
-    storage.delete(amenity)
-    storage.save()
+    with storage.transaction():
+        storage.delete(amenity)
+        storage.save()
     return jsonify({}), 200
 
 
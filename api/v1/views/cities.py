@@ -24,7 +24,7 @@ def get_cities_by_state(state_id):
     Raises:
         NotFound: If the state_id is not linked to any State object.
     """
-    state = storage.get(State, state_id)
+    state = storage.get(State, state_id, with_related="cities")
     if not state:
         raise NotFound(description='State not found')
 
@@ -69,8 +69,9 @@ def delete_city(city_id):
     city = storage.get(City, city_id)
     if not city:
         raise NotFound(description='City not found')
-    city.delete()
-    storage.save()
+    with storage.transaction():
+        city.delete()
+        storage.save()
     return jsonify({}), 200
 
 
@@ -31,6 +31,13 @@ def stats():
         'states': State,
         'users': User
     }
+    counts = storage.counts()
     for key, value in objs.items():
-        objs[key] = storage.count(value)
+        objs[key] = counts.get(value.__name__, 0)
     return jsonify(objs)
+
+
+@app_views.route('/stats/storage', methods=['GET'])
+def storage_stats():
+    """Retrieves the counters kept by the storage engine."""
+    return jsonify(storage.metrics())
@@ -15,7 +15,7 @@ from models.place import Place
                  strict_slashes=False)
 def get_places(city_id):
     """Gets all Place objects in a City. Return objects in JSON."""
-    city = storage.get(City, city_id)
+    city = storage.get(City, city_id, with_related="places")
     if city is None:
         abort(404)
     places = [place.to_dict() for place in city.places]
@@ -38,8 +38,9 @@ def del_place(place_id):
     place = storage.get(Place, place_id)
     if place is None:
         abort(404)
-    storage.delete(place)
-    storage.save()
+    with storage.transaction():
+        storage.delete(place)
+        storage.save()
     return jsonify({}), 200
 
 
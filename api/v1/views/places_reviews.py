@@ -16,7 +16,7 @@ from models.user import User
                  strict_slashes=False)
 def reviews_places(place_id):
     """Gets a list of all Review obj of a Place. Return objects in JSON."""
-    place = storage.get(Place, place_id)
+    place = storage.get(Place, place_id, with_related="reviews")
     if place is None:
         abort(404)
     reviews = [review.to_dict() for review in place.reviews]
@@ -39,8 +39,9 @@ def del_review(review_id):
     review = storage.get(Review, review_id)
     if review is None:
         abort(404)
-    storage.delete(review)
-    storage.save()
+    with storage.transaction():
+        storage.delete(review)
+        storage.save()
     return jsonify({}), 200
 
 
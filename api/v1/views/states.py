@@ -6,15 +6,14 @@ module: api/v1/views/states
 
 from flask import jsonify, abort, request
 from models import storage
-from . import app_views
+from . import app_views, jsonify_stream
 from models.state import State
 
 
 @app_views.route('/states', methods=['GET'], strict_slashes=False)
 def get_states():
     """Gets all State objects. Return objects in JSON."""
-    states_js = [state.to_dict() for state in storage.all(State).values()]
-    return jsonify(states_js)
+    return jsonify_stream(storage.iter(State))
 
 
 @app_views.route('/states/<state_id>', methods=['GET'], strict_slashes=False)
@@ -33,8 +32,9 @@ def del_state(state_id):
     state = storage.get(State, state_id)
     if state is None:
         abort(404)
-    storage.delete(state)
-    storage.save()
+    with storage.transaction():
+        storage.delete(state)
+        storage.save()
     return jsonify({}), 200
 
 
@@ -6,7 +6,7 @@ module: api/v1/views/users
 
 from flask import jsonify, abort, request
 from models import storage
-from . import app_views
+from . import app_views, jsonify_stream
 from models.user import User
 
 
@@ -15,9 +15,7 @@ def get_users():
     """
        Gets all User objects. Return objects in JSON.
     """
-    users = storage.all(User)
-    user_js = [user.to_dict() for user in users.values()]
-    return jsonify(user_js)
+    return jsonify_stream(storage.iter(User))
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -39,8 +37,9 @@ def del_user(user_id):
     user = storage.get(User, user_id)
     if user is None:
         abort(404)
-    storage.delete(user)
-    storage.save()
+    with storage.transaction():
+        storage.delete(user)
+        storage.save()
     return jsonify({}), 200
 
 
@@ -0,0 +1,5 @@
+#!/usr/bin/python3
+"""
+Storage benchmarks, run from the repository root with
+python3 -m benchmarks.<name>
+"""
@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+"""
+Loads places into FileStorage and into DBStorage over SQLite, with
+new() and save() per place and with bulk_new(), then bulk_upserts a
+tenth of them again, each engine in a fresh interpreter
+
+usage: python3 -m benchmarks.bulk_load [places] [per-row sample]
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+places = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+sample = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+engines = {"file": {}, "sqlite": {"HBNB_TYPE_STORAGE": "sqlite"}}
+
+child = """
+import statistics, time, uuid
+import models
+from models.city import City
+from models.place import Place
+from models.state import State
+from models.user import User
+storage = models.storage
+state = State(name="s")
+city = City(name="c", state_id=state.id)
+user = User(email="e", password="p")
+for obj in (state, city, user):
+    storage.new(obj)
+storage.save()
+
+
+def rows(count, prefix):
+    for i in range(count):
+        yield {{"id": prefix + str(i), "name": "Place {{}}".format(i),
+               "city_id": city.id, "user_id": user.id,
+               "number_rooms": i % 5, "price_by_night": 100 + i % 50}}
+
+
+start = time.perf_counter()
+for row in rows({sample}, "one"):
+    storage.new(Place(**row))
+    storage.save()
+one = {sample} / (time.perf_counter() - start)
+start = time.perf_counter()
+timings = storage.bulk_new(rows({places}, "p"), Place, chunk_size=10000)
+bulk = time.perf_counter() - start
+start = time.perf_counter()
+upserts = storage.bulk_upsert(
+    ({{"id": "p" + str(i), "name": "renamed"}}
+     if models.storage_t != "db" else
+     {{"id": "p" + str(i), "name": "renamed", "city_id": city.id,
+      "user_id": user.id}} for i in range(0, {places}, 10)), Place,
+    chunk_size=10000)
+upsert = time.perf_counter() - start
+storage.close()
+assert storage.count(Place) == {places} + {sample}
+print(one, {places} / bulk, statistics.median(timings) * 1e3,
+      max(timings) * 1e3, len(upserts) and {places} / 10 / upsert)
+"""
+
+print("{} places, new()+save() measured on the first {}".format(
+    places, sample))
+print("{:>7} {:>17} {:>14} {:>14} {:>14} {:>15}".format(
+    "engine", "new+save (rows/s)", "bulk (rows/s)", "chunk p50 (ms)",
+    "chunk max (ms)", "upsert (rows/s)"))
+for engine, settings in engines.items():
+    tmp = tempfile.mkdtemp()
+    try:
+        env = dict(os.environ, PYTHONPATH=root,
+                   HBNB_SQLITE_PATH=os.path.join(tmp, "file.sqlite"),
+                   **settings)
+        if engine != "sqlite":
+            env.pop("HBNB_TYPE_STORAGE", None)
+        env.pop("HBNB_ENV", None)
+        out = subprocess.check_output(
+            [sys.executable, "-c", child.format(places=places,
+                                                sample=sample)],
+            cwd=tmp, env=env)
+        one, bulk, p50, worst, upsert = map(float, out.split())
+        print("{:>7} {:>17.0f} {:>14.0f} {:>14.1f} {:>14.1f} {:>15.0f}"
+              .format(engine, one, bulk, p50, worst, upsert))
+    finally:
+        shutil.rmtree(tmp)
@@ -0,0 +1,38 @@
+#!/usr/bin/python3
+"""
+Compares save time, reload time and file size of the FileStorage
+snapshot codecs (HBNB_FILE_FORMAT)
+
+usage: python3 -m benchmarks.codec_formats [objects]
+"""
+
+from benchmarks.utils import isolated_storage, populate
+from models.engine.codecs import codecs
+from models.engine.file_storage import FileStorage
+from models.place import Place
+import os
+import sys
+import time
+
+objects = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+print("{} Place objects".format(objects))
+print("{:>8} {:>10} {:>10} {:>10}".format("format", "save (s)",
+                                          "load (s)", "size (MB)"))
+for name, codec in codecs.items():
+    with isolated_storage(codec=codec) as storage:
+        populate(storage, Place, objects, name="Place", number_rooms=3,
+                 city_id="c", user_id="u", latitude=37.77)
+        start = time.perf_counter()
+        storage.save()
+        saved = time.perf_counter() - start
+        path = FileStorage._FileStorage__file_path
+        FileStorage._FileStorage__objects = {}
+        FileStorage._FileStorage__indexed = None
+        FileStorage._FileStorage__seen = {}
+        start = time.perf_counter()
+        storage.reload()
+        loaded = time.perf_counter() - start
+        assert storage.count(Place) == objects
+        print("{:>8} {:>10.2f} {:>10.2f} {:>10.1f}".format(
+            name, saved, loaded, os.path.getsize(path) / 1e6))
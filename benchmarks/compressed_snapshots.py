@@ -0,0 +1,51 @@
+#!/usr/bin/python3
+"""
+Compares save time, reload time and file size of the FileStorage
+snapshot codecs (HBNB_FILE_FORMAT) through each compression
+(HBNB_FILE_COMPRESSION) and level
+
+usage: python3 -m benchmarks.compressed_snapshots [objects]
+"""
+
+from benchmarks.utils import isolated_storage, populate
+from models.engine.codecs import codecs, compressions
+from models.engine.file_storage import FileStorage
+from models.place import Place
+import os
+import sys
+import time
+
+objects = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+levels = {None: [None], "gzip": [1, 6, 9], "zstd": [1, 3, 9, 19]}
+
+print("{} Place objects".format(objects))
+print("{:>8} {:>11} {:>6} {:>9} {:>9} {:>10}".format(
+    "format", "compression", "level", "save (s)", "load (s)", "size (MB)"))
+for name, codec in codecs.items():
+    for compression_name, levels_of in levels.items():
+        if compression_name is not None and \
+                compression_name not in compressions:
+            continue
+        for level in levels_of:
+            with isolated_storage(codec=codec,
+                                  compression=compressions.get(
+                                      compression_name),
+                                  compression_level=level) as storage:
+                populate(storage, Place, objects, name="Place",
+                         number_rooms=3, city_id="c", user_id="u",
+                         latitude=37.77)
+                start = time.perf_counter()
+                storage.save()
+                saved = time.perf_counter() - start
+                path = FileStorage._FileStorage__file_path
+                FileStorage._FileStorage__objects = {}
+                FileStorage._FileStorage__indexed = None
+                FileStorage._FileStorage__seen = {}
+                start = time.perf_counter()
+                storage.reload()
+                loaded = time.perf_counter() - start
+                assert storage.count(Place) == objects
+                print("{:>8} {:>11} {:>6} {:>9.2f} {:>9.2f} {:>10.2f}".format(
+                    name, compression_name or "none",
+                    "-" if level is None else level, saved, loaded,
+                    os.path.getsize(path) / 1e6))
@@ -0,0 +1,107 @@
+#!/usr/bin/python3
+"""
+Replays one read-heavy request trace on DBStorage over SQLite without
+and with the row cache (HBNB_DB_CACHE_SIZE), each in a fresh interpreter
+
+Each request reads a few places and their owners, skewed towards a set
+of popular ones, and ends with storage.close() like the API teardown;
+one request in 20 renames a place and saves.
+
+usage: python3 -m benchmarks.db_cache [places] [requests]
+"""
+
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+
+places = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+requests = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sizes = [0, 100, 1000, 20000]
+
+child = """
+import json, sys, time
+import models
+from models.city import City
+from models.place import Place
+from models.state import State
+from models.user import User
+storage = models.storage
+places, users = {places}, {places} // 10
+state = State(name="s")
+city = City(name="c", state_id=state.id)
+storage.new(state)
+storage.new(city)
+for i in range(users):
+    storage.new(User(id="u{{}}".format(i), email="e", password="p"))
+for i in range(places):
+    storage.new(Place(id="p{{}}".format(i), name="p", city_id=city.id,
+                      user_id="u{{}}".format(i % users)))
+storage.save()
+storage.close()
+with open(sys.argv[1]) as f:
+    trace = json.load(f)
+gets = []
+start = time.perf_counter()
+for reads, write in trace:
+    for i in reads:
+        t = time.perf_counter()
+        place = storage.get(Place, "p{{}}".format(i))
+        storage.get(User, place.user_id)
+        gets.append(time.perf_counter() - t)
+    if write is not None:
+        storage.get(Place, "p{{}}".format(write)).name = "renamed"
+        storage.save()
+    storage.close()
+elapsed = time.perf_counter() - start
+gets.sort()
+stats = storage.metrics()
+print(len(trace) / elapsed, sum(gets) / len(gets) * 1e6,
+      gets[len(gets) * 99 // 100] * 1e6, stats["identity_map_hits"],
+      stats.get("cache_hits", 0), stats.get("cache_misses", 0),
+      stats.get("cache_invalidations", 0))
+"""
+
+
+def trace():
+    """returns the requests: the places read and the one written"""
+    rng = random.Random(42)
+
+    def pick():
+        """a place, the low numbers far more often"""
+        return min(int(rng.paretovariate(1.2)) - 1, places - 1)
+    return [([pick() for i in range(rng.randint(1, 8))],
+             pick() if rng.random() < 0.05 else None)
+            for i in range(requests)]
+
+
+tmp = tempfile.mkdtemp()
+try:
+    path = os.path.join(tmp, "trace.json")
+    with open(path, "w") as f:
+        json.dump(trace(), f)
+    print("{} places, {} requests".format(places, requests))
+    print("{:>10} {:>7} {:>11} {:>11} {:>9} {:>9} {:>8} {:>13}".format(
+        "cache", "req/s", "get (us)", "p99 (us)", "identity", "hits",
+        "hit rate", "invalidations"))
+    for size in sizes:
+        db = os.path.join(tmp, "{}.sqlite".format(size))
+        env = dict(os.environ, PYTHONPATH=root, HBNB_TYPE_STORAGE="sqlite",
+                   HBNB_SQLITE_PATH=db, HBNB_DB_CACHE_SIZE=str(size))
+        env.pop("HBNB_ENV", None)
+        out = subprocess.check_output(
+            [sys.executable, "-c", child.format(places=places), path],
+            cwd=tmp, env=env)
+        rate, mean, p99, identity, hits, misses, invalidations = \
+            map(float, out.split())
+        lookups = hits + misses
+        print("{:>10} {:>7.0f} {:>11.1f} {:>11.1f} {:>9.0f} {:>9.0f} "
+              "{:>7.1f}% {:>13.0f}".format(
+                  size or "off", rate, mean, p99, identity, hits,
+                  100 * hits / lookups if lookups else 0, invalidations))
+finally:
+    shutil.rmtree(tmp)
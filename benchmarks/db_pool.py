@@ -0,0 +1,106 @@
+#!/usr/bin/python3
+"""
+Load test of the DBStorage connection pool settings (HBNB_MYSQL_POOL_*)
+on SQLite, standing in for MySQL: every new connection sleeps for the
+given handshake time, and each request ends with storage.close() like
+the API teardown
+
+usage: python3 -m benchmarks.db_pool [threads] [seconds] [handshake ms]
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+threads = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+handshake = float(sys.argv[3]) if len(sys.argv) > 3 else 5
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+settings = [("null", {"HBNB_MYSQL_POOL_CLASS": "null"}),
+            ("queue 5+10", {}),
+            ("queue 2+0", {"HBNB_MYSQL_POOL_SIZE": "2",
+                           "HBNB_MYSQL_POOL_MAX_OVERFLOW": "0",
+                           "HBNB_MYSQL_POOL_TIMEOUT": "1"}),
+            ("queue 32+0", {"HBNB_MYSQL_POOL_SIZE": "32",
+                            "HBNB_MYSQL_POOL_MAX_OVERFLOW": "0"}),
+            ("lifo 32+0", {"HBNB_MYSQL_POOL_CLASS": "lifo",
+                           "HBNB_MYSQL_POOL_SIZE": "32",
+                           "HBNB_MYSQL_POOL_MAX_OVERFLOW": "0"})]
+
+child = """
+import random, threading, time
+import models
+from sqlalchemy import event
+from models.state import State
+storage = models.storage
+ids = []
+for i in range(100):
+    state = State(name=str(i))
+    storage.new(state)
+    ids.append(state.id)
+storage.save()
+storage.close()
+engine = storage._DBStorage__engine
+engine.dispose()
+
+@event.listens_for(engine, "connect")
+def handshake(connection, record):
+    time.sleep({handshake} / 1000)
+
+latencies = []
+errors = [0]
+stop = time.perf_counter() + {seconds}
+
+def client():
+    while time.perf_counter() < stop:
+        start = time.perf_counter()
+        try:
+            storage.get(State, random.choice(ids))
+            storage.count(State)
+        except Exception:
+            errors[0] += 1
+        finally:
+            storage.close()
+        latencies.append(time.perf_counter() - start)
+        # bursts: some clients pause between requests
+        time.sleep(random.choice((0, 0, 0.002)))
+
+workers = [threading.Thread(target=client) for i in range({threads})]
+for worker in workers:
+    worker.start()
+for worker in workers:
+    worker.join()
+latencies.sort()
+stats = storage.metrics()
+print(len(latencies) / {seconds}, latencies[len(latencies) // 2] * 1e3,
+      latencies[len(latencies) * 99 // 100] * 1e3,
+      stats["checkout_wait_total"] / max(stats["checkouts"], 1) * 1e3,
+      stats["checkout_wait_max"] * 1e3, stats["in_use_max"],
+      stats["checkout_timeouts"], errors[0])
+"""
+
+print("{} threads, {} s, {} ms connection handshake".format(
+    threads, seconds, handshake))
+print("{:>11} {:>7} {:>8} {:>8} {:>10} {:>9} {:>7} {:>9} {:>7}".format(
+    "pool", "req/s", "p50 ms", "p99 ms", "wait avg", "wait max",
+    "in use", "timeouts", "errors"))
+for name, pool in settings:
+    tmp = tempfile.mkdtemp()
+    try:
+        env = dict(os.environ, PYTHONPATH=root, HBNB_TYPE_STORAGE="sqlite",
+                   HBNB_SQLITE_PATH=os.path.join(tmp, "file.sqlite"),
+                   **pool)
+        out = subprocess.check_output(
+            [sys.executable, "-c", child.format(
+                threads=threads, seconds=seconds, handshake=handshake)],
+            cwd=tmp, env=env)
+        rate, p50, p99, wait, wait_max, in_use, timeouts, errors = \
+            map(float, out.split())
+        print("{:>11} {:>7.0f} {:>8.2f} {:>8.2f} {:>10.2f} {:>9.2f} "
+              "{:>7.0f} {:>9.0f} {:>7.0f}".format(
+                  name, rate, p50, p99, wait, wait_max, in_use, timeouts,
+                  errors))
+    finally:
+        shutil.rmtree(tmp)
@@ -0,0 +1,32 @@
+#!/usr/bin/python3
+"""
+Measures FileStorage.save() after changing one State, in a store that
+also holds N users, with the single-file and the segment layouts
+
+usage: python3 -m benchmarks.dirty_saves [size ...]
+"""
+
+from benchmarks.utils import isolated_storage, per_call, populate
+from models.state import State
+from models.user import User
+import sys
+
+sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+saves = 20
+
+print("{:>10} {:>14} {:>15}".format("users", "file (ms)", "segments (ms)"))
+for size in sizes:
+    results = []
+    for layout in ("file", "segments"):
+        with isolated_storage(layout=layout) as storage:
+            populate(storage, User, size, email="a@b.c")
+            state = State(name="Ohio")
+            storage.new(state)
+            storage.save()
+
+            def rename():
+                """changes the state and saves the store"""
+                state.name = state.name[::-1]
+                storage.save()
+            results.append(per_call(rename, saves) / 1000)
+    print("{:>10} {:>14.3f} {:>15.3f}".format(size, *results))
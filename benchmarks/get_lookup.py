@@ -0,0 +1,24 @@
+#!/usr/bin/python3
+"""
+Measures FileStorage.get() latency as the number of stored objects grows
+
+usage: python3 -m benchmarks.get_lookup [size ...]
+"""
+
+from benchmarks.utils import isolated_objects, per_call, populate
+from models.state import State
+from models.user import User
+import random
+import sys
+
+sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000]
+calls = 100000
+
+print("{:>10} {:>12} {:>12}".format("objects", "hit (us)", "miss (us)"))
+for size in sizes:
+    with isolated_objects() as storage:
+        ids = populate(storage, User, size)
+        probe = random.choice(ids)
+        hit = per_call(lambda: storage.get(User, probe), calls)
+        miss = per_call(lambda: storage.get(State, probe), calls)
+        print("{:>10} {:>12.3f} {:>12.3f}".format(size, hit, miss))
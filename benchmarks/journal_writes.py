@@ -0,0 +1,27 @@
+#!/usr/bin/python3
+"""
+Compares the cost of one write (BaseModel.save) with the full-rewrite
+FileStorage against the journaled one, as the dataset grows
+
+usage: python3 -m benchmarks.journal_writes [size ...]
+"""
+
+from benchmarks.utils import isolated_storage, per_call, populate
+from models.review import Review
+import sys
+
+sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+writes = 50
+
+print("{:>10} {:>16} {:>16}".format("objects", "rewrite (ms)",
+                                    "journal (ms)"))
+for size in sizes:
+    results = []
+    for journal in (False, True):
+        with isolated_storage(journal=journal,
+                              journal_max=1024 * 1024 * 1024) as storage:
+            populate(storage, Review, size, text="a" * 100)
+            storage.save()
+            review = Review(text="new review")
+            results.append(per_call(review.save, writes) / 1000)
+    print("{:>10} {:>16.3f} {:>16.3f}".format(size, *results))
@@ -0,0 +1,59 @@
+#!/usr/bin/python3
+"""
+Compares startup time and resident memory of an eager and a lazy
+(HBNB_FILE_LAZY=1) FileStorage reload, each in a fresh interpreter
+
+usage: python3 -m benchmarks.lazy_reload [records]
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import uuid
+
+records = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# runs in the scratch directory, where importing models reloads file.json
+child = """
+import resource, time
+start = time.perf_counter()
+import models
+loaded = time.perf_counter() - start
+models.storage.count()
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print("{:.2f} {:.0f}".format(loaded, rss))
+"""
+
+tmp = tempfile.mkdtemp()
+try:
+    with open(os.path.join(tmp, "file.json"), "w") as f:
+        f.write("{")
+        for i in range(records):
+            id = str(uuid.uuid4())
+            f.write("{}{}: {}".format(", " if i else "",
+                                      json.dumps("Place." + id),
+                                      json.dumps({
+                                          "id": id, "__class__": "Place",
+                                          "created_at":
+                                          "2024-01-04T15:37:46.861415",
+                                          "updated_at":
+                                          "2024-01-04T15:37:46.861415",
+                                          "name": "Place {}".format(i),
+                                          "city_id": str(i % 100),
+                                          "user_id": str(i % 1000),
+                                          "number_rooms": i % 5})))
+        f.write("}")
+    print("{} records".format(records))
+    print("{:>6} {:>12} {:>14}".format("mode", "reload (s)", "max RSS (MB)"))
+    for mode, lazy in (("eager", "0"), ("lazy", "1")):
+        env = dict(os.environ, HBNB_FILE_LAZY=lazy, PYTHONPATH=root)
+        env.pop("HBNB_TYPE_STORAGE", None)
+        out = subprocess.check_output([sys.executable, "-c", child],
+                                      cwd=tmp, env=env)
+        print("{:>6} {:>12} {:>14}".format(mode, *out.decode().split()))
+finally:
+    shutil.rmtree(tmp)
@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+"""
+Starts 8 worker interpreters on the same dataset, once with FileStorage and
+once with MmapStorage (HBNB_TYPE_STORAGE=mmap), and reports their cold
+start, get() latency and total memory while all of them are up
+
+usage: python3 -m benchmarks.mmap_workers [records] [workers]
+"""
+
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import uuid
+from models.engine import mmap_storage
+
+records = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+workers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# runs in the scratch directory; prints its numbers, then stays up until
+# stdin closes so every worker is measured while the others are alive
+child = """
+import random, sys, time
+start = time.perf_counter()
+import models
+models.storage.get("Place", "warm-up")
+cold = time.perf_counter() - start
+ids = open("ids.txt").read().split()
+random.seed(0)
+calls = 10000
+start = time.perf_counter()
+for _ in range(calls):
+    models.storage.get("Place", random.choice(ids))
+get_us = (time.perf_counter() - start) / calls * 1e6
+mem = {}
+with open("/proc/self/smaps_rollup") as f:
+    for line in f:
+        fields = line.split()
+        if fields[0] in ("Rss:", "Pss:"):
+            mem[fields[0]] = int(fields[1]) / 1024
+print("{:.3f} {:.1f} {:.0f} {:.0f}".format(cold, get_us, mem["Rss:"],
+                                           mem["Pss:"]), flush=True)
+sys.stdin.read()
+"""
+
+tmp = tempfile.mkdtemp()
+try:
+    ids = [str(uuid.uuid4()) for _ in range(records)]
+    with open(os.path.join(tmp, "file.json"), "w") as f:
+        f.write("{")
+        for i, id in enumerate(ids):
+            f.write("{}{}: {}".format(", " if i else "",
+                                      json.dumps("Place." + id),
+                                      json.dumps({
+                                          "id": id, "__class__": "Place",
+                                          "created_at":
+                                          "2024-01-04T15:37:46.861415",
+                                          "updated_at":
+                                          "2024-01-04T15:37:46.861415",
+                                          "name": "Place {}".format(i),
+                                          "city_id": str(i % 100),
+                                          "user_id": str(i % 1000),
+                                          "number_rooms": i % 5})))
+        f.write("}")
+    random.seed(0)
+    with open(os.path.join(tmp, "ids.txt"), "w") as f:
+        f.write("\n".join(random.sample(ids, min(1000, records))))
+    mmap_storage.convert(os.path.join(tmp, "file.json"),
+                         os.path.join(tmp, "file.mmap"))
+    print("{} records, {} workers".format(records, workers))
+    print("{:>6} {:>14} {:>10} {:>15} {:>15}".format(
+        "engine", "cold start (s)", "get (us)", "total RSS (MB)",
+        "total PSS (MB)"))
+    for engine in ("file", "mmap"):
+        env = dict(os.environ, PYTHONPATH=root, HBNB_TYPE_STORAGE=engine)
+        procs = [subprocess.Popen([sys.executable, "-c", child], cwd=tmp,
+                                  env=env, stdin=subprocess.PIPE,
+                                  stdout=subprocess.PIPE)
+                 for _ in range(workers)]
+        rows = [[float(x) for x in p.stdout.readline().split()]
+                for p in procs]
+        for p in procs:
+            p.stdin.close()
+            p.wait()
+        print("{:>6} {:>14.3f} {:>10.1f} {:>15.0f} {:>15.0f}".format(
+            engine, sum(r[0] for r in rows) / workers,
+            sum(r[1] for r in rows) / workers,
+            sum(r[2] for r in rows), sum(r[3] for r in rows)))
+finally:
+    shutil.rmtree(tmp)
@@ -0,0 +1,68 @@
+#!/usr/bin/python3
+"""
+Times a FileStorage reload of a JSON snapshot with 1 to N processes
+(HBNB_FILE_LOAD_PROCESSES), each in a fresh interpreter
+
+usage: python3 -m benchmarks.parallel_reload [records] [max processes]
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import uuid
+from models.engine.codecs import dump_json
+
+records = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+most = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# runs in the scratch directory, where importing models reloads file.json
+child = """
+import time
+start = time.perf_counter()
+import models
+loaded = time.perf_counter() - start
+print("{:.2f} {}".format(loaded, models.storage.count()))
+"""
+
+
+def places():
+    """yields the (key, record) pairs of the snapshot"""
+    for i in range(records):
+        id = str(uuid.uuid4())
+        yield "Place." + id, {"id": id, "__class__": "Place",
+                              "created_at": "2024-01-04T15:37:46.861415",
+                              "updated_at": "2024-01-04T15:37:46.861415",
+                              "name": "Place {}".format(i),
+                              "city_id": str(i % 100),
+                              "user_id": str(i % 1000),
+                              "number_rooms": i % 5}
+
+
+counts = [1]
+while counts[-1] * 2 <= most:
+    counts.append(counts[-1] * 2)
+if counts[-1] != most:
+    counts.append(most)
+tmp = tempfile.mkdtemp()
+try:
+    with open(os.path.join(tmp, "file.json"), "w") as f:
+        dump_json(f, places())
+    print("{} records, {} cores".format(records, os.cpu_count()))
+    print("{:>9} {:>11} {:>8}".format("processes", "reload (s)", "speedup"))
+    base = None
+    for processes in counts:
+        env = dict(os.environ, HBNB_FILE_LOAD_PROCESSES=str(processes),
+                   PYTHONPATH=root)
+        env.pop("HBNB_TYPE_STORAGE", None)
+        out = subprocess.check_output([sys.executable, "-c", child],
+                                      cwd=tmp, env=env)
+        seconds, count = out.decode().split()
+        assert int(count) == records
+        base = base or float(seconds)
+        print("{:>9} {:>11} {:>7.2f}x".format(processes, seconds,
+                                              base / float(seconds)))
+finally:
+    shutil.rmtree(tmp)
@@ -0,0 +1,31 @@
+#!/usr/bin/python3
+"""
+Measures FileStorage.save() after changing one User in a store of N users
+split into 1 to 32 shards (HBNB_FILE_SHARDS)
+
+usage: python3 -m benchmarks.shard_saves [users]
+"""
+
+from benchmarks.utils import isolated_storage, per_call, populate
+from models.user import User
+import sys
+
+users = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+saves = 10
+
+print("{} users".format(users))
+print("{:>7} {:>10}".format("shards", "save (ms)"))
+for shards in (1, 2, 4, 8, 16, 32):
+    with isolated_storage(layout="segments", shards=shards) as storage:
+        populate(storage, User, users, email="a@b.c")
+        storage.save()
+        user = User(email="a@b.c")
+        storage.new(user)
+        storage.save()
+
+        def rename():
+            """changes the user and saves the store"""
+            user.first_name = (user.__dict__.get("first_name") or "ab")[::-1]
+            storage.save()
+        print("{:>7} {:>10.1f}".format(shards, per_call(rename, saves) /
+                                       1000))
@@ -0,0 +1,87 @@
+#!/usr/bin/python3
+"""
+Runs 1, 4 and 8 writer processes saving new States on the same files for
+a few seconds, next to a reader process calling reload() every 10 ms, with
+the default single-writer files and with HBNB_FILE_SHARED=1. Reports the
+saves per second, the saves lost to other writers, the reloads that hit a
+half-written file and how long a save took to become visible to the
+reader (its staleness window)
+
+usage: python3 -m benchmarks.shared_processes [seconds]
+"""
+
+from benchmarks.utils import isolated_storage
+from models.state import State
+import multiprocessing
+import sys
+import time
+
+seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+
+def writer(stop, saves):
+    """saves States named after their save time until stop"""
+    count = 0
+    while time.time() < stop:
+        State(name=repr(time.time())).save()
+        count += 1
+    saves.put(count)
+
+
+def reader(storage, stop, lags):
+    """reloads every 10 ms and reports how old each new State was"""
+    seen = set()
+    found = []
+    errors = 0
+    while time.time() < stop + 0.5:
+        try:
+            storage.reload()
+        except ValueError:
+            errors += 1
+        now = time.time()
+        for key, state in storage.all(State).items():
+            if key not in seen:
+                seen.add(key)
+                found.append(now - float(state.name))
+        time.sleep(0.01)
+    lags.put((sorted(found), errors))
+
+
+def percentile(values, p):
+    """returns the p-th percentile of sorted values, in ms"""
+    if not values:
+        return float("nan")
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+
+context = multiprocessing.get_context("fork")
+print("{:g} s per run, reader reloading every 10 ms".format(seconds))
+print("{:>7} {:>8} {:>8} {:>7} {:>7} {:>11} {:>11} {:>11}".format(
+    "mode", "writers", "save/s", "lost", "errors", "stale p50",
+    "stale p99", "stale max"))
+for writers in (1, 4, 8):
+    for mode in ("file", "shared"):
+        with isolated_storage(shared=mode == "shared",
+                              journal=mode == "shared",
+                              lock_file=None) as storage:
+            storage.save()
+            stop = time.time() + seconds
+            saves, lags = context.Queue(), context.Queue()
+            procs = [context.Process(target=writer, args=(stop, saves))
+                     for _ in range(writers)]
+            procs.append(context.Process(target=reader,
+                                         args=(storage, stop, lags)))
+            for proc in procs:
+                proc.start()
+            total = sum(saves.get() for _ in range(writers))
+            found, errors = lags.get()
+            for proc in procs:
+                proc.join()
+            storage.reload()
+            lost = total - storage.count(State)
+            print("{:>7} {:>8} {:>8.0f} {:>7} {:>7} {:>9.1f}ms {:>9.1f}ms "
+                  "{:>9.1f}ms".format(mode, writers, total / seconds,
+                                      lost, errors,
+                                      percentile(found, 0.5),
+                                      percentile(found, 0.99),
+                                      percentile(found, 1)))
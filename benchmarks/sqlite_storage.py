@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+"""
+Runs the same workloads on FileStorage (plain and journaled) and on
+DBStorage over SQLite (HBNB_TYPE_STORAGE=sqlite), each engine in fresh
+interpreters
+
+usage: python3 -m benchmarks.sqlite_storage [users]
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+users = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+engines = {"file": {},
+           "journal": {"HBNB_FILE_JOURNAL": "1"},
+           "sqlite": {"HBNB_TYPE_STORAGE": "sqlite"}}
+
+# fills an empty store with users, then times single saves, get(),
+# all(cls) and count(cls)
+load = """
+import random, sys, time
+import models
+from models.state import State
+from models.user import User
+storage = models.storage
+start = time.perf_counter()
+ids = []
+for i in range({users}):
+    user = User(email="{{}}@mail.com".format(i), password="pwd")
+    storage.new(user)
+    ids.append(user.id)
+storage.save()
+seed = time.perf_counter() - start
+start = time.perf_counter()
+for i in range(50):
+    storage.new(State(name=str(i)))
+    storage.save()
+saves = (time.perf_counter() - start) / 50 * 1e3
+storage.close()
+picks = [random.choice(ids) for i in range(2000)]
+start = time.perf_counter()
+for id in picks:
+    storage.get(User, id)
+gets = (time.perf_counter() - start) / len(picks) * 1e6
+storage.close()
+start = time.perf_counter()
+storage.all(User)
+scan = time.perf_counter() - start
+start = time.perf_counter()
+storage.count(User)
+count = (time.perf_counter() - start) * 1e3
+print(seed, saves, gets, scan, count)
+"""
+
+# a second process: how long until the store is ready
+start = """
+import time
+start = time.perf_counter()
+import models
+print(time.perf_counter() - start)
+"""
+
+print("{} users".format(users))
+print("{:>8} {:>9} {:>10} {:>9} {:>12} {:>11} {:>11}".format(
+    "engine", "seed (s)", "save (ms)", "get (us)", "all(cls) (s)",
+    "count (ms)", "startup (s)"))
+for engine, settings in engines.items():
+    tmp = tempfile.mkdtemp()
+    try:
+        env = dict(os.environ, PYTHONPATH=root,
+                   HBNB_SQLITE_PATH=os.path.join(tmp, "file.sqlite"),
+                   **settings)
+        if engine != "sqlite":
+            env.pop("HBNB_TYPE_STORAGE", None)
+        out = subprocess.check_output(
+            [sys.executable, "-c", load.format(users=users)], cwd=tmp,
+            env=env)
+        seed, saves, gets, scan, count = map(float, out.split())
+        ready = float(subprocess.check_output([sys.executable, "-c", start],
+                                              cwd=tmp, env=env))
+        print("{:>8} {:>9.2f} {:>10.2f} {:>9.1f} {:>12.2f} {:>11.2f} "
+              "{:>11.2f}".format(engine, seed, saves, gets, scan, count,
+                                 ready))
+    finally:
+        shutil.rmtree(tmp)
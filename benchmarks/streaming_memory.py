@@ -0,0 +1,112 @@
+#!/usr/bin/python3
+"""
+Compares the peak RSS of loading and saving N objects with the old
+whole-document json.load / json.dump path and the streaming path,
+each in a fresh interpreter
+
+usage: python3 -m benchmarks.streaming_memory [objects]
+"""
+
+import os
+import subprocess
+import sys
+
+objects = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+setup = """
+import json, os, resource, sys, tempfile, time
+from models.engine import file_storage
+from models.engine.file_storage import FileStorage
+from models.place import Place
+FileStorage._FileStorage__objects = {}
+FileStorage._FileStorage__indexed = None
+path = os.path.join(sys.argv[2], "file.json")
+FileStorage._FileStorage__file_path = path
+storage = FileStorage()
+def peak():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+"""
+
+children = {
+    "create": """
+for i in range(int(sys.argv[1])):
+    storage.new(Place(name="Place", city_id=str(i % 100),
+                      user_id=str(i % 1000), number_rooms=i % 5))
+storage.save()
+""",
+    "save json.dump": """
+for i in range(int(sys.argv[1])):
+    storage.new(Place(name="Place", city_id=str(i % 100),
+                      user_id=str(i % 1000), number_rooms=i % 5))
+before = peak()
+start = time.perf_counter()
+json_objects = {}
+for key, obj in storage.all().items():
+    json_objects[key] = obj.to_dict()
+with open(path + ".old", "w") as f:
+    json.dump(json_objects, f)
+print(time.perf_counter() - start, peak() - before)
+""",
+    "save streaming": """
+for i in range(int(sys.argv[1])):
+    storage.new(Place(name="Place", city_id=str(i % 100),
+                      user_id=str(i % 1000), number_rooms=i % 5))
+before = peak()
+start = time.perf_counter()
+storage.save()
+print(time.perf_counter() - start, peak() - before)
+""",
+    "load json.load": """
+before = peak()
+start = time.perf_counter()
+with open(path) as f:
+    jo = json.load(f)
+for key in jo:
+    storage.new(file_storage.classes[jo[key]["__class__"]](**jo[key]))
+print(time.perf_counter() - start, peak() - before)
+""",
+    "load streaming": """
+before = peak()
+start = time.perf_counter()
+storage.reload()
+print(time.perf_counter() - start, peak() - before)
+""",
+    "load streaming lazy": """
+FileStorage._FileStorage__lazy = True
+before = peak()
+start = time.perf_counter()
+storage.reload()
+print(time.perf_counter() - start, peak() - before)
+""",
+}
+
+
+def run(name, tmp):
+    """runs one child and returns its output"""
+    env = dict(os.environ, PYTHONPATH=root)
+    env.pop("HBNB_TYPE_STORAGE", None)
+    # an empty working directory, so importing models loads nothing
+    cwd = os.path.join(tmp, "cwd")
+    os.makedirs(cwd, exist_ok=True)
+    return subprocess.check_output(
+        [sys.executable, "-c", setup + children[name], str(objects), tmp],
+        cwd=cwd, env=env).decode().split()
+
+
+if __name__ == "__main__":
+    import tempfile
+    import shutil
+    tmp = tempfile.mkdtemp()
+    try:
+        run("create", tmp)
+        print("{} Place objects".format(objects))
+        print("{:>20} {:>10} {:>18}".format("path", "time (s)",
+                                            "peak RSS +MB"))
+        for name in children:
+            if name != "create":
+                elapsed, rss = run(name, tmp)
+                print("{:>20} {:>10.2f} {:>18.0f}".format(
+                    name, float(elapsed), float(rss)))
+    finally:
+        shutil.rmtree(tmp)
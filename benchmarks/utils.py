@@ -0,0 +1,80 @@
+#!/usr/bin/python3
+"""
+Helpers shared by the storage benchmarks
+"""
+
+from contextlib import contextmanager
+from models.engine.codecs import extension_of
+from models.engine.file_storage import FileStorage
+import os
+import shutil
+import tempfile
+import time
+
+
+@contextmanager
+def isolated_objects():
+    """swaps FileStorage.__objects for an empty dict for the duration"""
+    save = FileStorage._FileStorage__objects
+    FileStorage._FileStorage__objects = {}
+    try:
+        yield FileStorage()
+    finally:
+        FileStorage._FileStorage__objects = save
+
+
+@contextmanager
+def isolated_storage(**options):
+    """an empty FileStorage persisting to a scratch directory
+
+    options are FileStorage settings without their underscores,
+    e.g. isolated_storage(journal=True)
+    """
+    tmp = tempfile.mkdtemp()
+    codec = options.get("codec", FileStorage._FileStorage__codec)
+    compression = options.get("compression",
+                              FileStorage._FileStorage__compression)
+    options["file_path"] = os.path.join(tmp, "file." + extension_of(
+        codec, compression))
+    options["objects"] = {}
+    options["dirty"] = set()
+    options["deleted"] = set()
+    options["indexed"] = None
+    options["rewrite_all"] = False
+    options["seen"] = {}
+    options["journal_offset"] = 0
+    options["raw"] = {}
+    options["raw_by_class"] = {}
+    options["by_segment"] = {}
+    options["raw_by_segment"] = {}
+    options["requested"] = 0
+    options["flushed"] = 0
+    save = {}
+    for name, value in options.items():
+        attr = "_FileStorage__" + name
+        save[attr] = getattr(FileStorage, attr)
+        setattr(FileStorage, attr, value)
+    try:
+        yield FileStorage()
+    finally:
+        for attr, value in save.items():
+            setattr(FileStorage, attr, value)
+        shutil.rmtree(tmp)
+
+
+def populate(storage, cls, n, **kwargs):
+    """adds n fresh instances of cls to storage, returns their ids"""
+    ids = []
+    for _ in range(n):
+        obj = cls(**kwargs)
+        storage.new(obj)
+        ids.append(obj.id)
+    return ids
+
+
+def per_call(func, calls):
+    """returns the mean wall time of func() in microseconds"""
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls * 1e6
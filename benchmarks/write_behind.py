@@ -0,0 +1,56 @@
+#!/usr/bin/python3
+"""
+Measures save() throughput of 1, 8 and 32 threads each creating and saving
+States in a store of N users, with synchronous saves and with write-behind
+(HBNB_FILE_WRITE_BEHIND=1); the write-behind time includes the final
+flush()
+
+usage: python3 -m benchmarks.write_behind [users] [seconds]
+"""
+
+from benchmarks.utils import isolated_storage, populate
+from models.state import State
+from models.user import User
+import sys
+import threading
+import time
+
+users = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+
+def run(storage, writers):
+    """returns the saves per second of writers threads"""
+    done = []
+    stop = time.perf_counter() + seconds
+
+    def writer():
+        """creates and saves States until the time is up"""
+        count = 0
+        while time.perf_counter() < stop:
+            State(name="Ohio").save()
+            count += 1
+        done.append(count)
+    start = time.perf_counter()
+    threads = [threading.Thread(target=writer) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    storage.flush()
+    return sum(done) / (time.perf_counter() - start)
+
+
+print("{} users, {:g} s per run".format(users, seconds))
+print("{:>8} {:>14} {:>20}".format("writers", "sync (save/s)",
+                                   "write-behind (save/s)"))
+for writers in (1, 8, 32):
+    results = []
+    for write_behind in (False, True):
+        with isolated_storage(write_behind=write_behind,
+                              flush_interval=0.2) as storage:
+            populate(storage, User, users, email="a@b.c")
+            storage.save()
+            storage.flush()
+            results.append(run(storage, writers))
+    print("{:>8} {:>14.0f} {:>20.0f}".format(writers, *results))
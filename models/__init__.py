@@ -7,10 +7,17 @@ from os import getenv
 
 
 storage_t = getenv("HBNB_TYPE_STORAGE")
+# "sqlite" keeps the SQLAlchemy models and DBStorage of "db", so the rest
+# of the code only tells "db" from the file engines
+if storage_t == "sqlite":
+    storage_t = "db"
 
 if storage_t == "db":
     from models.engine.db_storage import DBStorage
     storage = DBStorage()
+elif storage_t == "mmap":
+    from models.engine.mmap_storage import MmapStorage
+    storage = MmapStorage()
 else:
     from models.engine.file_storage import FileStorage
     storage = FileStorage()
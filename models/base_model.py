@@ -19,6 +19,13 @@ else:
     Base = object
 
 
+def mark_stored(obj):
+    """tells the __setattr__ hook of obj that a storage engine keeps it;
+    the models of DBStorage have neither the hook nor its flag"""
+    if models.storage_t != "db":
+        object.__setattr__(obj, "_stored", True)
+
+
 class BaseModel:
     """The BaseModel class from which future classes will be derived"""
     if models.storage_t == "db":
@@ -34,11 +41,11 @@ class BaseModel:
                     setattr(self, key, value)
             if kwargs.get("created_at", None) and type(self.created_at) is str:
                 self.created_at = datetime.strptime(kwargs["created_at"], time)
-            else:
+            elif type(kwargs.get("created_at", None)) is not datetime:
                 self.created_at = datetime.utcnow()
             if kwargs.get("updated_at", None) and type(self.updated_at) is str:
                 self.updated_at = datetime.strptime(kwargs["updated_at"], time)
-            else:
+            elif type(kwargs.get("updated_at", None)) is not datetime:
                 self.updated_at = datetime.utcnow()
             if kwargs.get("id", None) is None:
                 self.id = str(uuid.uuid4())
@@ -47,6 +54,26 @@ class BaseModel:
             self.created_at = datetime.utcnow()
             self.updated_at = self.created_at
 
+    if models.storage_t != "db":
+        # _stored is set by the storage once it keeps the object, outside
+        # __dict__ so that it never reaches to_dict() or the saved records
+        __slots__ = ("__dict__", "__weakref__", "_stored")
+
+        def __new__(cls, *args, **kwargs):
+            """creates an instance the storage does not keep yet"""
+            obj = object.__new__(cls)
+            object.__setattr__(obj, "_stored", False)
+            return obj
+
+        def __setattr__(self, name, value):
+            """sets an attribute and lets the storage follow the change"""
+            if not self._stored:
+                object.__setattr__(self, name, value)
+                return
+            old = getattr(self, name, None)
+            object.__setattr__(self, name, value)
+            models.storage.changed(self, name, old)
+
     def __str__(self):
         """String representation of the BaseModel class"""
         return "[{:s}] ({:s}) {}".format(self.__class__.__name__, self.id,
@@ -68,6 +95,11 @@ class BaseModel:
         new_dict["__class__"] = self.__class__.__name__
         if "_sa_instance_state" in new_dict:
             del new_dict["_sa_instance_state"]
+        mapper = getattr(self, "__mapper__", None)
+        if mapper is not None:
+            # loaded relationships are other objects, not attributes
+            for name in mapper.relationships.keys():
+                new_dict.pop(name, None)
         return new_dict
 
     def delete(self):
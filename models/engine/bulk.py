@@ -0,0 +1,86 @@
+#!/usr/bin/python3
+"""
+Contains the helpers the storage engines share for bulk_new() and
+bulk_upsert()
+"""
+
+from contextlib import nullcontext
+from datetime import datetime
+from itertools import islice
+from models.engine.codecs import native_record
+import time
+
+
+def chunks(items, size):
+    """yields the items of the iterable items in lists of up to size"""
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def split_item(item, cls=None):
+    """returns (class name, instance, attributes) of a bulk item: a model
+    instance and None, or None and a copy of a dict of attributes, as
+    to_dict() returns them but with datetime timestamps. A dict without
+    "__class__" is of class cls, a class or its name."""
+    if not isinstance(item, dict):
+        return item.__class__.__name__, item, None
+    attrs = native_record(item)
+    name = attrs.pop("__class__", None) or cls
+    if name is None:
+        raise ValueError("a bulk item has no __class__ and no cls is given")
+    if not isinstance(name, str):
+        name = name.__name__
+    return name, None, attrs
+
+
+def update(storage, obj, attrs):
+    """sets the attributes attrs of a bulk_upsert() dict on the stored
+    obj as DBStorage upserts a row: created_at is kept and updated_at is
+    the one of attrs, or now"""
+    attrs = dict(attrs)
+    attrs.pop("created_at", None)
+    if attrs.get("updated_at") is None:
+        attrs["updated_at"] = datetime.utcnow()
+    for name, value in attrs.items():
+        old = getattr(obj, name, None)
+        # reported to storage itself, which may not be models.storage
+        object.__setattr__(obj, name, value)
+        storage.changed(obj, name, old)
+
+
+def store(storage, items, cls, chunk_size, upsert, classes, build=None,
+          lock=None):
+    """bulk_new() and bulk_upsert() of the engines keeping objects in
+    memory: stores the items through storage.new(), or updates the stored
+    object of an upserted dict, a chunk at a time under the context
+    manager lock() returns, then saves once; returns the seconds each
+    chunk took, the save counted in the last one. build(name, attrs)
+    makes the object of a dict, classes[name](**attrs) by default."""
+    timings = []
+    for chunk in chunks(items, chunk_size):
+        start = time.perf_counter()
+        with lock() if lock is not None else nullcontext():
+            for item in chunk:
+                name, obj, attrs = split_item(item, cls)
+                if name not in classes:
+                    raise ValueError("unknown class: {}".format(name))
+                if obj is None:
+                    found = None
+                    if upsert and "id" in attrs:
+                        found = storage.get(name, attrs["id"])
+                    if found is not None:
+                        update(storage, found, attrs)
+                        continue
+                    obj = build(name, attrs) if build is not None else \
+                        classes[name](**attrs)
+                storage.new(obj)
+        timings.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    storage.save()
+    if timings:
+        timings[-1] += time.perf_counter() - start
+    return timings
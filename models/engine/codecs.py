@@ -0,0 +1,420 @@
+#!/usr/bin/python3
+"""
+Contains the record readers and writers (codecs) used by FileStorage
+"""
+
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import gzip
+import io
+import json
+import multiprocessing
+import os
+from models.base_model import time as time_format
+import pickle
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class JSONScanner:
+    """pulls JSON values off a text stream, one buffer chunk at a time"""
+
+    def __init__(self, f, chunk_size=1 << 16):
+        """scans the open text file f"""
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.decode = json.JSONDecoder().raw_decode
+
+    def fill(self):
+        """appends the next chunk to the unread part of the buffer"""
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """returns the next non-blank character, '' at the end of f"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def char(self, allowed):
+        """consumes the next non-blank character, one of allowed"""
+        c = self.peek()
+        if c == "" or c not in allowed:
+            raise ValueError("expected one of {!r}, found {!r}".format(
+                allowed, c))
+        self.pos += 1
+        return c
+
+    def value(self):
+        """consumes and returns the next JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, self.pos = self.decode(self.buf, self.pos)
+                return value
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+
+
+def iter_json(f, chunk_size=1 << 16):
+    """yields the (key, record) pairs of a JSON object one at a time, so
+    the whole object never has to be in memory"""
+    scanner = JSONScanner(f, chunk_size)
+    if scanner.peek() == "":
+        return
+    scanner.char("{")
+    if scanner.peek() == "}":
+        return
+    while True:
+        key = scanner.value()
+        scanner.char(":")
+        yield key, scanner.value()
+        if scanner.char(",}") == "}":
+            return
+
+
+def json_default(value):
+    """serializes the datetimes of native records like to_dict() does"""
+    if isinstance(value, datetime):
+        return value.strftime(time_format)
+    raise TypeError("{!r} is not JSON serializable".format(value))
+
+
+def dump_json(f, records):
+    """writes the (key, record) pairs as one JSON object, a record a line"""
+    separator = "\n"
+    f.write("{")
+    for key, record in records:
+        f.write(separator + json.dumps(key) + ": " +
+                json.dumps(record, default=json_default))
+        separator = ",\n"
+    f.write("\n}\n")
+
+
+def json_chunks(path, count):
+    """splits the JSON file at path, as written by dump_json, into at most
+    count (start, end) byte ranges of whole lines; None if the file is not
+    laid out a record a line"""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        if f.read(2) != b"{\n":
+            return None
+        bounds = [2]
+        for i in range(1, count):
+            f.seek(max(size * i // count, bounds[-1]))
+            f.readline()
+            if f.tell() >= size:
+                break
+            if f.tell() > bounds[-1]:
+                bounds.append(f.tell())
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def load_json_chunk(path, start, end):
+    """returns the (key, class name, attributes) triples of the records
+    between start and end, a range from json_chunks(), with datetime
+    timestamps"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        lines = f.read(end - start).split(b"\n")
+    body = b",".join(line.rstrip(b",") for line in lines
+                     if line not in (b"", b"}"))
+    triples = []
+    for key, record in json.loads(b"{" + body + b"}").items():
+        name = record.pop("__class__")
+        for attr in ("created_at", "updated_at"):
+            if type(record.get(attr)) is str:
+                record[attr] = datetime.strptime(record[attr], time_format)
+        triples.append((key, name, record))
+    return triples
+
+
+def send_json_chunks(chunks, connection):
+    """sends load_json_chunk() of each (path, start, end) of chunks down
+    connection, or the exception that stopped it"""
+    try:
+        for chunk in chunks:
+            connection.send(load_json_chunk(*chunk))
+    except ValueError as e:
+        # a JSONDecodeError cannot be unpickled
+        connection.send(ValueError(str(e)))
+    except Exception as e:
+        connection.send(e)
+    connection.close()
+
+
+def load_json_chunks(chunks, processes):
+    """yields load_json_chunk() of each (path, start, end) of chunks, in
+    order, decoded by up to processes forked processes
+
+    Each process is handed its chunks when it is forked. A
+    ProcessPoolExecutor would pickle the function by name instead, which
+    imports models, and that deadlocks while models is still being
+    imported (its storage reloads at import time). Call it only while
+    this is the one thread of the process: a child forked while another
+    thread holds a lock starts with that lock held.
+    """
+    context = multiprocessing.get_context("fork")
+    workers = []
+    for i in range(min(processes, len(chunks))):
+        receiver, sender = context.Pipe(False)
+        worker = context.Process(target=send_json_chunks,
+                                 args=(chunks[i::processes], sender),
+                                 daemon=True)
+        worker.start()
+        sender.close()
+        workers.append((worker, receiver))
+    try:
+        for i in range(len(chunks)):
+            triples = workers[i % len(workers)][1].recv()
+            if isinstance(triples, Exception):
+                raise triples
+            yield triples
+    finally:
+        for worker, receiver in workers:
+            receiver.close()
+            worker.join()
+
+
+class JSONCodec:
+    """one JSON object, timestamps as ISO strings (the default)"""
+    name = "json"
+    extension = "json"
+    binary = False
+    native = False
+
+    def dump(self, f, records):
+        """writes the (key, record) pairs to the open file f"""
+        dump_json(f, records)
+
+    def load(self, f):
+        """yields the (key, record) pairs of the open file f"""
+        return iter_json(f)
+
+
+class PickleCodec:
+    """batches of records pickled with protocol 5, datetimes kept native"""
+    name = "pickle"
+    extension = "pickle"
+    binary = True
+    native = True
+    batch_size = 1024
+
+    def dump(self, f, records):
+        """writes the (key, record) pairs to the open file f"""
+        pickler = pickle.Pickler(f, protocol=5)
+        batch = []
+        for item in records:
+            batch.append(item)
+            if len(batch) == self.batch_size:
+                pickler.dump(batch)
+                pickler.clear_memo()
+                batch = []
+        if batch:
+            pickler.dump(batch)
+
+    def load(self, f):
+        """yields the (key, record) pairs of the open file f"""
+        unpickler = pickle.Unpickler(f)
+        while True:
+            try:
+                batch = unpickler.load()
+            except EOFError:
+                return
+            yield from batch
+
+
+class MsgpackCodec:
+    """one msgpack [key, record] array per record, datetimes as msgpack
+    timestamps (needs the msgpack package)"""
+    name = "msgpack"
+    extension = "msgpack"
+    binary = True
+    native = True
+
+    def default(self, value):
+        """packs the naive UTC datetimes of native records"""
+        if isinstance(value, datetime):
+            value = value.replace(tzinfo=timezone.utc)
+            return msgpack.Timestamp.from_datetime(value)
+        raise TypeError("{!r} is not msgpack serializable".format(value))
+
+    def dump(self, f, records):
+        """writes the (key, record) pairs to the open file f"""
+        packer = msgpack.Packer(default=self.default)
+        for key, record in records:
+            f.write(packer.pack((key, record)))
+
+    def load(self, f):
+        """yields the (key, record) pairs of the open file f"""
+        for key, record in msgpack.Unpacker(f, raw=False, timestamp=3):
+            for name, value in record.items():
+                if type(value) is datetime:
+                    record[name] = value.replace(tzinfo=None)
+            yield key, record
+
+
+codecs = {"json": JSONCodec(), "pickle": PickleCodec()}
+if msgpack is not None:
+    codecs["msgpack"] = MsgpackCodec()
+
+
+def get_codec(name):
+    """returns the codec called name, or raises ValueError"""
+    if name not in codecs:
+        raise ValueError("unknown or unavailable storage format: {}".format(
+            name))
+    return codecs[name]
+
+
+class GzipCompression:
+    """gzip streams, from the standard library"""
+    name = "gzip"
+    extension = "gz"
+    level = 6
+
+    def reader(self, f):
+        """returns a binary stream decompressing the open binary file f"""
+        return gzip.GzipFile(filename="", mode="rb", fileobj=f)
+
+    def writer(self, f, level=None):
+        """returns a binary stream compressing into the open binary file f,
+        which it leaves open when closed"""
+        level = self.level if level is None else level
+        return gzip.GzipFile(filename="", mode="wb", fileobj=f, mtime=0,
+                             compresslevel=level)
+
+
+class ZstdCompression:
+    """zstandard streams (needs the zstandard package)"""
+    name = "zstd"
+    extension = "zst"
+    level = 3
+
+    def reader(self, f):
+        """returns a binary stream decompressing the open binary file f"""
+        # buffered, for the readline() of pickle
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(
+            f, closefd=False))
+
+    def writer(self, f, level=None):
+        """returns a binary stream compressing into the open binary file f,
+        which it leaves open when closed"""
+        level = self.level if level is None else level
+        return zstandard.ZstdCompressor(level=level).stream_writer(
+            f, closefd=False)
+
+
+compressions = {"gzip": GzipCompression()}
+if zstandard is not None:
+    compressions["zstd"] = ZstdCompression()
+
+
+def get_compression(name):
+    """returns the compression called name, None for "none" or no name,
+    or raises ValueError"""
+    if not name or name == "none":
+        return None
+    if name not in compressions:
+        raise ValueError("unknown or unavailable compression: {}".format(
+            name))
+    return compressions[name]
+
+
+def extension_of(codec, compression=None):
+    """returns the extension of snapshot files in codec and compression"""
+    if compression is None:
+        return codec.extension
+    return codec.extension + "." + compression.extension
+
+
+def compression_for_path(path):
+    """returns the compression whose extension ends path, or None"""
+    for compression in compressions.values():
+        if path.endswith("." + compression.extension):
+            return compression
+    return None
+
+
+def codec_for_path(path):
+    """returns the codec whose extension ends path, before any compression
+    extension, JSON by default"""
+    compression = compression_for_path(path)
+    if compression is not None:
+        path = path[:-len(compression.extension) - 1]
+    for codec in codecs.values():
+        if path.endswith("." + codec.extension):
+            return codec
+    return codecs["json"]
+
+
+@contextmanager
+def open_snapshot(path, mode, codec, compression=None, level=None,
+                  sync=False):
+    """opens the snapshot file path for reading ("r") or writing ("w") as
+    codec expects it, streaming through compression if given; sync makes
+    a write reach the disk before the file is closed"""
+    with open(path, mode + "b") as raw:
+        stream = raw
+        if compression is not None and mode == "r":
+            stream = compression.reader(raw)
+        elif compression is not None:
+            stream = compression.writer(raw, level)
+        f = stream if codec.binary else io.TextIOWrapper(stream, "utf-8")
+        try:
+            yield f
+        finally:
+            if f is not stream:
+                f.detach()
+            if stream is not raw:
+                # ends the compressed stream, raw stays open
+                stream.close()
+        if sync:
+            raw.flush()
+            os.fsync(raw.fileno())
+
+
+def native_record(record):
+    """returns a copy of a to_dict() record with datetime timestamps"""
+    record = dict(record)
+    for name in ("created_at", "updated_at"):
+        if type(record.get(name)) is str:
+            record[name] = datetime.strptime(record[name], time_format)
+    return record
+
+
+def convert(src, dst):
+    """rewrites the snapshot file src as dst, codecs and compressions
+    picked by extension; returns the number of records"""
+    reader = codec_for_path(src)
+    writer = codec_for_path(dst)
+    count = [0]
+
+    def records(f):
+        """yields src's records in the form writer expects"""
+        for key, record in reader.load(f):
+            count[0] += 1
+            yield key, native_record(record) if writer.native else record
+    with open_snapshot(src, "r", reader, compression_for_path(src)) as f:
+        with open_snapshot(dst, "w", writer,
+                           compression_for_path(dst)) as out:
+            writer.dump(out, records(f))
+    return count[0]
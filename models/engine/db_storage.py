@@ -3,27 +3,384 @@
 Contains the class DBStorage
 """
 
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
 import models
 from models.amenity import Amenity
 from models.base_model import BaseModel, Base
 from models.city import City
+from models.engine.bulk import chunks, split_item
 from models.place import Place
 from models.review import Review
 from models.state import State
 from models.user import User
 from os import getenv
 import sqlalchemy
-from sqlalchemy import create_engine
-from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.orm import Session, joinedload, \
+    make_transient_to_detached, scoped_session, selectinload, sessionmaker
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.pool import NullPool, QueuePool, SingletonThreadPool, \
+    StaticPool
+from sqlalchemy.sql import Select
+import threading
+import time
+import uuid
 
 classes = {"Amenity": Amenity, "City": City,
            "Place": Place, "Review": Review, "State": State, "User": User}
+# run on every new SQLite connection: WAL lets readers work while one
+# writer commits, and with it NORMAL only syncs at checkpoints
+sqlite_pragmas = ("PRAGMA journal_mode=WAL",
+                  "PRAGMA synchronous=NORMAL",
+                  "PRAGMA foreign_keys=ON",
+                  "PRAGMA busy_timeout=5000",
+                  "PRAGMA cache_size=-65536",
+                  "PRAGMA temp_store=MEMORY",
+                  "PRAGMA mmap_size=268435456")
+# HBNB_MYSQL_POOL_CLASS values; "lifo" reuses the most recent connection,
+# so the idle ones age out through pool_recycle
+pool_classes = {"queue": QueuePool, "lifo": QueuePool, "null": NullPool,
+                "static": StaticPool, "singleton": SingletonThreadPool}
+
+
+def timed_pool(base):
+    """returns a subclass of the pool class base that counts checkouts,
+    how long they waited for a connection and how many are in use"""
+    class TimedPool(base):
+        """a pool keeping checkout counters in stats, shared by the pools
+        it is recreated as"""
+        stats = {"checkouts": 0, "checkout_timeouts": 0,
+                 "checkout_wait_total": 0.0, "checkout_wait_max": 0.0,
+                 "in_use": 0, "in_use_max": 0}
+        lock = threading.Lock()
+
+        def connect(self):
+            """checks out a connection, timing the wait for it"""
+            start = time.perf_counter()
+            try:
+                connection = super().connect()
+            except sqlalchemy.exc.TimeoutError:
+                with self.lock:
+                    self.stats["checkout_timeouts"] += 1
+                raise
+            wait = time.perf_counter() - start
+            with self.lock:
+                self.stats["checkouts"] += 1
+                self.stats["checkout_wait_total"] += wait
+                self.stats["checkout_wait_max"] = max(
+                    self.stats["checkout_wait_max"], wait)
+            return connection
+
+    @event.listens_for(TimedPool, "checkout")
+    def checkout(dbapi_connection, record, proxy):
+        """counts a connection handed out"""
+        with TimedPool.lock:
+            TimedPool.stats["in_use"] += 1
+            TimedPool.stats["in_use_max"] = max(TimedPool.stats["in_use"],
+                                                TimedPool.stats["in_use_max"])
+
+    @event.listens_for(TimedPool, "checkin")
+    def checkin(dbapi_connection, record):
+        """counts a connection given back"""
+        with TimedPool.lock:
+            TimedPool.stats["in_use"] -= 1
+    return TimedPool
+
+
+def pool_options():
+    """returns the create_engine() pool arguments set by the
+    HBNB_MYSQL_POOL_* variables"""
+    name = getenv("HBNB_MYSQL_POOL_CLASS", "queue")
+    if name not in pool_classes:
+        raise ValueError("unknown pool class: {}".format(name))
+    options = {"poolclass": timed_pool(pool_classes[name]),
+               "pool_pre_ping": getenv("HBNB_MYSQL_POOL_PRE_PING",
+                                       "1") == "1",
+               "pool_recycle": int(getenv("HBNB_MYSQL_POOL_RECYCLE", 3600))}
+    if pool_classes[name] is QueuePool:
+        options["pool_size"] = int(getenv("HBNB_MYSQL_POOL_SIZE", 5))
+        options["max_overflow"] = int(getenv("HBNB_MYSQL_POOL_MAX_OVERFLOW",
+                                             10))
+        options["pool_timeout"] = float(getenv("HBNB_MYSQL_POOL_TIMEOUT", 30))
+        options["pool_use_lifo"] = name == "lifo"
+    return options
+
+
+class RowCache:
+    """a process-wide LRU cache of the column values of rows, by
+    <class name>.<id>, each kept for at most ttl seconds"""
+
+    def __init__(self, size, ttl):
+        """holds up to size rows"""
+        self.size = size
+        self.ttl = ttl
+        self.rows = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"cache_hits": 0, "cache_misses": 0,
+                      "cache_evictions": 0, "cache_expired": 0,
+                      "cache_invalidations": 0}
+
+    def get(self, key):
+        """returns a copy of the values cached for key, or None"""
+        with self.lock:
+            found = self.rows.get(key)
+            if found is not None and found[0] < time.monotonic():
+                del self.rows[key]
+                self.stats["cache_expired"] += 1
+                found = None
+            if found is None:
+                self.stats["cache_misses"] += 1
+                return None
+            self.rows.move_to_end(key)
+            self.stats["cache_hits"] += 1
+            return dict(found[1])
+
+    def put(self, key, values):
+        """caches the column values of the row key"""
+        with self.lock:
+            self.rows[key] = (time.monotonic() + self.ttl, values)
+            self.rows.move_to_end(key)
+            while len(self.rows) > self.size:
+                self.rows.popitem(last=False)
+                self.stats["cache_evictions"] += 1
+
+    def discard(self, keys):
+        """forgets the rows keys"""
+        with self.lock:
+            for key in keys:
+                if self.rows.pop(key, None) is not None:
+                    self.stats["cache_invalidations"] += 1
+
+
+def row_key(obj):
+    """returns the RowCache key of obj"""
+    return obj.__class__.__name__ + "." + str(obj.id)
+
+
+def sqlite_engine(path):
+    """returns an engine on the SQLite file at path, tuned by
+    sqlite_pragmas
+
+    Each thread gets its own session from the scoped_session, and each
+    session its own pooled connection, so threads never share one;
+    check_same_thread is off only because the pool hands a connection to
+    whichever thread checks it out next.
+    """
+    engine = create_engine("sqlite:///" + path,
+                           connect_args={"check_same_thread": False},
+                           **pool_options())
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(connection, record):
+        """applies sqlite_pragmas to a new DBAPI connection"""
+        cursor = connection.cursor()
+        for pragma in sqlite_pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+    return engine
+
+
+def bulk_row(cls, obj, attrs):
+    """returns the column values of the instance obj, or those the dict of
+    attributes attrs holds, as a row of cls's table; other attributes are
+    dropped, as the ORM does, and so are unset columns with a default"""
+    row = {}
+    for attr in sqlalchemy.inspect(cls).column_attrs:
+        if obj is not None:
+            value = getattr(obj, attr.key, None)
+        elif attr.key in attrs:
+            value = attrs[attr.key]
+        else:
+            continue
+        if value is not None or attr.columns[0].default is None:
+            row[attr.key] = value
+    if obj is None:
+        if row.get("id") is None:
+            row["id"] = str(uuid.uuid4())
+        if row.get("created_at") is None:
+            row["created_at"] = datetime.utcnow()
+        if row.get("updated_at") is None:
+            row["updated_at"] = row["created_at"]
+    return row
+
+
+def bulk_insert(dialect, table, keys, upsert):
+    """returns the statement inserting rows with the columns keys into
+    table, run with many rows at once; upsert updates the row with the
+    same id instead, except its created_at"""
+    if not upsert:
+        return table.insert()
+    if dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect.name == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+    else:
+        raise ValueError("no upsert for {}".format(dialect.name))
+    statement = insert(table)
+    kept = ("id", "created_at")
+    if dialect.name == "sqlite":
+        return statement.on_conflict_do_update(
+            index_elements=["id"], set_={
+                key: statement.excluded[key] for key in keys
+                if key not in kept})
+    return statement.on_duplicate_key_update(
+        {key: statement.inserted[key] for key in keys if key not in kept})
+
+
+class ReplicaRouter:
+    """picks the engine of each statement: the primary for writes and
+    for the reads that must see them, one of the replicas otherwise
+
+    Reads stay on the primary inside DBStorage.transaction(), in a
+    session that has written, and for staleness seconds, the lag allowed
+    to the replicas, after a commit that wrote in the same thread. The
+    sessions of DBStorage are per thread, so that is the client that
+    wrote, in its later sessions too; the other threads keep reading
+    from the replicas.
+    """
+
+    def __init__(self, primary, replicas, policy="round_robin",
+                 staleness=5.0):
+        """routes between the engine primary and the list replicas; policy
+        is round_robin or least_loaded (fewest connections in use)"""
+        if policy not in ("round_robin", "least_loaded"):
+            raise ValueError("unknown replica policy: {}".format(policy))
+        self.primary = primary
+        self.replicas = replicas
+        self.policy = policy
+        self.staleness = staleness
+        # dictionary - thread id -> time of its last commit that wrote
+        self.writes = {}
+        self.turn = 0
+        self.lock = threading.Lock()
+        self.stats = {"primary_writes": 0, "primary_reads": 0,
+                      "replica_reads": [0] * len(replicas)}
+
+    def wrote(self):
+        """starts the staleness window of the calling thread"""
+        now = time.monotonic()
+        with self.lock:
+            self.writes = {client: last for client, last in
+                           self.writes.items()
+                           if now - last < self.staleness}
+            self.writes[threading.get_ident()] = now
+
+    def fresh(self):
+        """returns whether the last write of the calling thread is within
+        the staleness window"""
+        last = self.writes.get(threading.get_ident())
+        return last is not None and \
+            time.monotonic() - last < self.staleness
+
+    def pick(self):
+        """returns the index of the replica for the next read"""
+        with self.lock:
+            if self.policy == "least_loaded":
+                reads = self.stats["replica_reads"]
+                return min(range(len(self.replicas)), key=lambda i: (
+                    self.replicas[i].pool.stats["in_use"], reads[i]))
+            self.turn = (self.turn + 1) % len(self.replicas)
+            return self.turn
+
+    def bind(self, session, clause):
+        """returns the engine for clause, run by session"""
+        if session._flushing or not isinstance(clause, Select) or \
+                clause._for_update_arg is not None:
+            with self.lock:
+                self.stats["primary_writes"] += 1
+            return self.primary
+        if session.info.get("wrote") or session.info.get("depth") \
+                or self.fresh():
+            with self.lock:
+                self.stats["primary_reads"] += 1
+            return self.primary
+        i = self.pick()
+        with self.lock:
+            self.stats["replica_reads"][i] += 1
+        return self.replicas[i]
+
+
+class RoutingSession(Session):
+    """a session sending each statement to the engine chosen by the
+    ReplicaRouter in its info, if any"""
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        """returns the engine clause runs on"""
+        router = self.info.get("router")
+        if router is None or not router.replicas:
+            return super().get_bind(mapper, clause=clause, **kwargs)
+        return router.bind(self, clause)
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def after_flush(session, context):
+    """keeps the reads of a session that wrote on the primary"""
+    session.info["wrote"] = True
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def after_commit(session):
+    """starts the staleness window of a commit that wrote"""
+    router = session.info.get("router")
+    if session.info.pop("wrote", False) and router is not None:
+        router.wrote()
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def after_rollback(session):
+    """forgets the writes rolled back"""
+    session.info.pop("wrote", None)
+
+
+def related_options(cls, with_related):
+    """returns the loader options that load the relationships with_related
+    of cls with it: a name, a dotted path ("cities.places"), a list of
+    them, or True for every relationship of cls
+
+    Collections come through selectinload, one extra query per level
+    whatever the number of rows, and many-to-one relationships through a
+    joinedload of the same query.
+    """
+    if not with_related:
+        return []
+    if with_related is True:
+        with_related = sqlalchemy.inspect(cls).relationships.keys()
+    elif isinstance(with_related, str):
+        with_related = [with_related]
+    options = []
+    for path in with_related:
+        option = None
+        clss = cls
+        for name in path.split("."):
+            relationships = sqlalchemy.inspect(clss).relationships
+            if name not in relationships:
+                raise ValueError("{} has no relationship {}".format(
+                    clss.__name__, name))
+            prop = relationships[name]
+            loader = selectinload if prop.uselist else joinedload
+            if option is None:
+                option = loader(getattr(clss, name))
+            else:
+                option = getattr(option, loader.__name__)(
+                    getattr(clss, name))
+            clss = prop.mapper.class_
+        options.append(option)
+    return options
 
 
 class DBStorage:
-    """interaacts with the MySQL database"""
+    """interaacts with the MySQL database, or an SQLite file when
+    HBNB_TYPE_STORAGE is sqlite"""
     __engine = None
     __session = None
+    # int - get() calls answered from the session identity map
+    __identity_hits = 0
+    # RowCache - rows get() found, None without HBNB_DB_CACHE_SIZE
+    __cache = None
+    # ReplicaRouter - sends reads to the replicas, if any are set
+    __router = None
 
     def __init__(self):
         """Instantiate a DBStorage object"""
@@ -32,63 +389,239 @@ class DBStorage:
         HBNB_MYSQL_HOST = getenv('HBNB_MYSQL_HOST')
         HBNB_MYSQL_DB = getenv('HBNB_MYSQL_DB')
         HBNB_ENV = getenv('HBNB_ENV')
-        self.__engine = create_engine('mysql+mysqldb://{}:{}@{}/{}'.
-                                      format(HBNB_MYSQL_USER,
-                                             HBNB_MYSQL_PWD,
-                                             HBNB_MYSQL_HOST,
-                                             HBNB_MYSQL_DB))
+        if getenv('HBNB_TYPE_STORAGE') == "sqlite":
+            self.__engine = sqlite_engine(getenv('HBNB_SQLITE_PATH',
+                                                 'file.sqlite'))
+            replicas = [sqlite_engine(path) for path in
+                        getenv('HBNB_SQLITE_REPLICA_PATHS', '').split(',')
+                        if path]
+        else:
+            self.__engine = create_engine('mysql+mysqldb://{}:{}@{}/{}'.
+                                          format(HBNB_MYSQL_USER,
+                                                 HBNB_MYSQL_PWD,
+                                                 HBNB_MYSQL_HOST,
+                                                 HBNB_MYSQL_DB),
+                                          **pool_options())
+            replicas = [create_engine('mysql+mysqldb://{}:{}@{}/{}'.
+                                      format(HBNB_MYSQL_USER, HBNB_MYSQL_PWD,
+                                             host, HBNB_MYSQL_DB),
+                                      **pool_options())
+                        for host in getenv('HBNB_MYSQL_REPLICA_HOSTS',
+                                           '').split(',') if host]
+        if replicas:
+            self.__router = ReplicaRouter(
+                self.__engine, replicas,
+                getenv('HBNB_DB_REPLICA_POLICY', 'round_robin'),
+                float(getenv('HBNB_DB_REPLICA_STALENESS', 5)))
+        cache_size = int(getenv('HBNB_DB_CACHE_SIZE', 0))
+        if cache_size > 0:
+            self.__cache = RowCache(cache_size,
+                                    float(getenv('HBNB_DB_CACHE_TTL', 30)))
         if HBNB_ENV == "test":
             Base.metadata.drop_all(self.__engine)
 
-    def all(self, cls=None):
-        """query on the current database session"""
+    def all(self, cls=None, with_related=None):
+        """query on the current database session, loading the
+        relationships with_related of the objects in a fixed number of
+        queries (see related_options; only True when cls is None)"""
         new_dict = {}
         for clss in classes:
             if cls is None or cls is classes[clss] or cls is clss:
-                objs = self.__session.query(classes[clss]).all()
+                options = related_options(classes[clss], with_related)
+                objs = self.__session.query(classes[clss]).options(
+                    *options).all()
                 for obj in objs:
                     key = obj.__class__.__name__ + '.' + obj.id
                     new_dict[key] = obj
         return (new_dict)
 
+    def iter(self, cls=None, batch_size=1000):
+        """yields the objects of cls, or of every class, fetching and
+        building batch_size rows at a time instead of the whole table
+
+        The rows come through a server-side cursor (stream_results), so
+        the driver does not buffer the whole result either; on MySQL the
+        session cannot run other queries until the iteration ends.
+        """
+        for clss in classes:
+            if cls is None or cls is classes[clss] or cls is clss:
+                query = self.__session.query(classes[clss])
+                yield from query.execution_options(
+                    stream_results=True).yield_per(batch_size)
+
     def new(self, obj):
         """add the object to the current database session"""
+        if self.__cache is not None and obj is not None:
+            self.__cache.discard([row_key(obj)])
         self.__session.add(obj)
 
     def save(self):
         """commit all changes of the current database session"""
-        self.__session.commit()
+        info = self.__session.info
+        if info.get("depth"):
+            info["pending"] = True
+            return
+        if self.__cache is None:
+            self.__session.commit()
+            return
+        session = self.__session
+        keys = [row_key(obj) for objs in (session.new, session.dirty,
+                                          session.deleted) for obj in objs]
+        self.__cache.discard(keys)
+        session.commit()
+        # a get() of another thread may have cached a row being replaced
+        self.__cache.discard(keys)
+
+    def bulk_new(self, items, cls=None, chunk_size=10000):
+        """inserts items, model instances or dicts like to_dict() returns
+        (of class cls when they have no __class__), with one executemany
+        INSERT per table and a commit per chunk of chunk_size items;
+        returns the seconds each chunk took. The instances are not added
+        to the session."""
+        return self.__bulk(items, cls, chunk_size, False)
+
+    def bulk_upsert(self, items, cls=None, chunk_size=10000):
+        """bulk_new(), except that a row with the id of a stored one
+        replaces its columns but created_at (INSERT ... ON CONFLICT on
+        SQLite, ON DUPLICATE KEY UPDATE on MySQL)"""
+        return self.__bulk(items, cls, chunk_size, True)
+
+    def __bulk(self, items, cls, chunk_size, upsert):
+        """inserts items a chunk at a time"""
+        order = Base.metadata.sorted_tables
+        dialect = self.__engine.dialect
+        timings = []
+        for chunk in chunks(items, chunk_size):
+            start = time.perf_counter()
+            groups = {}
+            for item in chunk:
+                name, obj, attrs = split_item(item, cls)
+                if name not in classes:
+                    raise ValueError("unknown class: {}".format(name))
+                row = bulk_row(classes[name], obj, attrs)
+                groups.setdefault((name, tuple(row)), []).append(row)
+            # parents first, for the foreign keys
+            for name, keys in sorted(groups, key=lambda group: order.index(
+                    classes[group[0]].__table__)):
+                rows = groups[name, keys]
+                table = classes[name].__table__
+                self.__session.execute(
+                    bulk_insert(dialect, table, keys, upsert), rows)
+                # starts the replica staleness window on commit
+                self.__session.info["wrote"] = True
+                if self.__cache is not None:
+                    self.__cache.discard([name + "." + row["id"]
+                                          for row in rows])
+            self.save()
+            timings.append(time.perf_counter() - start)
+        return timings
+
+    @contextmanager
+    def transaction(self):
+        """holds back save() until the block exits, then commits once if it
+        was called; if the block raises, the session is rolled back
+        instead. Nested blocks join the outermost one.
+
+        The depth of the open blocks and whether save() was called are
+        kept in the info of the session, which is per thread, so the
+        saves of the other threads commit as usual."""
+        info = self.__session.info
+        if not info.get("depth"):
+            info["pending"] = False
+        # the reads of an open block, which may feed a write, stay on the
+        # primary
+        info["depth"] = info.get("depth", 0) + 1
+        try:
+            yield self
+        except BaseException:
+            if info["depth"] == 1:
+                info["pending"] = False
+                self.__session.rollback()
+            raise
+        finally:
+            info["depth"] -= 1
+        if info["depth"] == 0 and info.pop("pending", False):
+            self.save()
 
     def delete(self, obj=None):
         """delete from the current database session obj if not None"""
         if obj is not None:
+            if self.__cache is not None:
+                self.__cache.discard([row_key(obj)])
             self.__session.delete(obj)
 
     def reload(self):
         """reloads data from the database"""
         Base.metadata.create_all(self.__engine)
-        sess_factory = sessionmaker(bind=self.__engine, expire_on_commit=False)
+        sess_factory = sessionmaker(bind=self.__engine, expire_on_commit=False,
+                                    class_=RoutingSession,
+                                    info={"router": self.__router})
         Session = scoped_session(sess_factory)
         self.__session = Session
 
+    def metrics(self):
+        """returns the counters kept by the storage engine: the checkouts
+        of the connection pool, how long they waited (in seconds) and how
+        many connections are in use, then the get() calls answered by the
+        session identity map, those of the row cache and the statements
+        sent to the primary and to each replica"""
+        pool = self.__engine.pool
+        with pool.lock:
+            stats = dict(pool.stats)
+        stats["pool"] = pool.status()
+        stats["identity_map_hits"] = DBStorage.__identity_hits
+        if self.__router is not None:
+            with self.__router.lock:
+                stats.update(self.__router.stats)
+                stats["replica_reads"] = list(stats["replica_reads"])
+        if self.__cache is not None:
+            with self.__cache.lock:
+                stats.update(self.__cache.stats)
+            stats["cache_rows"] = len(self.__cache.rows)
+        return stats
+
     def close(self):
         """call remove() method on the private session attribute"""
         self.__session.remove()
 
-    def get(self, cls, id):
+    def get(self, cls, id, with_related=None):
         """
         The `get` method retrieves one object, base on class and id.
 
         Args:
             cls (class): A class
             id (str): A string representing the objec ID.
+            with_related (optional): The relationships to load with the
+            object, as for related_options().
 
         Return:
             object: The retrieved object or None if not found.
         """
         obj = None
-        if cls is not None and issubclass(cls, BaseModel):
-            obj = self.__session.query(cls).filter(cls.id == id).first()
+        cls = classes.get(cls, cls)
+        if cls in classes.values():
+            obj = self.__lookup(cls, id, with_related)
+        return obj
+
+    def __lookup(self, cls, id, with_related):
+        """returns the cls object with id from the session identity map,
+        then the row cache, then the database"""
+        session = self.__session
+        if identity_key(cls, id) in session.identity_map:
+            DBStorage.__identity_hits += 1
+            return session.get(cls, id)
+        key = cls.__name__ + "." + str(id)
+        cache = self.__cache if not with_related else None
+        if cache is not None:
+            values = cache.get(key)
+            if values is not None:
+                obj = cls(**values)
+                make_transient_to_detached(obj)
+                return session.merge(obj, load=False)
+        obj = session.get(cls, id, options=related_options(cls, with_related))
+        if cache is not None and obj is not None:
+            cache.put(key, {attr.key: getattr(obj, attr.key)
+                            for attr in sqlalchemy.inspect(cls).column_attrs})
         return obj
 
     def count(self, cls=None):
@@ -102,4 +635,17 @@ class DBStorage:
         Returns:
             int: The number of objects in storage.
         """
-        return len(self.all(cls))
+        if cls is None:
+            return sum(self.counts().values())
+        cls = classes.get(cls, cls)
+        if cls not in classes.values():
+            return 0
+        return self.__session.scalar(select(func.count()).select_from(cls))
+
+    def counts(self):
+        """returns the number of objects of each class, by class name, in
+        a single query"""
+        query = select(*[select(func.count()).select_from(clss)
+                         .scalar_subquery().label(name)
+                         for name, clss in classes.items()])
+        return dict(self.__session.execute(query).one()._mapping)
@@ -3,10 +3,24 @@
 Contains the FileStorage class
 """
 
+import atexit
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+import fcntl
 import json
+from os import getenv
+import os
+import threading
+import time
+import zlib
 from models.amenity import Amenity
-from models.base_model import BaseModel
+from models.base_model import BaseModel, mark_stored
 from models.city import City
+from models.engine import bulk
+from models.engine.codecs import extension_of, get_codec, get_compression, \
+    json_chunks, load_json_chunks, open_snapshot
+from models.engine.locks import RWLock
 from models.place import Place
 from models.review import Review
 from models.state import State
@@ -14,78 +28,897 @@ from models.user import User
 
 classes = {"Amenity": Amenity, "BaseModel": BaseModel, "City": City,
            "Place": Place, "Review": Review, "State": State, "User": User}
+# foreign keys that get a reverse index: <class name> -> attribute names
+foreign_keys = {"City": ("state_id",), "Place": ("city_id", "user_id"),
+                "Review": ("place_id", "user_id")}
+
+
+def segment_of(key, shards):
+    """returns the segment file name (no extension) that holds key:
+    <class name>, or <class name>.<shard> if classes are split in shards"""
+    name, id = key.split(".", 1)
+    if shards == 1:
+        return name
+    return "{}.{}".format(name, zlib.crc32(id.encode("utf-8")) % shards)
 
 
 class FileStorage:
     """serializes instances to a JSON file & deserializes back to instances"""
 
-    # string - path to the JSON file
-    __file_path = "file.json"
+    # codec - file format of the snapshot, see models/engine/codecs.py
+    __codec = get_codec(getenv("HBNB_FILE_FORMAT", "json"))
+    # compression - gzip or zstd stream the snapshot files go through, or
+    # None; and its level, None for the compression's default
+    __compression = get_compression(getenv("HBNB_FILE_COMPRESSION"))
+    __compression_level = getenv("HBNB_FILE_COMPRESSION_LEVEL") or None
+    __compression_level = __compression_level and int(__compression_level)
+    # string - path to the snapshot file
+    __file_path = "file." + extension_of(__codec, __compression)
     # dictionary - empty but will store all objects by <class name>.id
     __objects = {}
+    # dictionary - <class name> -> {<class name>.id: obj}, mirrors __objects
+    __by_class = {}
+    # dictionary - (<class name>, attribute) -> {value: {key: obj}}
+    __by_fk = {}
+    # the __objects dict the indexes were built from, and its size
+    __indexed = None
+    __indexed_len = 0
+    # bool - other processes use the same files: each save catches up on
+    # their journal records, then appends its own, under <__file_path>.lock
+    __shared = getenv("HBNB_FILE_SHARED") == "1"
+    # bool - append changes to <__file_path>.log instead of rewriting the file
+    __journal = getenv("HBNB_FILE_JOURNAL") == "1" or __shared
+    # int - journal size (bytes) past which it is folded back into the file
+    __journal_max = int(getenv("HBNB_FILE_JOURNAL_MAX", 16 * 1024 * 1024))
+    # int - files each class is split into, by a hash of the id
+    __shards = int(getenv("HBNB_FILE_SHARDS", 1))
+    # string - "segments" keeps one file per class (and shard) in
+    # <__file_path>.d/
+    __layout = getenv("HBNB_FILE_LAYOUT",
+                      "segments" if __shards > 1 else "file")
+    # dictionaries - <segment> -> {<class name>.id: obj or record}, mirror
+    # __objects and __raw in the segments layout
+    __by_segment = {}
+    __raw_by_segment = {}
+    # int - threads reading segment files in parallel on reload; decoding
+    # holds the GIL, so this only pays off when reads wait on the disk
+    __load_threads = int(getenv("HBNB_FILE_LOAD_THREADS", 1))
+    # int - processes decoding a JSON snapshot in chunks on reload, for
+    # snapshots of at least __parallel_min bytes
+    __load_processes = int(getenv("HBNB_FILE_LOAD_PROCESSES", 1))
+    __parallel_min = 1 << 20
+    # sets - keys stored / deleted since the last save
+    __dirty = set()
+    __deleted = set()
+    # bool - reload keeps undecoded records, built into objects on access
+    __lazy = getenv("HBNB_FILE_LAZY") == "1"
+    # dictionary - <class name>.id -> record not yet built into an object
+    __raw = {}
+    # dictionary - <class name> -> {<class name>.id: record}, mirrors __raw
+    __raw_by_class = {}
+    # bool - __objects changed behind our back, so the next save writes all
+    __rewrite_all = False
+    # dictionary - path -> (mtime, size, inode) of each file as last seen
+    __seen = {}
+    # int - bytes of the journal already applied to __objects
+    __journal_offset = 0
+    # dictionary - reload counters reported by metrics()
+    __stats = {"reloads": 0, "partial_reloads": 0, "reloads_avoided": 0}
+    # int - depth of the open transaction() blocks, save() waits for 0
+    __depth = 0
+    # bool - save() was called inside the open transaction
+    __pending = False
+    # list - undo records of the open transaction, None outside of one
+    __undo = None
+    # bool - save() only records the request, a background thread writes
+    __write_behind = getenv("HBNB_FILE_WRITE_BEHIND") == "1"
+    # float - seconds a write-behind flush waits for more saves to join it
+    __flush_interval = float(getenv("HBNB_FILE_FLUSH_INTERVAL", 1))
+    # int - pending changes that start a write-behind flush right away
+    __flush_threshold = int(getenv("HBNB_FILE_FLUSH_THRESHOLD", 1000))
+    # RWLock - readers share it; changes and writes to disk take it alone
+    __lock = RWLock()
+    # Condition - wakes the flusher thread when saves come in
+    __flush_cond = threading.Condition()
+    # ints - save() calls so far, and how many of them are on disk
+    __requested = 0
+    __flushed = 0
+    # Thread - the write-behind flusher, started by the first save()
+    __flusher = None
+    # (pid, file) - the lock file, opened once per process
+    __lock_file = None
+
+    def __index(self):
+        """returns __by_class, rebuilt if __objects changed behind our back"""
+        if FileStorage.__indexed is not self.__objects or \
+                FileStorage.__indexed_len != len(self.__objects):
+            if FileStorage.__indexed is not None:
+                FileStorage.__rewrite_all = True
+            FileStorage.__by_class = {}
+            FileStorage.__by_fk = {}
+            FileStorage.__by_segment = {}
+            FileStorage.__raw_by_segment = {}
+            for key, obj in self.__objects.items():
+                name = obj.__class__.__name__
+                FileStorage.__by_class.setdefault(name, {})[key] = obj
+                self.__link(key, name, obj)
+                self.__place(FileStorage.__by_segment, key, obj)
+            for key, record in FileStorage.__raw.items():
+                self.__link(key, record["__class__"], record)
+                self.__place(FileStorage.__raw_by_segment, key, record)
+            FileStorage.__indexed = self.__objects
+            FileStorage.__indexed_len = len(self.__objects)
+        return FileStorage.__by_class
+
+    def __segment(self, key):
+        """returns the segment file name (no extension) that holds key"""
+        return segment_of(key, self.__shards)
+
+    def __place(self, index, key, item):
+        """adds item to the segment bucket of index, in the segments
+        layout"""
+        if self.__layout == "segments":
+            index.setdefault(self.__segment(key), {})[key] = item
+
+    def __unplace(self, index, key):
+        """drops key from its segment bucket of index"""
+        if self.__layout == "segments":
+            index.get(self.__segment(key), {}).pop(key, None)
+
+    def __fk(self, name, item, attr):
+        """returns foreign key attr of an object or of an undecoded record"""
+        if isinstance(item, dict):
+            return item.get(attr, getattr(classes[name], attr, None))
+        return getattr(item, attr, None)
+
+    def __link(self, key, name, item, attrs=None):
+        """adds key to the reverse index of each of item's foreign keys;
+        undecoded records are indexed as None until hydrated"""
+        obj = None if isinstance(item, dict) else item
+        for attr in attrs or foreign_keys.get(name, ()):
+            value = self.__fk(name, item, attr)
+            index = FileStorage.__by_fk.setdefault((name, attr), {})
+            index.setdefault(value, {})[key] = obj
+
+    def __unlink(self, key, name, attr, value):
+        """drops key from the reverse index of name's attr == value"""
+        index = FileStorage.__by_fk.get((name, attr), {})
+        bucket = index.get(value)
+        if bucket is not None:
+            bucket.pop(key, None)
+            if not bucket:
+                del index[value]
+
+    def __add(self, key, obj):
+        """stores obj under key in __objects and the indexes"""
+        by_class = self.__index()
+        if key in self.__objects:
+            self.__drop(key, self.__objects[key])
+        else:
+            self.__forget_raw(key)
+            FileStorage.__indexed_len += 1
+        self.__objects[key] = obj
+        mark_stored(obj)
+        name = obj.__class__.__name__
+        by_class.setdefault(name, {})[key] = obj
+        self.__link(key, name, obj)
+        self.__place(FileStorage.__by_segment, key, obj)
+
+    def __drop(self, key, obj):
+        """drops obj, stored under key, from the indexes"""
+        name = obj.__class__.__name__
+        FileStorage.__by_class.get(name, {}).pop(key, None)
+        self.__unplace(FileStorage.__by_segment, key)
+        for attr in foreign_keys.get(name, ()):
+            self.__unlink(key, name, attr, getattr(obj, attr, None))
+
+    def __remove(self, key):
+        """drops key from __objects and the indexes"""
+        self.__index()
+        obj = self.__objects.pop(key, None)
+        if obj is None:
+            return self.__forget_raw(key)
+        FileStorage.__indexed_len -= 1
+        self.__drop(key, obj)
+        return obj
+
+    def __add_raw(self, key, record):
+        """stores an undecoded record under key, built on first access"""
+        self.__index()
+        self.__remove(key)
+        name = record["__class__"]
+        FileStorage.__raw[key] = record
+        FileStorage.__raw_by_class.setdefault(name, {})[key] = record
+        self.__link(key, name, record)
+        self.__place(FileStorage.__raw_by_segment, key, record)
+
+    def __forget_raw(self, key):
+        """drops the undecoded record under key and returns it"""
+        record = FileStorage.__raw.pop(key, None)
+        if record is not None:
+            name = record["__class__"]
+            FileStorage.__raw_by_class[name].pop(key, None)
+            self.__unplace(FileStorage.__raw_by_segment, key)
+            for attr in foreign_keys.get(name, ()):
+                self.__unlink(key, name, attr, self.__fk(name, record, attr))
+        return record
+
+    def __hydrate(self, key):
+        """builds and stores the instance of the undecoded record key"""
+        record = self.__forget_raw(key)
+        if record is None:
+            return self.__objects.get(key)
+        obj = classes[record["__class__"]](**record)
+        self.__add(key, obj)
+        return obj
 
-    def all(self, cls=None):
-        """returns the dictionary __objects"""
+    def __fresh_index(self):
+        """rebuilds the indexes, before a read, if they are out of date"""
+        if FileStorage.__indexed is not self.__objects or \
+                FileStorage.__indexed_len != len(self.__objects):
+            with FileStorage.__lock.write():
+                self.__index()
+
+    def all(self, cls=None, with_related=None):
+        """returns the dictionary __objects, or a copy of cls's bucket;
+        threads iterating over __objects should hold read_lock().
+        with_related is for DBStorage: relationships here are index
+        lookups, with nothing to load ahead"""
         if cls is not None:
-            new_dict = {}
-            for key, value in self.__objects.items():
-                if cls == value.__class__ or cls == value.__class__.__name__:
-                    new_dict[key] = value
-            return new_dict
+            name = cls if isinstance(cls, str) else cls.__name__
+            if FileStorage.__raw_by_class.get(name):
+                with FileStorage.__lock.write():
+                    for key in list(FileStorage.__raw_by_class.get(name,
+                                                                   ())):
+                        self.__hydrate(key)
+            self.__fresh_index()
+            with FileStorage.__lock.read():
+                return dict(FileStorage.__by_class.get(name, {}))
+        if FileStorage.__raw:
+            with FileStorage.__lock.write():
+                for key in list(FileStorage.__raw):
+                    self.__hydrate(key)
         return self.__objects
 
+    def read_lock(self):
+        """returns a context manager keeping the objects from changing"""
+        return FileStorage.__lock.read()
+
     def new(self, obj):
         """sets in __objects the obj with key <obj class name>.id"""
         if obj is not None:
             key = str(obj.__class__.__name__) + "." + str(obj.id)
-            self.__objects[key] = obj
+            with FileStorage.__lock.write():
+                self.__log_key(key)
+                self.__add(key, obj)
+                FileStorage.__dirty.add(key)
+                FileStorage.__deleted.discard(key)
+
+    def bulk_new(self, items, cls=None, chunk_size=10000):
+        """stores items, model instances or dicts like to_dict() returns
+        (of class cls when they have no __class__), then saves them with a
+        single write; returns the seconds each chunk of chunk_size items
+        took, the write counted in the last one"""
+        return self.__bulk(items, cls, chunk_size, False)
+
+    def bulk_upsert(self, items, cls=None, chunk_size=10000):
+        """bulk_new(), except that a dict with the id of a stored object
+        sets the attributes it holds on that object, keeping its
+        created_at and refreshing its updated_at, as DBStorage does"""
+        return self.__bulk(items, cls, chunk_size, True)
+
+    def __bulk(self, items, cls, chunk_size, upsert):
+        """stores items a chunk at a time under the write lock"""
+        return bulk.store(self, items, cls, chunk_size, upsert, classes,
+                          self.__build, FileStorage.__lock.write)
 
     def save(self):
         """serializes __objects to the JSON file (path: __file_path)"""
-        json_objects = {}
-        for key in self.__objects:
-            json_objects[key] = self.__objects[key].to_dict()
-        with open(self.__file_path, 'w') as f:
-            json.dump(json_objects, f)
+        with FileStorage.__lock.write():
+            if FileStorage.__depth:
+                FileStorage.__pending = True
+            elif self.__write_behind:
+                self.__request_flush()
+            else:
+                self.__write()
 
-    def reload(self):
-        """deserializes the JSON file to __objects"""
+    def __request_flush(self):
+        """counts a save() for the flusher thread, starting it if needed"""
+        with FileStorage.__flush_cond:
+            FileStorage.__requested += 1
+            flusher = FileStorage.__flusher
+            if flusher is None or not flusher.is_alive():
+                if flusher is None:
+                    atexit.register(self.flush)
+                FileStorage.__flusher = threading.Thread(
+                    target=self.__flush_loop, name="FileStorage flusher",
+                    daemon=True)
+                FileStorage.__flusher.start()
+            FileStorage.__flush_cond.notify_all()
+
+    def __flush_loop(self):
+        """writes the saved changes in the background: the saves made while
+        a flush waits out the interval all go to disk in one write"""
+        cond = FileStorage.__flush_cond
+        while True:
+            with cond:
+                cond.wait_for(lambda: FileStorage.__requested >
+                              FileStorage.__flushed)
+                start = time.monotonic()
+                cond.wait_for(lambda: len(FileStorage.__dirty) +
+                              len(FileStorage.__deleted) >=
+                              FileStorage.__flush_threshold or
+                              time.monotonic() - start >=
+                              FileStorage.__flush_interval,
+                              FileStorage.__flush_interval)
+            try:
+                self.flush()
+            except OSError:
+                # left pending, the next round tries again
+                pass
+
+    def flush(self):
+        """writes the changes of every save() made so far, unless another
+        flush already covered them, and returns once they are on disk"""
+        with FileStorage.__lock.write():
+            with FileStorage.__flush_cond:
+                target = FileStorage.__requested
+            if FileStorage.__flushed >= target:
+                return
+            self.__write()
+            with FileStorage.__flush_cond:
+                FileStorage.__flushed = target
+
+    @contextmanager
+    def __file_lock(self, operation):
+        """holds the lock file with the flock operation (LOCK_SH or LOCK_EX)
+        if the files are shared with other processes"""
+        if not self.__shared:
+            yield
+            return
+        held = FileStorage.__lock_file
+        path = self.__file_path + ".lock"
+        # flock locks belong to the open file, which a fork shares
+        if held is None or held[0] != os.getpid() or held[1].name != path:
+            FileStorage.__lock_file = held = (os.getpid(), open(path, 'a'))
+        fcntl.flock(held[1], operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(held[1], fcntl.LOCK_UN)
+
+    def __write(self):
+        """writes the pending changes to disk; shared files are first
+        brought up to date with what the other processes wrote"""
+        with self.__file_lock(fcntl.LOCK_EX):
+            if self.__shared:
+                self.__reload()
+            self.__write_files()
+
+    def __write_files(self):
+        """writes the pending changes to the snapshot or the journal"""
+        self.__index()
+        names = None
+        if self.__journal and not FileStorage.__rewrite_all:
+            self.__append_journal()
+            try:
+                if os.path.getsize(self.__journal_path()) <= \
+                        self.__journal_max:
+                    return
+            except FileNotFoundError:
+                return
+        elif self.__layout == "segments" and not FileStorage.__rewrite_all:
+            names = {self.__segment(key) for key in
+                     FileStorage.__dirty | FileStorage.__deleted}
+        self.__write_snapshot(names)
+        # the files now hold every change, so the journal is spent
+        if os.path.exists(self.__journal_path()):
+            open(self.__journal_path(), 'w').close()
+            self.__see(self.__journal_path())
+            FileStorage.__journal_offset = 0
+        FileStorage.__dirty.clear()
+        FileStorage.__deleted.clear()
+        FileStorage.__rewrite_all = False
+
+    def __segment_dir(self):
+        """returns the directory holding the segment files"""
+        return self.__file_path + ".d"
+
+    def __write_snapshot(self, names=None):
+        """writes __objects to disk, only the names segments if given"""
+        if self.__layout != "segments":
+            self.__write_records(self.__file_path, self.__objects,
+                                 FileStorage.__raw)
+            return
+        directory = self.__segment_dir()
+        os.makedirs(directory, exist_ok=True)
+        extension = self.__extension()
+        if names is None:
+            names = set(FileStorage.__by_segment) | \
+                set(FileStorage.__raw_by_segment)
+            names.update(f[:-len(extension)] for f in os.listdir(directory)
+                         if f.endswith(extension))
+        for name in names:
+            path = os.path.join(directory, name + extension)
+            bucket = FileStorage.__by_segment.get(name, {})
+            raw = FileStorage.__raw_by_segment.get(name, {})
+            if bucket or raw:
+                self.__write_records(path, bucket, raw)
+            elif os.path.exists(path):
+                os.remove(path)
+                FileStorage.__seen.pop(path, None)
+
+    def __write_records(self, path, objects, raw=None):
+        """atomically writes the objects and undecoded records dictionaries
+        to path with the codec, one record at a time"""
+        # one temporary file per process, so writers never share one
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        # flush() promises the data is on disk in write-behind mode
+        with self.__open(tmp_path, "w", sync=self.__write_behind) as f:
+            self.__codec.dump(f, self.__records(objects, raw))
+        os.replace(tmp_path, path)
+        self.__see(path)
+
+    def __extension(self):
+        """returns the extension of the snapshot files, with its dot"""
+        return "." + extension_of(self.__codec, self.__compression)
+
+    def __open(self, path, mode, sync=False):
+        """opens the snapshot file path for the codec to read ("r") or write
+        ("w"), through the compression if one is set"""
+        return open_snapshot(path, mode, self.__codec, self.__compression,
+                             self.__compression_level, sync)
+
+    def __records(self, objects, raw=None):
+        """yields the (key, dictionary) pairs of objects and raw records,
+        with datetime timestamps if the codec stores them natively"""
+        native = self.__codec.native
+        for key, obj in objects.items():
+            if native:
+                record = obj.__dict__.copy()
+                record["__class__"] = obj.__class__.__name__
+                yield key, record
+            else:
+                yield key, obj.to_dict()
+        if raw:
+            yield from raw.items()
+
+    def __read_records(self, path, decoded=None):
+        """loads the objects of the file at path into __objects, in place
+        of what it held before; decoded is the (signature, records) pair
+        of the file if already read"""
+        if decoded is not None:
+            signature, records = decoded
+            keys = self.__apply_records(records)
+        else:
+            signature = self.__signature(path)
+            with self.__open(path, "r") as f:
+                keys = self.__apply_records(self.__codec.load(f))
+        self.__prune(path, keys)
+        FileStorage.__seen[path] = signature
+
+    def __apply_records(self, records):
+        """stores the (key, record) pairs read from a snapshot file and
+        returns the set of their keys"""
+        keys = set()
+        for key, record in records:
+            keys.add(key)
+            if self.__pending_change(key):
+                continue
+            if self.__lazy:
+                self.__add_raw(key, record)
+            else:
+                self.__add(key, classes[record["__class__"]](**record))
+        return keys
+
+    def __prune(self, path, keys):
+        """drops the stored objects of the snapshot file path that are no
+        longer among its keys, because another process deleted them and
+        compacted, unless they changed in memory since the last save"""
+        if self.__layout == "segments" and path != self.__file_path:
+            name = os.path.basename(path)[:-len(self.__extension())]
+            self.__index()
+            held = list(FileStorage.__by_segment.get(name, {})) + \
+                list(FileStorage.__raw_by_segment.get(name, {}))
+        else:
+            held = list(self.__objects) + list(FileStorage.__raw)
+        for key in held:
+            if key not in keys and not self.__pending_change(key):
+                self.__remove(key)
+
+    def __decode_file(self, path):
+        """returns the signature and the list of records of path"""
+        signature = self.__signature(path)
+        with self.__open(path, "r") as f:
+            return signature, list(self.__codec.load(f))
+
+    def __read_segments(self, paths):
+        """loads the segment files at paths, decoding them in parallel;
+        objects are still built in this thread, in file order"""
+        # forking is only safe while no other thread holds a lock the
+        # children would inherit locked, as at import time; reloads in the
+        # threaded API server decode here
+        if self.__load_processes > 1 and self.__codec.name == "json" and \
+                self.__compression is None and not self.__lazy and \
+                threading.active_count() == 1 and \
+                sum(map(os.path.getsize, paths)) >= self.__parallel_min:
+            self.__read_chunks(paths)
+            return
+        threads = min(self.__load_threads, len(paths))
+        if threads < 2:
+            for path in paths:
+                self.__read_records(path)
+            return
+        with ThreadPoolExecutor(threads) as pool:
+            for path, decoded in zip(paths, pool.map(self.__decode_file,
+                                                     paths)):
+                self.__read_records(path, decoded)
+
+    def __read_chunks(self, paths):
+        """loads the JSON files at paths, split in chunks of lines that a
+        pool of processes decodes; the records come back with their
+        classes and timestamps resolved and are built here, in file
+        order"""
+        jobs = []
+        for path in paths:
+            chunks = json_chunks(path, self.__load_processes * 4)
+            jobs.append((path, self.__signature(path), chunks))
+        work = [(path, start, end) for path, signature, chunks in jobs
+                if chunks is not None for start, end in chunks]
+        decoded = load_json_chunks(work, self.__load_processes)
+        for path, signature, chunks in jobs:
+            if chunks is None:
+                # not a record a line, so it cannot be split
+                self.__read_records(path)
+                continue
+            keys = set()
+            for i in range(len(chunks)):
+                for key, name, attrs in next(decoded):
+                    keys.add(key)
+                    if not self.__pending_change(key):
+                        self.__add(key, self.__build(name, attrs))
+            self.__prune(path, keys)
+            FileStorage.__seen[path] = signature
+
+    def __build(self, name, attrs):
+        """returns an instance of class name with the decoded attrs; a
+        complete record skips __init__, which would only set them again"""
+        cls = classes[name]
+        if "id" in attrs and type(attrs.get("created_at")) is datetime and \
+                type(attrs.get("updated_at")) is datetime:
+            obj = cls.__new__(cls)
+            obj.__dict__.update(attrs)
+            return obj
+        return cls(**attrs)
+
+    def __signature(self, path):
+        """returns (mtime, size, inode) of path, None if it is missing"""
         try:
-            with open(self.__file_path, 'r') as f:
-                jo = json.load(f)
-            for key in jo:
-                self.__objects[key] = classes[jo[key]["__class__"]](**jo[key])
+            st = os.stat(path)
         except FileNotFoundError:
-            pass
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def __see(self, path):
+        """records path as in step with __objects"""
+        FileStorage.__seen[path] = self.__signature(path)
+
+    def __changed_on_disk(self, path):
+        """tells whether path differs from when it was last seen"""
+        signature = self.__signature(path)
+        return signature is not None and \
+            FileStorage.__seen.get(path) != signature
+
+    def __journal_path(self):
+        """returns the path of the journal kept next to __file_path"""
+        return self.__file_path + ".log"
+
+    def __append_journal(self):
+        """appends a put or delete record per pending change to the journal"""
+        lines = []
+        for key in FileStorage.__dirty:
+            obj = self.__objects.get(key)
+            if obj is not None:
+                lines.append(json.dumps({"op": "put",
+                                         "class": obj.__class__.__name__,
+                                         "id": obj.id,
+                                         "obj": obj.to_dict()}))
+        for key in FileStorage.__deleted:
+            name, id = key.split(".", 1)
+            lines.append(json.dumps({"op": "delete", "class": name,
+                                     "id": id}))
+        if lines:
+            data = ("\n".join(lines) + "\n").encode("utf-8")
+            with open(self.__journal_path(), 'ab+') as f:
+                # start on a fresh line if the last append was torn
+                f.seek(0, os.SEEK_END)
+                start = f.tell()
+                if start > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        data = b"\n" + data
+                f.write(data)
+                end = f.tell()
+                if self.__write_behind:
+                    f.flush()
+                    os.fsync(f.fileno())
+            # skip our own records on the next reload, unless another
+            # writer appended records we have not applied yet
+            if start == FileStorage.__journal_offset:
+                FileStorage.__journal_offset = end
+                self.__see(self.__journal_path())
+        FileStorage.__dirty.clear()
+        FileStorage.__deleted.clear()
+
+    def __replay_journal(self, offset):
+        """applies the journal records from offset on top of __objects"""
+        path = self.__journal_path()
+        signature = self.__signature(path)
+        if signature is None:
+            FileStorage.__journal_offset = 0
+            return
+        if signature[1] < offset:
+            offset = 0
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # an append still in progress, read it next time
+                    break
+                offset += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # a torn record from an interrupted append
+                    continue
+                key = record["class"] + "." + record["id"]
+                if self.__pending_change(key):
+                    continue
+                if record["op"] == "put" and self.__lazy:
+                    self.__add_raw(key, record["obj"])
+                elif record["op"] == "put":
+                    obj = classes[record["class"]](**record["obj"])
+                    self.__add(key, obj)
+                else:
+                    self.__remove(key)
+        FileStorage.__journal_offset = offset
+        FileStorage.__seen[path] = signature
+
+    def __sharded_as_configured(self, paths):
+        """tells whether the segment file names at paths all match
+        __shards"""
+        extension = self.__extension()
+        for path in paths:
+            parts = os.path.basename(path)[:-len(extension)].split(".")
+            if self.__shards == 1 and len(parts) != 1:
+                return False
+            if self.__shards > 1 and (len(parts) != 2 or
+                                      not parts[1].isdigit() or
+                                      int(parts[1]) >= self.__shards):
+                return False
+        return True
+
+    def __snapshot_paths(self):
+        """returns the files holding the snapshot, in loading order"""
+        directory = self.__segment_dir()
+        if self.__layout == "segments" and os.path.isdir(directory):
+            return [os.path.join(directory, f)
+                    for f in sorted(os.listdir(directory))
+                    if f.endswith(self.__extension())]
+        return [self.__file_path]
+
+    def reload(self):
+        """deserializes the JSON file and its journal to __objects,
+        skipping the files that did not change since they were last seen"""
+        with FileStorage.__lock.write():
+            with self.__file_lock(fcntl.LOCK_SH):
+                FileStorage.__stats[self.__reload()] += 1
+
+    def __pending_change(self, key):
+        """tells whether key changed in memory since the last save, in
+        which case what the files hold for it is older"""
+        return key in FileStorage.__dirty or key in FileStorage.__deleted
+
+    def __reload(self):
+        """reads the files that changed on disk into __objects; returns
+        which of the reload counters of metrics() this read is"""
+        paths = self.__snapshot_paths()
+        changed = [path for path in paths if self.__changed_on_disk(path)]
+        self.__read_segments(changed)
+        if self.__layout == "segments":
+            directory = self.__segment_dir() + os.sep
+            for path in [path for path in FileStorage.__seen
+                         if path.startswith(directory) and
+                         path not in paths]:
+                # another process removed a segment it emptied
+                self.__prune(path, set())
+                del FileStorage.__seen[path]
+        if changed and self.__layout == "segments" and \
+                changed[0] == self.__file_path:
+            # first save splits the single file into segments
+            FileStorage.__rewrite_all = True
+        elif changed and self.__layout == "segments" and \
+                not self.__sharded_as_configured(paths):
+            # first save moves every object to its shard for __shards
+            FileStorage.__rewrite_all = True
+        journal = self.__changed_on_disk(self.__journal_path())
+        if changed:
+            # a new snapshot may come with a rewritten journal
+            self.__replay_journal(0)
+        elif journal:
+            self.__replay_journal(FileStorage.__journal_offset)
+        if not changed and not journal:
+            return "reloads_avoided"
+        if len(changed) < len(paths) or not changed:
+            return "partial_reloads"
+        return "reloads"
 
     def delete(self, obj=None):
         """delete obj from __objects if it’s inside"""
         if obj is not None:
             key = str(obj.__class__.__name__) + '.' + str(obj.id)
-            FileStorage.__objects.pop(key, None)
+            with FileStorage.__lock.write():
+                self.__log_key(key)
+                if self.__remove(key) is not None:
+                    FileStorage.__deleted.add(key)
+                    FileStorage.__dirty.discard(key)
             self.save()
 
-    def get(self, cls, id):
-        """A method to retrieve one object."""
-        obj = None
-        try:
-            for val in self.__objects.values():
-                if val.id == id:
-                    obj = val
-        except BaseException:
-            pass
-        return obj
+    def get(self, cls, id, with_related=None):
+        """A method to retrieve one object; with_related is ignored, as in
+        all()"""
+        if cls is None:
+            return None
+        name = cls if isinstance(cls, str) else cls.__name__
+        key = name + "." + str(id)
+        if key in FileStorage.__raw:
+            with FileStorage.__lock.write():
+                return self.__hydrate(key)
+        # a single dictionary lookup needs no lock
+        return self.__objects.get(key)
 
     def count(self, cls=None):
         """Return the count of objects of class."""
-        count = 0
-        if cls is not None:
-            for k in self.__objects.keys():
-                if cls.__name__ in k:
-                    count += 1
-        else:
-            count = len(self.__objects)
-        return count
+        self.__fresh_index()
+        with FileStorage.__lock.read():
+            if cls is not None:
+                name = cls if isinstance(cls, str) else cls.__name__
+                return len(FileStorage.__by_class.get(name, {})) + \
+                    len(FileStorage.__raw_by_class.get(name, {}))
+            return len(self.__objects) + len(FileStorage.__raw)
+
+    def counts(self):
+        """returns the number of objects of each class, by class name"""
+        self.__fresh_index()
+        with FileStorage.__lock.read():
+            return {name: len(FileStorage.__by_class.get(name, {})) +
+                    len(FileStorage.__raw_by_class.get(name, {}))
+                    for name in classes}
+
+    def iter(self, cls=None, batch_size=None):
+        """yields the objects of cls, or of every class, one class at a
+        time; batch_size is for the engines that fetch rows in batches"""
+        for name in classes if cls is None else [cls]:
+            yield from self.all(name).values()
+
+    def related(self, cls, attr, value):
+        """returns the cls objects whose foreign key attr equals value"""
+        name = cls if isinstance(cls, str) else cls.__name__
+        self.__fresh_index()
+        with FileStorage.__lock.read():
+            index = FileStorage.__by_fk.get((name, attr), {})
+            found = list(index.get(value, {}).items())
+        if any(obj is None for key, obj in found):
+            with FileStorage.__lock.write():
+                return [obj if obj is not None else self.__hydrate(key)
+                        for key, obj in found]
+        return [obj for key, obj in found]
+
+    def changed(self, obj, name, old):
+        """marks obj dirty and keeps the reverse indexes in step with
+        obj.name, formerly old"""
+        key = obj.__class__.__name__ + "." + str(obj.__dict__.get("id"))
+        if self.__objects.get(key) is not obj:
+            return
+        with FileStorage.__lock.write():
+            if self.__objects.get(key) is not obj:
+                return
+            if FileStorage.__undo is not None:
+                FileStorage.__undo.append(("attr", obj, name, old))
+            FileStorage.__dirty.add(key)
+            cls_name = obj.__class__.__name__
+            if name in foreign_keys.get(cls_name, ()):
+                self.__index()
+                self.__unlink(key, cls_name, name, old)
+                self.__link(key, cls_name, obj, (name,))
+
+    def metrics(self):
+        """returns the counters kept by the storage engine"""
+        return dict(FileStorage.__stats)
+
+    def reshard(self, shards):
+        """rewrites the store as segment files with each class split into
+        shards files, removing the files of the previous layout"""
+        with FileStorage.__lock.write():
+            FileStorage.__shards = shards
+            FileStorage.__layout = "segments"
+            # rebuilds the segment buckets for the new shard count
+            FileStorage.__indexed = None
+            self.__index()
+            FileStorage.__rewrite_all = True
+            self.__write()
+            with self.__file_lock(fcntl.LOCK_EX):
+                # the segments now hold everything the single file and
+                # the journal did
+                for path in (self.__file_path, self.__journal_path()):
+                    if os.path.isfile(path):
+                        os.remove(path)
+                    FileStorage.__seen.pop(path, None)
+                FileStorage.__journal_offset = 0
+
+    def __log_key(self, key):
+        """remembers what key holds before the open transaction changes it"""
+        if FileStorage.__undo is not None:
+            previous = FileStorage.__raw.get(key, self.__objects.get(key))
+            FileStorage.__undo.append(("key", key, previous))
+
+    @contextmanager
+    def transaction(self):
+        """holds back save() until the block exits, then saves once if it
+        was called; if the block raises, the changes it made to the
+        objects in memory are undone instead. Nested blocks join the
+        outermost one. The block holds the write lock, so other threads
+        neither see nor interleave with its changes."""
+        with FileStorage.__lock.write():
+            if FileStorage.__depth == 0:
+                FileStorage.__pending = False
+                FileStorage.__undo = []
+                state = (set(FileStorage.__dirty),
+                         set(FileStorage.__deleted),
+                         FileStorage.__rewrite_all)
+            FileStorage.__depth += 1
+            try:
+                yield self
+            except BaseException:
+                if FileStorage.__depth == 1:
+                    self.__rollback(*state)
+                raise
+            finally:
+                FileStorage.__depth -= 1
+                if FileStorage.__depth == 0:
+                    FileStorage.__undo = None
+            if FileStorage.__depth == 0 and FileStorage.__pending:
+                FileStorage.__pending = False
+                self.save()
+
+    def __rollback(self, dirty, deleted, rewrite_all):
+        """undoes the open transaction, newest change first"""
+        for record in reversed(FileStorage.__undo):
+            if record[0] == "attr":
+                _, obj, name, old = record
+                # bypass __setattr__, the indexes are rebuilt below
+                if old is None:
+                    obj.__dict__.pop(name, None)
+                else:
+                    obj.__dict__[name] = old
+                continue
+            _, key, previous = record
+            self.__objects.pop(key, None)
+            FileStorage.__raw.pop(key, None)
+            if isinstance(previous, dict):
+                FileStorage.__raw[key] = previous
+            elif previous is not None:
+                self.__objects[key] = previous
+        FileStorage.__raw_by_class = {}
+        for key, record in FileStorage.__raw.items():
+            FileStorage.__raw_by_class.setdefault(
+                record["__class__"], {})[key] = record
+        FileStorage.__indexed = None
+        self.__index()
+        FileStorage.__dirty = dirty
+        FileStorage.__deleted = deleted
+        FileStorage.__rewrite_all = rewrite_all
+        FileStorage.__pending = False
 
     def close(self):
         """call reload() method for deserializing the JSON file to objects"""
@@ -0,0 +1,92 @@
+#!/usr/bin/python3
+"""
+Contains the RWLock class
+"""
+
+from contextlib import contextmanager
+import threading
+
+
+class RWLock:
+    """lets any number of threads read, or one thread write
+
+    Both sides are reentrant and the writer may also read. A waiting
+    writer holds off new readers, so a stream of reads cannot starve it.
+    A reader cannot upgrade to writing: that would deadlock against a
+    second reader doing the same, so it raises RuntimeError instead.
+    """
+
+    def __init__(self):
+        """Instantiate an unlocked RWLock"""
+        self.__cond = threading.Condition(threading.Lock())
+        # dictionary - thread id -> depth of its read() blocks
+        self.__readers = {}
+        # thread id of the writer and the depth of its write() blocks
+        self.__writer = None
+        self.__writes = 0
+        # int - writers waiting for the readers to leave
+        self.__waiting = 0
+
+    def acquire_read(self):
+        """blocks until the calling thread may read"""
+        me = threading.get_ident()
+        with self.__cond:
+            if me != self.__writer and me not in self.__readers:
+                self.__cond.wait_for(lambda: self.__writer is None and
+                                     not self.__waiting)
+            self.__readers[me] = self.__readers.get(me, 0) + 1
+
+    def release_read(self):
+        """ends a read started by acquire_read()"""
+        me = threading.get_ident()
+        with self.__cond:
+            if self.__readers[me] == 1:
+                del self.__readers[me]
+                if not self.__readers:
+                    self.__cond.notify_all()
+            else:
+                self.__readers[me] -= 1
+
+    def acquire_write(self):
+        """blocks until the calling thread is the only one in the lock"""
+        me = threading.get_ident()
+        with self.__cond:
+            if me == self.__writer:
+                self.__writes += 1
+                return
+            if me in self.__readers:
+                raise RuntimeError("cannot upgrade a read lock to write")
+            self.__waiting += 1
+            try:
+                self.__cond.wait_for(lambda: self.__writer is None and
+                                     not self.__readers)
+            finally:
+                self.__waiting -= 1
+            self.__writer = me
+            self.__writes = 1
+
+    def release_write(self):
+        """ends a write started by acquire_write()"""
+        with self.__cond:
+            self.__writes -= 1
+            if self.__writes == 0:
+                self.__writer = None
+                self.__cond.notify_all()
+
+    @contextmanager
+    def read(self):
+        """holds the lock for reading for the duration of the block"""
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        """holds the lock for writing for the duration of the block"""
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
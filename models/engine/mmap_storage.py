@@ -0,0 +1,505 @@
+#!/usr/bin/python3
+"""
+Contains the MmapStorage class
+"""
+
+from contextlib import contextmanager
+import fcntl
+import json
+import mmap
+import os
+import struct
+from models.base_model import mark_stored
+from models.engine import bulk
+from models.engine.codecs import codec_for_path, compression_for_path, \
+    json_default, open_snapshot
+from models.engine.file_storage import classes, foreign_keys
+from models.engine.locks import RWLock
+
+# file header: magic, number of records, offset of the index
+header = struct.Struct("<8sQQ")
+# index entry, sorted by key: record offset, key length, record length
+entry = struct.Struct("<QII")
+magic = b"HBNBMM01"
+
+
+def write_snapshot(path, items):
+    """atomically writes the (key, record) byte string pairs, given in key
+    order, as an indexed snapshot at path"""
+    # each process writes its own temporary file
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    index = bytearray()
+    with open(tmp_path, 'wb') as f:
+        f.write(header.pack(magic, 0, 0))
+        offset = header.size
+        count = 0
+        for key, record in items:
+            f.write(key)
+            f.write(record)
+            index += entry.pack(offset, len(key), len(record))
+            offset += len(key) + len(record)
+            count += 1
+        f.write(index)
+        f.seek(0)
+        f.write(header.pack(magic, count, offset))
+    os.replace(tmp_path, path)
+
+
+def convert(src, dst):
+    """rewrites the snapshot file src (any codec or compression) as the
+    indexed snapshot dst; returns the number of records"""
+    codec = codec_for_path(src)
+    with open_snapshot(src, "r", codec, compression_for_path(src)) as f:
+        items = sorted((key.encode("utf-8"), json.dumps(
+            record, default=json_default).encode("utf-8"))
+            for key, record in codec.load(f))
+    write_snapshot(dst, items)
+    return len(items)
+
+
+class MmapStorage:
+    """serves objects straight from a memory-mapped, key-indexed snapshot
+
+    Records are decoded one at a time on access: get() binary-searches the
+    index in the mapping and all(cls) walks the key range of cls, so worker
+    processes share the data through the page cache instead of each
+    holding a decoded copy. Changes stay in memory until save() writes a
+    new snapshot, copying the untouched records as they are.
+    """
+
+    # string - path to the indexed snapshot
+    __file_path = "file.mmap"
+    # string - snapshot imported when __file_path does not exist yet
+    __import_path = "file.json"
+    # mmap.mmap - the mapped snapshot, None when there is none
+    __map = None
+    __count = 0
+    __index_offset = 0
+    # (mtime, size, inode) of the mapped snapshot
+    __seen = None
+    # dictionary - objects decoded or added since the snapshot was mapped
+    __objects = {}
+    # dictionary - <class name> -> {<class name>.id: obj}, mirrors __objects
+    __by_class = {}
+    # sets - keys not in the snapshot yet / changed / deleted from it
+    __added = set()
+    __dirty = set()
+    __deleted = set()
+    # dictionary - (<class name>, attribute) -> {value: [key, ...]}
+    __by_fk = {}
+    # dictionary - counters reported by metrics()
+    __stats = {"records_decoded": 0, "remaps": 0, "reloads_avoided": 0}
+    # (pid, open file) - the lock file save() holds, per process
+    __lock_file = None
+    # RWLock - readers of the mapping share it; changes, remaps and
+    # transaction() blocks take it alone
+    __lock = RWLock()
+    # int - depth of the open transaction() blocks, save() waits for 0
+    __depth = 0
+    # bool - save() was called inside the open transaction
+    __pending = False
+    # list - (obj, attribute, old value) changes of the open transaction,
+    # None outside of one
+    __undo = None
+
+    def __entry(self, i):
+        """returns (record offset, key length, record length) of entry i"""
+        return entry.unpack_from(self.__map,
+                                 self.__index_offset + i * entry.size)
+
+    def __key(self, i):
+        """returns the key of entry i as bytes"""
+        offset, key_len, _ = self.__entry(i)
+        return self.__map[offset:offset + key_len]
+
+    def __bisect(self, key):
+        """returns the first entry whose key is not below key (bytes)"""
+        lo, hi = 0, self.__count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.__key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def __find(self, key):
+        """returns the entry of key (str), -1 if it is not in the snapshot"""
+        if self.__map is None:
+            return -1
+        raw = key.encode("utf-8")
+        i = self.__bisect(raw)
+        if i < self.__count and self.__key(i) == raw:
+            return i
+        return -1
+
+    def __range(self, name):
+        """returns the entries [lo, hi) holding the objects of class name"""
+        if self.__map is None:
+            return 0, 0
+        # keys are "<class name>.<id>" and "/" sorts right after "."
+        return (self.__bisect(name.encode("utf-8") + b"."),
+                self.__bisect(name.encode("utf-8") + b"/"))
+
+    def __record(self, i):
+        """decodes entry i into (key, record)"""
+        offset, key_len, length = self.__entry(i)
+        start = offset + key_len
+        MmapStorage.__stats["records_decoded"] += 1
+        return (self.__map[offset:start].decode("utf-8"),
+                json.loads(self.__map[start:start + length]))
+
+    def __hydrate(self, i):
+        """returns the object of entry i, building it on first access"""
+        offset, key_len, _ = self.__entry(i)
+        key = self.__map[offset:offset + key_len].decode("utf-8")
+        obj = MmapStorage.__objects.get(key)
+        if obj is None and key not in MmapStorage.__deleted:
+            key, record = self.__record(i)
+            obj = classes[record["__class__"]](**record)
+            # readers hydrate side by side: the first object built wins
+            kept = MmapStorage.__objects.setdefault(key, obj)
+            if kept is obj:
+                self.__store(key, obj)
+            obj = kept
+        return obj
+
+    def __store(self, key, obj):
+        """keeps obj in __objects and the per-class index"""
+        MmapStorage.__objects[key] = obj
+        mark_stored(obj)
+        name = obj.__class__.__name__
+        MmapStorage.__by_class.setdefault(name, {})[key] = obj
+
+    def all(self, cls=None, with_related=None):
+        """returns the objects of cls, or every object, by key;
+        with_related is for DBStorage, relationships are index lookups"""
+        if cls is None:
+            for name in classes:
+                self.all(name)
+            return MmapStorage.__objects
+        name = cls if isinstance(cls, str) else cls.__name__
+        with MmapStorage.__lock.read():
+            lo, hi = self.__range(name)
+            for i in range(lo, hi):
+                self.__hydrate(i)
+            return dict(MmapStorage.__by_class.get(name, {}))
+
+    def new(self, obj):
+        """adds obj to the objects to write on the next save"""
+        if obj is not None:
+            key = obj.__class__.__name__ + "." + str(obj.id)
+            with MmapStorage.__lock.write():
+                if key not in MmapStorage.__objects and \
+                        self.__find(key) < 0:
+                    MmapStorage.__added.add(key)
+                self.__store(key, obj)
+                MmapStorage.__dirty.add(key)
+                MmapStorage.__deleted.discard(key)
+                self.__forget_fk(obj.__class__.__name__)
+
+    def bulk_new(self, items, cls=None, chunk_size=10000):
+        """stores items, model instances or dicts like to_dict() returns
+        (of class cls when they have no __class__), then writes a single
+        snapshot; returns the seconds each chunk of chunk_size items took,
+        the write counted in the last one"""
+        return self.__bulk(items, cls, chunk_size, False)
+
+    def bulk_upsert(self, items, cls=None, chunk_size=10000):
+        """bulk_new(), except that a dict with the id of a stored object
+        sets the attributes it holds on that object, keeping its
+        created_at and refreshing its updated_at, as DBStorage does"""
+        return self.__bulk(items, cls, chunk_size, True)
+
+    def __bulk(self, items, cls, chunk_size, upsert):
+        """stores items a chunk at a time, then saves"""
+        return bulk.store(self, items, cls, chunk_size, upsert, classes,
+                          lock=MmapStorage.__lock.write)
+
+    def save(self):
+        """writes a new snapshot: changed objects are encoded, the other
+        records are copied from the mapping as they are"""
+        with MmapStorage.__lock.write():
+            if MmapStorage.__depth:
+                MmapStorage.__pending = True
+                return
+            changed = sorted(MmapStorage.__dirty | MmapStorage.__deleted)
+            if not changed and self.__map is not None:
+                return
+            with self.__file_lock():
+                if self.__stat() != MmapStorage.__seen:
+                    # copy the records another process saved, not ours
+                    self.__remap()
+                write_snapshot(self.__file_path, self.__merge(changed))
+                MmapStorage.__added.clear()
+                MmapStorage.__dirty.clear()
+                MmapStorage.__deleted.clear()
+                # the objects in memory are what was just written
+                self.__remap(keep_all=True)
+
+    @contextmanager
+    def __file_lock(self):
+        """holds the lock file that orders the writers of the snapshot"""
+        held = MmapStorage.__lock_file
+        path = self.__file_path + ".lock"
+        # flock locks belong to the open file, which a fork shares
+        if held is None or held[0] != os.getpid() or held[1].name != path:
+            MmapStorage.__lock_file = held = (os.getpid(), open(path, 'a'))
+        fcntl.flock(held[1], fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(held[1], fcntl.LOCK_UN)
+
+    def __stat(self):
+        """returns (mtime, size, inode) of the snapshot, None if there is
+        none"""
+        try:
+            st = os.stat(self.__file_path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def __merge(self, changed):
+        """yields the (key, record) byte pairs of the next snapshot"""
+        i = 0
+        for key in changed + [None]:
+            raw = key.encode("utf-8") if key is not None else None
+            stop = self.__bisect(raw) if raw is not None else self.__count
+            for j in range(i, stop):
+                offset, key_len, length = self.__entry(j)
+                start = offset + key_len
+                yield (self.__map[offset:start],
+                       self.__map[start:start + length])
+            i = stop
+            if key is None:
+                return
+            if i < self.__count and self.__key(i) == raw:
+                i += 1
+            obj = MmapStorage.__objects.get(key)
+            if key not in MmapStorage.__deleted and obj is not None:
+                yield raw, json.dumps(obj.to_dict()).encode("utf-8")
+
+    def delete(self, obj=None):
+        """deletes obj from storage"""
+        if obj is not None:
+            name = obj.__class__.__name__
+            key = name + "." + str(obj.id)
+            with MmapStorage.__lock.write():
+                MmapStorage.__objects.pop(key, None)
+                MmapStorage.__by_class.get(name, {}).pop(key, None)
+                MmapStorage.__dirty.discard(key)
+                if key in MmapStorage.__added:
+                    MmapStorage.__added.discard(key)
+                elif self.__find(key) >= 0:
+                    MmapStorage.__deleted.add(key)
+                self.__forget_fk(name)
+                self.save()
+
+    def __remap(self, keep_all=False):
+        """maps the snapshot on disk; unless keep_all, the objects that are
+        not waiting for a save are dropped so they get decoded again"""
+        if MmapStorage.__map is not None:
+            MmapStorage.__map.close()
+            MmapStorage.__map = None
+        MmapStorage.__count = 0
+        MmapStorage.__seen = None
+        keep = MmapStorage.__dirty | MmapStorage.__added
+        objects = {key: obj for key, obj in MmapStorage.__objects.items()
+                   if keep_all or key in keep}
+        MmapStorage.__objects = {}
+        MmapStorage.__by_class = {}
+        MmapStorage.__by_fk = {}
+        for key, obj in objects.items():
+            self.__store(key, obj)
+        try:
+            with open(self.__file_path, 'rb') as f:
+                st = os.fstat(f.fileno())
+                MmapStorage.__map = mmap.mmap(f.fileno(), 0,
+                                              access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return
+        tag, count, index_offset = header.unpack_from(MmapStorage.__map)
+        if tag != magic:
+            raise ValueError("{} is not an indexed snapshot".format(
+                self.__file_path))
+        MmapStorage.__count = count
+        MmapStorage.__index_offset = index_offset
+        MmapStorage.__seen = (st.st_mtime_ns, st.st_size, st.st_ino)
+        MmapStorage.__stats["remaps"] += 1
+
+    def reload(self):
+        """maps the snapshot again if another writer replaced it"""
+        if not os.path.exists(self.__file_path) and \
+                os.path.exists(self.__import_path):
+            with self.__file_lock():
+                if not os.path.exists(self.__file_path):
+                    convert(self.__import_path, self.__file_path)
+        if self.__stat() == MmapStorage.__seen:
+            MmapStorage.__stats["reloads_avoided"] += 1
+            return
+        # the readers of the old mapping finish before it is closed
+        with MmapStorage.__lock.write():
+            self.__remap()
+
+    def get(self, cls, id, with_related=None):
+        """returns the object of class cls with id, None if not found;
+        with_related is ignored, as in all()"""
+        if cls is None:
+            return None
+        name = cls if isinstance(cls, str) else cls.__name__
+        key = name + "." + str(id)
+        obj = MmapStorage.__objects.get(key)
+        if obj is not None or key in MmapStorage.__deleted:
+            return obj
+        with MmapStorage.__lock.read():
+            i = self.__find(key)
+            return self.__hydrate(i) if i >= 0 else None
+
+    def count(self, cls=None):
+        """returns the number of objects of cls, or of every class"""
+        with MmapStorage.__lock.read():
+            if cls is None:
+                lo, hi = 0, self.__count
+                prefix = ""
+            else:
+                name = cls if isinstance(cls, str) else cls.__name__
+                lo, hi = self.__range(name)
+                prefix = name + "."
+            added = sum(1 for k in MmapStorage.__added
+                        if k.startswith(prefix))
+            deleted = sum(1 for k in MmapStorage.__deleted
+                          if k.startswith(prefix))
+            return hi - lo + added - deleted
+
+    def counts(self):
+        """returns the number of objects of each class, by class name"""
+        return {name: self.count(name) for name in classes}
+
+    def iter(self, cls=None, batch_size=None):
+        """yields the objects of cls, or of every class, decoding them one
+        at a time in key order; batch_size is for the engines that fetch
+        rows in batches. The read lock is only held for each step, so
+        the consumer may save and the mapping may change in between."""
+        for name in classes if cls is None else [cls]:
+            name = name if isinstance(name, str) else name.__name__
+            after = None
+            while True:
+                after, obj = self.__next(name, after)
+                if obj is None:
+                    break
+                yield obj
+            with MmapStorage.__lock.read():
+                added = [MmapStorage.__objects[key]
+                         for key in sorted(MmapStorage.__added)
+                         if key.startswith(name + ".")]
+            yield from added
+
+    def __next(self, name, after):
+        """returns (key, object) of the first entry of class name whose
+        key (bytes) sorts after after, (None, None) past the last one"""
+        with MmapStorage.__lock.read():
+            lo, hi = self.__range(name)
+            i = lo if after is None else max(lo, self.__bisect(after + b"\0"))
+            for i in range(i, hi):
+                obj = self.__hydrate(i)
+                if obj is not None:
+                    return self.__key(i), obj
+            return None, None
+
+    def __forget_fk(self, name):
+        """drops the reverse indexes of class name"""
+        for attr in foreign_keys.get(name, ()):
+            MmapStorage.__by_fk.pop((name, attr), None)
+
+    def related(self, cls, attr, value):
+        """returns the cls objects whose foreign key attr equals value"""
+        name = cls if isinstance(cls, str) else cls.__name__
+        index = MmapStorage.__by_fk.get((name, attr))
+        if index is None:
+            index = {}
+            with MmapStorage.__lock.read():
+                # other readers may hydrate objects meanwhile, which then
+                # still hold what their records do
+                objects = dict(MmapStorage.__by_class.get(name, {}))
+                lo, hi = self.__range(name)
+                for i in range(lo, hi):
+                    key, record = self.__record(i)
+                    if key not in objects and \
+                            key not in MmapStorage.__deleted:
+                        index.setdefault(record.get(attr), []).append(key)
+                for key, obj in objects.items():
+                    index.setdefault(getattr(obj, attr, None),
+                                     []).append(key)
+                MmapStorage.__by_fk[(name, attr)] = index
+        return [self.get(name, key.split(".", 1)[1])
+                for key in index.get(value, [])]
+
+    def changed(self, obj, name, old):
+        """marks obj dirty after its attribute name changed from old"""
+        key = obj.__class__.__name__ + "." + str(obj.__dict__.get("id"))
+        with MmapStorage.__lock.write():
+            if MmapStorage.__objects.get(key) is obj:
+                if MmapStorage.__undo is not None:
+                    MmapStorage.__undo.append((obj, name, old))
+                MmapStorage.__dirty.add(key)
+                if name in foreign_keys.get(obj.__class__.__name__, ()):
+                    self.__forget_fk(obj.__class__.__name__)
+
+    @contextmanager
+    def transaction(self):
+        """holds back save() until the block exits, then saves once if it
+        was called; if the block raises, the changes it made in memory are
+        undone instead. Nested blocks join the outermost one. The block
+        holds the lock of the changes, so the other threads wait for it
+        instead of having their saves held back or rolled back."""
+        with MmapStorage.__lock.write():
+            if MmapStorage.__depth == 0:
+                MmapStorage.__pending = False
+                MmapStorage.__undo = []
+                # only the objects decoded or changed so far are in memory
+                state = (dict(MmapStorage.__objects),
+                         set(MmapStorage.__added), set(MmapStorage.__dirty),
+                         set(MmapStorage.__deleted))
+            MmapStorage.__depth += 1
+            try:
+                yield self
+            except BaseException:
+                if MmapStorage.__depth == 1:
+                    self.__rollback(*state)
+                raise
+            finally:
+                MmapStorage.__depth -= 1
+                if MmapStorage.__depth == 0:
+                    MmapStorage.__undo = None
+            if MmapStorage.__depth == 0 and MmapStorage.__pending:
+                MmapStorage.__pending = False
+                self.save()
+
+    def __rollback(self, objects, added, dirty, deleted):
+        """undoes the open transaction"""
+        for obj, name, old in reversed(MmapStorage.__undo):
+            if old is None:
+                obj.__dict__.pop(name, None)
+            else:
+                obj.__dict__[name] = old
+        MmapStorage.__objects = {}
+        MmapStorage.__by_class = {}
+        MmapStorage.__by_fk = {}
+        for key, obj in objects.items():
+            self.__store(key, obj)
+        MmapStorage.__added = added
+        MmapStorage.__dirty = dirty
+        MmapStorage.__deleted = deleted
+        MmapStorage.__pending = False
+
+    def metrics(self):
+        """returns the counters kept by the storage engine"""
+        stats = dict(MmapStorage.__stats)
+        stats["records"] = MmapStorage.__count
+        stats["objects_decoded"] = len(MmapStorage.__objects)
+        return stats
+
+    def close(self):
+        """call reload() to pick up a snapshot written by another process"""
+        self.reload()
@@ -0,0 +1,148 @@
+#!/usr/bin/python3
+"""
+Counts the SQL statements each page of the API and of web_flask sends to
+DBStorage, on SQLite, and checks they do not grow with the rows
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+root = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+# seeds n states of n cities of n places, each with n reviews and n
+# amenities, then prints the statements each page sent, by page
+harness = """
+import importlib, json, sys
+import models
+from sqlalchemy import event
+from models.amenity import Amenity
+from models.city import City
+from models.place import Place
+from models.review import Review
+from models.state import State
+from models.user import User
+storage = models.storage
+n = int(sys.argv[1])
+user = User(email="a@b.c", password="pwd")
+storage.new(user)
+amenities = [Amenity(name=str(i)) for i in range(n)]
+for amenity in amenities:
+    storage.new(amenity)
+for i in range(n):
+    state = State(name=str(i))
+    storage.new(state)
+    for j in range(n):
+        city = City(name=str(j), state_id=state.id)
+        storage.new(city)
+        for k in range(n):
+            place = Place(name=str(k), city_id=city.id, user_id=user.id)
+            place.amenities.extend(amenities)
+            storage.new(place)
+            for m in range(n):
+                storage.new(Review(text=str(m), place_id=place.id,
+                                   user_id=user.id))
+storage.save()
+storage.close()
+statements = []
+event.listen(storage._DBStorage__engine, "before_cursor_execute",
+             lambda *args: statements.append(args[2]))
+state = sorted(storage.all(State).values(), key=lambda s: s.name)[0]
+city = sorted(state.cities, key=lambda c: c.name)[0]
+place = city.places[0]
+storage.close()
+ids = {"state_id": state.id, "city_id": city.id, "place_id": place.id}
+pages = {"api.v1.app": ["/api/v1/states", "/api/v1/states/{state_id}",
+                        "/api/v1/states/{state_id}/cities",
+                        "/api/v1/cities/{city_id}/places",
+                        "/api/v1/places/{place_id}/reviews",
+                        "/api/v1/amenities", "/api/v1/users",
+                        "/api/v1/stats"],
+         "web_flask.7-states_list": ["/states_list"],
+         "web_flask.8-cities_by_states": ["/cities_by_states"],
+         "web_flask.9-states": ["/states", "/states/{state_id}"],
+         "web_flask.10-hbnb_filters": ["/hbnb_filters"]}
+counts = {}
+for module, urls in pages.items():
+    client = importlib.import_module(module).app.test_client()
+    for url in urls:
+        del statements[:]
+        response = client.get(url.format(**ids))
+        # streamed lists only query as they are read
+        response.get_data()
+        assert response.status_code == 200, (url, response.status_code)
+        counts[module + " " + url] = len(statements)
+print(json.dumps(counts))
+"""
+
+
+class TestQueryCounts(unittest.TestCase):
+    """Test that every page loads in a fixed number of queries"""
+
+    def setUp(self):
+        """Make a scratch directory for the database"""
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the scratch directory"""
+        shutil.rmtree(self.tmp)
+
+    def statements(self, n):
+        """Return the statements each page sends with n rows a level, on
+        a fresh database"""
+        path = os.path.join(self.tmp, "{}.sqlite".format(n))
+        env = dict(os.environ, HBNB_TYPE_STORAGE="sqlite",
+                   HBNB_SQLITE_PATH=path, PYTHONPATH=root)
+        env.pop("HBNB_ENV", None)
+        out = subprocess.check_output(
+            [sys.executable, "-c", harness, str(n)], cwd=self.tmp, env=env)
+        return json.loads(out)
+
+    def test_fixed_statements(self):
+        """Test that no page sends more statements for more rows"""
+        small = self.statements(2)
+        large = self.statements(4)
+        for page in small:
+            with self.subTest(page=page):
+                self.assertEqual(large[page], small[page])
+
+    def test_lazy_loading_grows(self):
+        """Test that the count catches a relationship loaded per row"""
+        path = os.path.join(self.tmp, "lazy.sqlite")
+        env = dict(os.environ, HBNB_TYPE_STORAGE="sqlite",
+                   HBNB_SQLITE_PATH=path, PYTHONPATH=root)
+        env.pop("HBNB_ENV", None)
+        code = ("import models\n"
+                "from sqlalchemy import event\n"
+                "from models.city import City\n"
+                "from models.state import State\n"
+                "for i in range({}):\n"
+                "    state = State(name=str(i))\n"
+                "    models.storage.new(state)\n"
+                "    models.storage.new(City(name='c', state_id=state.id))\n"
+                "models.storage.save()\n"
+                "models.storage.close()\n"
+                "statements = []\n"
+                "event.listen(models.storage._DBStorage__engine,\n"
+                "             'before_cursor_execute',\n"
+                "             lambda *args: statements.append(args[2]))\n"
+                "for related in (None, 'cities'):\n"
+                "    del statements[:]\n"
+                "    for state in models.storage.all(\n"
+                "            State, with_related=related).values():\n"
+                "        state.cities\n"
+                "    models.storage.close()\n"
+                "    print(len(statements))")
+        out = subprocess.check_output(
+            [sys.executable, "-c", code.format(5)], cwd=self.tmp,
+            env=env).split()
+        self.assertEqual([int(count) for count in out], [6, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+#!/usr/bin/python3
+"""
+Checks that the list endpoints of the API stream their objects from
+storage.iter(), so their memory use does not grow with the table
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+root = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+# bulk loads n users, then prints the users GET /api/v1/users sent, the
+# peak memory allocated while reading it and whether it was streamed
+harness = """
+import sys, tracemalloc
+import models
+from models.user import User
+from api.v1.app import app
+n = int(sys.argv[1])
+models.storage.bulk_new(({"email": str(i), "password": "p"}
+                         for i in range(n)), User)
+models.storage.close()
+client = app.test_client()
+tracemalloc.start()
+response = client.get("/api/v1/users", buffered=False)
+size = 0
+for chunk in response.response:
+    size += len(chunk)
+response.close()
+peak = tracemalloc.get_traced_memory()[1]
+tracemalloc.stop()
+print(response.is_streamed, size > 2 * n, peak)
+"""
+
+
+class TestStreaming(unittest.TestCase):
+    """Test that list endpoints stream from storage.iter()"""
+
+    def setUp(self):
+        """Make a scratch directory for the database"""
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the scratch directory"""
+        shutil.rmtree(self.tmp)
+
+    def run_api(self, code, *args):
+        """Run code on a fresh SQLite database and return what it prints"""
+        path = os.path.join(self.tmp, "{}.sqlite".format(len(os.listdir(
+            self.tmp))))
+        env = dict(os.environ, HBNB_TYPE_STORAGE="sqlite",
+                   HBNB_SQLITE_PATH=path, PYTHONPATH=root)
+        env.pop("HBNB_ENV", None)
+        return subprocess.check_output(
+            [sys.executable, "-c", code] + [str(arg) for arg in args],
+            cwd=self.tmp, env=env).decode().split()
+
+    def test_flat_memory(self):
+        """Test that reading 10 times the users takes about the same
+        memory, a batch of rows at a time"""
+        small = self.run_api(harness, 2000)
+        large = self.run_api(harness, 20000)
+        self.assertEqual(small[:2], ["True", "True"])
+        self.assertEqual(large[:2], ["True", "True"])
+        self.assertLess(int(large[2]), 1.5 * int(small[2]))
+
+    def test_lists(self):
+        """Test that the streamed lists hold every object, or none"""
+        out = self.run_api(
+            "import json\n"
+            "import models\n"
+            "from models.state import State\n"
+            "from api.v1.app import app\n"
+            "client = app.test_client()\n"
+            "print(client.get('/api/v1/amenities').get_data(as_text=True))\n"
+            "models.storage.bulk_new(State(name=str(i)) for i in range(3))\n"
+            "states = json.loads(client.get('/api/v1/states').get_data())\n"
+            "print(sorted(state['name'] for state in states),\n"
+            "      states[0]['__class__'])")
+        self.assertEqual(out, ["[]", "['0',", "'1',", "'2']", "State"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -96,6 +96,14 @@ class TestBaseModel(unittest.TestCase):
         self.assertNotEqual(inst1.created_at, inst2.created_at)
         self.assertNotEqual(inst1.updated_at, inst2.updated_at)
 
+    def test_datetime_kwargs(self):
+        """Test that datetime values passed as kwargs are kept"""
+        created = datetime(2020, 1, 2, 3, 4, 5, 6)
+        updated = datetime(2021, 1, 2, 3, 4, 5, 6)
+        inst = BaseModel(id="1", created_at=created, updated_at=updated)
+        self.assertEqual(inst.created_at, created)
+        self.assertEqual(inst.updated_at, updated)
+
     def test_uuid(self):
         """Test that id is a valid uuid"""
         inst1 = BaseModel()
@@ -0,0 +1,82 @@
+#!/usr/bin/python3
+"""
+Contains the TestBulkDocs and TestBulk classes
+"""
+
+from datetime import datetime
+import inspect
+from models.engine import bulk
+from models.state import State
+import pep8
+import unittest
+
+
+class TestBulkDocs(unittest.TestCase):
+    """Tests to check the documentation and style of the bulk module"""
+    @classmethod
+    def setUpClass(cls):
+        """Set up for the doc tests"""
+        cls.funcs = inspect.getmembers(bulk, inspect.isfunction)
+
+    def test_pep8_conformance_bulk(self):
+        """Test that models/engine/bulk.py conforms to PEP8."""
+        pep8s = pep8.StyleGuide(quiet=True)
+        result = pep8s.check_files(['models/engine/bulk.py'])
+        self.assertEqual(result.total_errors, 0,
+                         "Found code style errors (and warnings).")
+
+    def test_pep8_conformance_test_bulk(self):
+        """Test that tests/test_models/test_engine/test_bulk.py conforms
+        to PEP8."""
+        pep8s = pep8.StyleGuide(quiet=True)
+        result = pep8s.check_files(['tests/test_models/test_engine/\
+test_bulk.py'])
+        self.assertEqual(result.total_errors, 0,
+                         "Found code style errors (and warnings).")
+
+    def test_bulk_module_docstring(self):
+        """Test for the bulk.py module docstring"""
+        self.assertIsNot(bulk.__doc__, None,
+                         "bulk.py needs a docstring")
+        self.assertTrue(len(bulk.__doc__) >= 1,
+                        "bulk.py needs a docstring")
+
+    def test_bulk_func_docstrings(self):
+        """Test for the presence of docstrings in the bulk functions"""
+        for func in self.funcs:
+            self.assertIsNot(func[1].__doc__, None,
+                             "{:s} needs a docstring".format(func[0]))
+            self.assertTrue(len(func[1].__doc__) >= 1,
+                            "{:s} needs a docstring".format(func[0]))
+
+
+class TestBulk(unittest.TestCase):
+    """Test the chunking and the items of the bulk methods"""
+
+    def test_chunks(self):
+        """Test that chunks() splits any iterable in lists of up to size"""
+        self.assertEqual(list(bulk.chunks(iter(range(5)), 2)),
+                         [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(bulk.chunks([], 2)), [])
+
+    def test_instance(self):
+        """Test that an instance comes back as it is"""
+        state = State(name="Utah")
+        self.assertEqual(bulk.split_item(state), ("State", state, None))
+
+    def test_dict(self):
+        """Test that a dict gives its class and a copy of its attributes,
+        with datetime timestamps"""
+        record = State(name="Utah").to_dict()
+        name, obj, attrs = bulk.split_item(record)
+        self.assertEqual((name, obj), ("State", None))
+        self.assertNotIn("__class__", attrs)
+        self.assertIs(type(attrs["created_at"]), datetime)
+        self.assertIn("__class__", record)
+
+    def test_dict_class(self):
+        """Test that a dict without __class__ is of class cls"""
+        self.assertEqual(bulk.split_item({"id": "1"}, State)[0], "State")
+        self.assertEqual(bulk.split_item({"id": "1"}, "City")[0], "City")
+        with self.assertRaises(ValueError):
+            bulk.split_item({"id": "1"})
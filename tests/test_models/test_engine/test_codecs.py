@@ -0,0 +1,183 @@
+#!/usr/bin/python3
+"""
+Contains the TestCodecsDocs, TestJSONRecords and TestCompression classes
+"""
+
+from datetime import datetime
+import gzip
+import inspect
+import io
+import json
+import os
+from models.engine import codecs
+import pep8
+import tempfile
+import unittest
+
+
+class TestCodecsDocs(unittest.TestCase):
+    """Tests to check the documentation and style of the codecs module"""
+    @classmethod
+    def setUpClass(cls):
+        """Set up for the doc tests"""
+        cls.funcs = inspect.getmembers(codecs, inspect.isfunction)
+        cls.funcs += inspect.getmembers(codecs.JSONScanner,
+                                        inspect.isfunction)
+
+    def test_pep8_conformance_codecs(self):
+        """Test that models/engine/codecs.py conforms to PEP8."""
+        pep8s = pep8.StyleGuide(quiet=True)
+        result = pep8s.check_files(['models/engine/codecs.py'])
+        self.assertEqual(result.total_errors, 0,
+                         "Found code style errors (and warnings).")
+
+    def test_pep8_conformance_test_codecs(self):
+        """Test that tests/test_models/test_engine/test_codecs.py conforms
+        to PEP8."""
+        pep8s = pep8.StyleGuide(quiet=True)
+        result = pep8s.check_files(['tests/test_models/test_engine/\
+test_codecs.py'])
+        self.assertEqual(result.total_errors, 0,
+                         "Found code style errors (and warnings).")
+
+    def test_codecs_module_docstring(self):
+        """Test for the codecs.py module docstring"""
+        self.assertIsNot(codecs.__doc__, None,
+                         "codecs.py needs a docstring")
+        self.assertTrue(len(codecs.__doc__) >= 1,
+                        "codecs.py needs a docstring")
+
+    def test_codecs_func_docstrings(self):
+        """Test for the presence of docstrings in codecs functions"""
+        for func in self.funcs:
+            self.assertIsNot(func[1].__doc__, None,
+                             "{:s} needs a docstring".format(func[0]))
+            self.assertTrue(len(func[1].__doc__) >= 1,
+                            "{:s} needs a docstring".format(func[0]))
+
+
+class TestJSONRecords(unittest.TestCase):
+    """Test the streaming JSON reader and writer"""
+    records = {"State.1": {"id": "1", "name": "a \"quoted\" {name}"},
+               "City.2": {"id": "2", "name": "Zürich, \n\t", "n": 1.5},
+               "User.3": {"id": "3", "tags": [1, {"x": None}]}}
+
+    def test_dump_json_is_json(self):
+        """Test that dump_json writes one valid JSON object"""
+        f = io.StringIO()
+        codecs.dump_json(f, self.records.items())
+        self.assertEqual(json.loads(f.getvalue()), self.records)
+        self.assertEqual(len(f.getvalue().splitlines()), 5)
+
+    def test_iter_json_small_chunks(self):
+        """Test that iter_json reads records split across chunks"""
+        for text in (json.dumps(self.records),
+                     json.dumps(self.records, indent=4)):
+            for size in (1, 7, 1 << 16):
+                with self.subTest(size=size):
+                    f = io.StringIO(text)
+                    self.assertEqual(dict(codecs.iter_json(f, size)),
+                                     self.records)
+
+    def test_iter_json_empty(self):
+        """Test that iter_json accepts an empty object or file"""
+        self.assertEqual(list(codecs.iter_json(io.StringIO(" {} "))), [])
+        self.assertEqual(list(codecs.iter_json(io.StringIO(""))), [])
+
+    def test_iter_json_malformed(self):
+        """Test that iter_json rejects truncated input"""
+        text = json.dumps(self.records)[:-10]
+        with self.assertRaises(ValueError):
+            list(codecs.iter_json(io.StringIO(text), 8))
+
+    def test_json_chunks(self):
+        """Test that every chunk count yields all the records once"""
+        records = {"State.{}".format(i): {
+            "__class__": "State", "id": str(i), "name": "a,\n}",
+            "created_at": "2017-09-28T21:03:54.052298"} for i in range(20)}
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "file.json")
+            with open(path, "w") as f:
+                codecs.dump_json(f, records.items())
+            for count in (1, 3, 20, 100):
+                with self.subTest(count=count):
+                    chunks = codecs.json_chunks(path, count)
+                    self.assertLessEqual(len(chunks), count)
+                    found = [triple for start, end in chunks
+                             for triple in codecs.load_json_chunk(
+                                 path, start, end)]
+                    self.assertEqual([key for key, name, attrs in found],
+                                     list(records))
+            key, name, attrs = found[0]
+            self.assertEqual(name, "State")
+            self.assertNotIn("__class__", attrs)
+            self.assertEqual(attrs["created_at"],
+                             datetime(2017, 9, 28, 21, 3, 54, 52298))
+            with open(path, "w") as f:
+                json.dump(records, f)
+            self.assertIsNone(codecs.json_chunks(path, 4))
+
+    def test_load_json_chunks(self):
+        """Test that forked processes return the chunks in order and
+        pass their errors on"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "file.json")
+            with open(path, "w") as f:
+                codecs.dump_json(f, ((key, dict(record, __class__="State"))
+                                     for key, record in self.records.items()))
+            chunks = [(path, start, end)
+                      for start, end in codecs.json_chunks(path, 3)]
+            found = [key for triples in codecs.load_json_chunks(chunks, 2)
+                     for key, name, attrs in triples]
+            self.assertEqual(found, list(self.records))
+            with self.assertRaises(ValueError):
+                list(codecs.load_json_chunks([(path, 0, 10)], 2))
+
+
+class TestCompression(unittest.TestCase):
+    """Test the compressed snapshot streams"""
+    records = [("State.1", {"id": "1", "name": "Zürich"}),
+               ("City.2", {"id": "2", "name": "a" * 1000})]
+
+    def test_round_trip(self):
+        """Test every codec through every compression and level"""
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, compression in codecs.compressions.items():
+                for codec in codecs.codecs.values():
+                    for level in (None, 1):
+                        with self.subTest(compression=name,
+                                          codec=codec.name, level=level):
+                            path = os.path.join(tmp, "file." +
+                                                codecs.extension_of(
+                                                    codec, compression))
+                            with codecs.open_snapshot(path, "w", codec,
+                                                      compression, level,
+                                                      sync=True) as f:
+                                codec.dump(f, self.records)
+                            self.assertLess(os.path.getsize(path), 1000)
+                            with codecs.open_snapshot(path, "r", codec,
+                                                      compression) as f:
+                                self.assertEqual(list(codec.load(f)),
+                                                 self.records)
+
+    def test_gzip_file(self):
+        """Test that a gzip snapshot is a plain gzip file"""
+        compression = codecs.get_compression("gzip")
+        codec = codecs.get_codec("json")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "file.json.gz")
+            with codecs.open_snapshot(path, "w", codec, compression) as f:
+                codec.dump(f, self.records)
+            with gzip.open(path, "rt") as f:
+                self.assertEqual(json.load(f), dict(self.records))
+
+    def test_for_path(self):
+        """Test that codec and compression are picked by extension"""
+        self.assertIsNone(codecs.compression_for_path("file.json"))
+        self.assertIs(codecs.compression_for_path("file.pickle.gz"),
+                      codecs.compressions["gzip"])
+        self.assertIs(codecs.codec_for_path("file.pickle.gz"),
+                      codecs.codecs["pickle"])
+        self.assertIsNone(codecs.get_compression("none"))
+        with self.assertRaises(ValueError):
+            codecs.get_compression("lzma")
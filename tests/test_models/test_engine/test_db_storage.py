@@ -1,6 +1,7 @@
 #!/usr/bin/python3
 """
-Contains the TestDBStorageDocs and TestDBStorage classes
+Contains the TestDBStorageDocs, TestDBStorage, TestRowCache and
+TestDBStorageSQLite classes
 """
 
 from datetime import datetime
@@ -17,6 +18,11 @@ from models.user import User
 import json
 import os
 import pep8
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
 import unittest
 DBStorage = db_storage.DBStorage
 classes = {"Amenity": Amenity, "City": City, "Place": Place,
@@ -86,3 +92,418 @@ class TestFileStorage(unittest.TestCase):
     @unittest.skipIf(models.storage_t != 'db', "not testing db storage")
     def test_save(self):
         """Test that save properly saves objects to file.json"""
+
+
+class TestRowCache(unittest.TestCase):
+    """Test the row cache of DBStorage.get"""
+
+    def test_lru(self):
+        """Test that the least recently read row goes first"""
+        cache = db_storage.RowCache(2, 60)
+        cache.put("State.1", {"name": "a"})
+        cache.put("State.2", {"name": "b"})
+        self.assertEqual(cache.get("State.1"), {"name": "a"})
+        cache.put("State.3", {"name": "c"})
+        self.assertIsNone(cache.get("State.2"))
+        self.assertEqual(cache.get("State.3"), {"name": "c"})
+        self.assertEqual(cache.stats["cache_evictions"], 1)
+        self.assertEqual(cache.stats["cache_hits"], 2)
+        self.assertEqual(cache.stats["cache_misses"], 1)
+
+    def test_copies(self):
+        """Test that changing a row read from the cache leaves it alone"""
+        cache = db_storage.RowCache(2, 60)
+        cache.put("State.1", {"name": "a"})
+        cache.get("State.1")["name"] = "b"
+        self.assertEqual(cache.get("State.1"), {"name": "a"})
+
+    def test_ttl_and_discard(self):
+        """Test that rows expire after ttl seconds and can be dropped"""
+        cache = db_storage.RowCache(2, 0)
+        cache.put("State.1", {"name": "a"})
+        self.assertIsNone(cache.get("State.1"))
+        self.assertEqual(cache.stats["cache_expired"], 1)
+        cache = db_storage.RowCache(2, 60)
+        cache.put("State.1", {"name": "a"})
+        cache.discard(["State.1", "State.2"])
+        self.assertIsNone(cache.get("State.1"))
+        self.assertEqual(cache.stats["cache_invalidations"], 1)
+
+
+class TestDBStorageSQLite(unittest.TestCase):
+    """Test DBStorage on an SQLite file (HBNB_TYPE_STORAGE=sqlite)
+
+    The models only get their columns when the engine is picked at import
+    time, so each check runs in a fresh interpreter
+    """
+    root = os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.dirname(os.path.abspath(__file__)))))
+
+    def setUp(self):
+        """Make a scratch directory for the database"""
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the scratch directory"""
+        shutil.rmtree(self.tmp)
+
+    def run_models(self, code, **settings):
+        """Run code after importing models on the scratch database, with
+        the extra environment settings, and return what it prints"""
+        env = dict(os.environ, HBNB_TYPE_STORAGE="sqlite",
+                   HBNB_SQLITE_PATH=os.path.join(self.tmp, "hbnb.sqlite"),
+                   PYTHONPATH=self.root, **settings)
+        env.pop("HBNB_ENV", None)
+        return subprocess.check_output(
+            [sys.executable, "-c", "import models\n" + code],
+            cwd=self.tmp, env=env).decode().split()
+
+    def test_storage_type(self):
+        """Test that sqlite runs the db models on DBStorage in WAL mode"""
+        out = self.run_models(
+            "from sqlalchemy import text\n"
+            "session = models.storage._DBStorage__session\n"
+            "print(models.storage_t, type(models.storage).__name__)\n"
+            "print(session.execute(text('PRAGMA journal_mode')).scalar())\n"
+            "print(session.execute(text('PRAGMA foreign_keys')).scalar())")
+        self.assertEqual(out, ["db", "DBStorage", "wal", "1"])
+
+    def test_persists(self):
+        """Test that objects saved by one process load in the next"""
+        out = self.run_models(
+            "from models.state import State\n"
+            "from models.city import City\n"
+            "state = State(name='California')\n"
+            "models.storage.new(state)\n"
+            "models.storage.new(City(name='Fremont', state_id=state.id))\n"
+            "models.storage.save()\n"
+            "print(state.id)")
+        out = self.run_models(
+            "from models.state import State\n"
+            "state = models.storage.get(State, '{}')\n"
+            "print(state.name, [c.name for c in state.cities])\n"
+            "print(models.storage.count())".format(out[0]))
+        self.assertEqual(out, ["California", "['Fremont']", "2"])
+
+    def test_counts(self):
+        """Test that counts() is a single query, and count() and iter()
+        agree with it"""
+        out = self.run_models(
+            "from sqlalchemy import event\n"
+            "from models.city import City\n"
+            "from models.state import State\n"
+            "state = State(name='California')\n"
+            "models.storage.new(state)\n"
+            "for i in range(3):\n"
+            "    models.storage.new(City(name=str(i), state_id=state.id))\n"
+            "models.storage.save()\n"
+            "statements = []\n"
+            "event.listen(models.storage._DBStorage__engine,\n"
+            "             'before_cursor_execute',\n"
+            "             lambda *args: statements.append(args[2]))\n"
+            "counts = models.storage.counts()\n"
+            "print(len(statements), counts['City'], counts['State'],\n"
+            "      counts['User'])\n"
+            "print(models.storage.count(), models.storage.count(City),\n"
+            "      models.storage.count('State'))\n"
+            "print(len(list(models.storage.iter(City, batch_size=2))),\n"
+            "      len(list(models.storage.iter())))")
+        self.assertEqual(out, ["1", "3", "1", "0", "4", "3", "1", "3", "4"])
+
+    def test_threads(self):
+        """Test that threads save through their own sessions"""
+        out = self.run_models(
+            "import threading\n"
+            "from models.state import State\n"
+            "def work(i):\n"
+            "    for j in range(20):\n"
+            "        models.storage.new(State(name='{}.{}'.format(i, j)))\n"
+            "        models.storage.save()\n"
+            "    models.storage.close()\n"
+            "threads = [threading.Thread(target=work, args=(i,))\n"
+            "           for i in range(8)]\n"
+            "for t in threads:\n"
+            "    t.start()\n"
+            "for t in threads:\n"
+            "    t.join()\n"
+            "print(models.storage.count(State))")
+        self.assertEqual(out, ["160"])
+
+    def test_pool_settings(self):
+        """Test that the HBNB_MYSQL_POOL_* settings pick the pool and that
+        metrics() reports its checkouts and timeouts"""
+        out = self.run_models(
+            "from sqlalchemy import exc\n"
+            "from models.state import State\n"
+            "pool = models.storage._DBStorage__engine.pool\n"
+            "print(type(pool).__mro__[1].__name__, pool.size(),\n"
+            "      pool._timeout)\n"
+            "models.storage.new(State(name='California'))\n"
+            "models.storage.save()\n"
+            "held = pool.connect()\n"
+            "try:\n"
+            "    pool.connect()\n"
+            "except exc.TimeoutError:\n"
+            "    print('timeout')\n"
+            "stats = models.storage.metrics()\n"
+            "print(stats['checkout_timeouts'], stats['in_use'],\n"
+            "      stats['in_use_max'], stats['checkout_wait_max'] > 0)",
+            HBNB_MYSQL_POOL_SIZE="1", HBNB_MYSQL_POOL_MAX_OVERFLOW="0",
+            HBNB_MYSQL_POOL_TIMEOUT="0.1")
+        self.assertEqual(out, ["QueuePool", "1", "0.1", "timeout", "1",
+                               "1", "1", "True"])
+        out = self.run_models(
+            "pool = models.storage._DBStorage__engine.pool\n"
+            "print(type(pool).__mro__[1].__name__, models.storage.count())",
+            HBNB_MYSQL_POOL_CLASS="null")
+        self.assertEqual(out, ["NullPool", "1"])
+
+    def test_with_related(self):
+        """Test that with_related loads relationships in the same fixed
+        number of queries, and that to_dict() leaves them out"""
+        out = self.run_models(
+            "from sqlalchemy import event\n"
+            "from models.city import City\n"
+            "from models.place import Place\n"
+            "from models.state import State\n"
+            "from models.user import User\n"
+            "user = User(email='a@b.c', password='pwd')\n"
+            "models.storage.new(user)\n"
+            "state = State(name='California')\n"
+            "models.storage.new(state)\n"
+            "for i in range(3):\n"
+            "    city = City(name=str(i), state_id=state.id)\n"
+            "    models.storage.new(city)\n"
+            "    models.storage.new(Place(name='p', city_id=city.id,\n"
+            "                             user_id=user.id))\n"
+            "models.storage.save()\n"
+            "models.storage.close()\n"
+            "statements = []\n"
+            "event.listen(models.storage._DBStorage__engine,\n"
+            "             'before_cursor_execute',\n"
+            "             lambda *args: statements.append(args[2]))\n"
+            "state = models.storage.get(State, state.id,\n"
+            "                           with_related='cities.places')\n"
+            "print(len([p for c in state.cities for p in c.places]),\n"
+            "      len(statements), 'cities' in state.to_dict())\n"
+            "models.storage.close()\n"
+            "del statements[:]\n"
+            "places = models.storage.all(Place, with_related=True)\n"
+            "print(len({p.user.id for p in places.values()}),\n"
+            "      len(statements))\n"
+            "try:\n"
+            "    models.storage.all(State, with_related='places')\n"
+            "except ValueError as e:\n"
+            "    print('ValueError')")
+        self.assertEqual(out, ["3", "3", "False", "1", "3", "ValueError"])
+
+    def test_get_cache(self):
+        """Test that get() reads the identity map, then the row cache, and
+        that new(), save() and delete() invalidate the cache"""
+        out = self.run_models(
+            "from sqlalchemy import event\n"
+            "from models.state import State\n"
+            "storage = models.storage\n"
+            "state = State(name='California')\n"
+            "storage.new(state)\n"
+            "storage.save()\n"
+            "storage.close()\n"
+            "statements = []\n"
+            "event.listen(storage._DBStorage__engine,\n"
+            "             'before_cursor_execute',\n"
+            "             lambda *args: statements.append(args[2]))\n"
+            "a = storage.get(State, state.id)\n"
+            "print(a is storage.get(State, state.id), len(statements))\n"
+            "storage.close()\n"
+            "a = storage.get('State', state.id)\n"
+            "print(a.name, len(statements))\n"
+            "a.name = 'Nevada'\n"
+            "storage.save()\n"
+            "storage.close()\n"
+            "print(storage.get(State, state.id).name)\n"
+            "storage.close()\n"
+            "storage.delete(storage.get(State, state.id))\n"
+            "storage.save()\n"
+            "storage.close()\n"
+            "print(storage.get(State, state.id))\n"
+            "stats = storage.metrics()\n"
+            "print(stats['identity_map_hits'], stats['cache_hits'],\n"
+            "     stats['cache_misses'], stats['cache_invalidations'])",
+            HBNB_DB_CACHE_SIZE="10")
+        self.assertEqual(out, ["True", "1", "California", "1", "Nevada",
+                               "None", "1", "2", "3", "2"])
+
+    def test_get_unmapped(self):
+        """Test that get() returns None for a class that has no table, as
+        the console's show BaseModel <id> asks"""
+        out = self.run_models(
+            "from models.base_model import BaseModel\n"
+            "print(models.storage.get(BaseModel, 'x'),\n"
+            "      models.storage.get('BaseModel', 'x'),\n"
+            "      models.storage.get(int, 'x'))")
+        self.assertEqual(out, ["None", "None", "None"])
+
+    def test_transaction_per_thread(self):
+        """Test that a transaction() only holds back the saves of its own
+        thread, and that it still rolls back on errors"""
+        out = self.run_models(
+            "import threading\n"
+            "from models.state import State\n"
+            "storage = models.storage\n"
+            "def other():\n"
+            "    storage.new(State(name='Oregon'))\n"
+            "    storage.save()\n"
+            "    storage.close()\n"
+            "with storage.transaction():\n"
+            "    worker = threading.Thread(target=other)\n"
+            "    worker.start()\n"
+            "    worker.join()\n"
+            "    storage.new(State(name='Idaho'))\n"
+            "    storage.save()\n"
+            "storage.close()\n"
+            "print(storage.count(State))\n"
+            "try:\n"
+            "    with storage.transaction():\n"
+            "        storage.new(State(name='Utah'))\n"
+            "        storage.save()\n"
+            "        raise KeyError('boom')\n"
+            "except KeyError:\n"
+            "    pass\n"
+            "storage.close()\n"
+            "print(storage.count(State))")
+        self.assertEqual(out, ["2", "2"])
+
+    def copy_to_replicas(self, count):
+        """Copy the scratch database to count replica files, standing in
+        for replication, and return their paths"""
+        paths = [os.path.join(self.tmp, "replica{}.sqlite".format(i))
+                 for i in range(count)]
+        primary = sqlite3.connect(os.path.join(self.tmp, "hbnb.sqlite"))
+        for path in paths:
+            replica = sqlite3.connect(path)
+            primary.backup(replica)
+            replica.close()
+        primary.close()
+        return paths
+
+    def test_replicas(self):
+        """Test that reads go to the replicas in turn, except inside a
+        transaction, after a write and within the staleness window"""
+        self.run_models("from models.state import State\n"
+                        "models.storage.new(State(name='California'))\n"
+                        "models.storage.save()")
+        replicas = self.copy_to_replicas(2)
+        out = self.run_models(
+            "import time\n"
+            "from models.state import State\n"
+            "storage = models.storage\n"
+            "def reads():\n"
+            "    storage.close()\n"
+            "    return [storage.count(State) for i in range(4)]\n"
+            "print(reads(), storage.metrics()['replica_reads'])\n"
+            "storage.new(State(name='Nevada'))\n"
+            "storage.save()\n"
+            "print(reads())\n"
+            "time.sleep(0.3)\n"
+            "print(reads())\n"
+            "with storage.transaction():\n"
+            "    print(storage.count(State))\n"
+            "storage.new(State(name='Oregon'))\n"
+            "print(len(storage.all(State)))\n"
+            "storage.close()\n"
+            "print(reads())",
+            HBNB_SQLITE_REPLICA_PATHS=",".join(replicas),
+            HBNB_DB_REPLICA_STALENESS="0.2")
+        self.assertEqual(out, ["[1,", "1,", "1,", "1]", "[2,", "2]",
+                               "[2,", "2,", "2,", "2]",
+                               "[1,", "1,", "1,", "1]",
+                               "2", "3", "[1,", "1,", "1,", "1]"])
+
+    def test_staleness_per_thread(self):
+        """Test that the staleness window after a write only keeps the
+        reads of the thread that wrote on the primary"""
+        self.run_models("")
+        replicas = self.copy_to_replicas(2)
+        out = self.run_models(
+            "import threading\n"
+            "from models.state import State\n"
+            "storage = models.storage\n"
+            "def reads():\n"
+            "    storage.close()\n"
+            "    return storage.count(State)\n"
+            "storage.new(State(name='Nevada'))\n"
+            "storage.save()\n"
+            "found = []\n"
+            "worker = threading.Thread(target=lambda: found.append(reads()))\n"
+            "worker.start()\n"
+            "worker.join()\n"
+            "print(reads(), found[0])",
+            HBNB_SQLITE_REPLICA_PATHS=",".join(replicas),
+            HBNB_DB_REPLICA_STALENESS="60")
+        self.assertEqual(out, ["1", "0"])
+
+    def test_bulk_staleness(self):
+        """Test that a bulk insert starts the staleness window like the
+        writes of the ORM"""
+        self.run_models("")
+        replicas = self.copy_to_replicas(2)
+        out = self.run_models(
+            "from models.state import State\n"
+            "storage = models.storage\n"
+            "storage.bulk_new([{'name': str(i)} for i in range(3)], State)\n"
+            "storage.close()\n"
+            "print(storage.count(State))",
+            HBNB_SQLITE_REPLICA_PATHS=",".join(replicas),
+            HBNB_DB_REPLICA_STALENESS="60")
+        self.assertEqual(out, ["3"])
+
+    def test_least_loaded(self):
+        """Test that least_loaded reads from the replica with the fewest
+        connections in use"""
+        self.run_models("")
+        replicas = self.copy_to_replicas(2)
+        out = self.run_models(
+            "from models.state import State\n"
+            "router = models.storage._DBStorage__router\n"
+            "held = router.replicas[0].pool.connect()\n"
+            "for i in range(3):\n"
+            "    models.storage.count(State)\n"
+            "    models.storage.close()\n"
+            "print(models.storage.metrics()['replica_reads'])",
+            HBNB_SQLITE_REPLICA_PATHS=",".join(replicas),
+            HBNB_DB_REPLICA_POLICY="least_loaded")
+        self.assertEqual(out, ["[0,", "3]"])
+
+    def test_bulk(self):
+        """Test that bulk_new() inserts each table of a chunk with one
+        statement, parents first, and bulk_upsert() updates rows"""
+        out = self.run_models(
+            "from sqlalchemy import event\n"
+            "from models.city import City\n"
+            "from models.place import Place\n"
+            "from models.state import State\n"
+            "from models.user import User\n"
+            "storage = models.storage\n"
+            "statements = []\n"
+            "event.listen(storage._DBStorage__engine,\n"
+            "             'before_cursor_execute',\n"
+            "             lambda *args: statements.append(args[2]))\n"
+            "state, user = State(name='California'), User(email='a',\n"
+            "                                             password='p')\n"
+            "city = {'__class__': 'City', 'id': 'c', 'name': 'Fremont',\n"
+            "        'state_id': state.id}\n"
+            "places = [{'__class__': 'Place', 'id': str(i), 'name': 'p',\n"
+            "           'city_id': 'c', 'user_id': user.id}\n"
+            "          for i in range(200)]\n"
+            "timings = storage.bulk_new([city] + places + [state, user])\n"
+            "print(len(timings), len(statements), storage.count(Place))\n"
+            "timings = storage.bulk_upsert(\n"
+            "    [{'id': '1', 'name': 'renamed', 'city_id': 'c',\n"
+            "      'user_id': user.id},\n"
+            "     Place(id='new', name='n', city_id='c', user_id=user.id)],\n"
+            "    Place, chunk_size=1)\n"
+            "storage.close()\n"
+            "place = storage.get(Place, '1')\n"
+            "print(len(timings), place.name, place.number_rooms,\n"
+            "      storage.count(Place))")
+        self.assertEqual(out, ["1", "4", "200", "2", "renamed", "0", "201"])
@@ -4,9 +4,10 @@ Contains the TestFileStorageDocs classes
 """
 
 from datetime import datetime
+import gzip
 import inspect
 import models
-from models.engine import file_storage
+from models.engine import codecs, file_storage
 from models.amenity import Amenity
 from models.base_model import BaseModel
 from models.city import City
@@ -15,10 +16,20 @@ from models.review import Review
 from models.state import State
 from models.user import User
 import json
+import multiprocessing
 import os
 import pep8
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
+from unittest import mock
 FileStorage = file_storage.FileStorage
+root = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
 classes = {"Amenity": Amenity, "BaseModel": BaseModel, "City": City,
            "Place": Place, "Review": Review, "State": State, "User": User}
 
@@ -167,3 +178,963 @@ class TestFileStorage(unittest.TestCase):
         self.storage.new(instance)
         self.storage.delete(instance)
         self.assertIsNone(self.storage.get(BaseModel, instance.id))
+
+    @unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+    def test_all_cls_by_class_and_name(self):
+        """Test that all(cls) accepts a class or a class name"""
+        storage = FileStorage()
+        instance = State()
+        storage.new(instance)
+        self.addCleanup(storage.delete, instance)
+        key = "State." + instance.id
+        by_cls = storage.all(State)
+        by_name = storage.all("State")
+        self.assertIn(key, by_cls)
+        self.assertEqual(by_cls, by_name)
+        self.assertNotIn(key, storage.all(City))
+        for value in by_cls.values():
+            self.assertIs(type(value), State)
+
+    @unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+    def test_count_follows_new_and_delete(self):
+        """Test that count(cls) tracks new() and delete()"""
+        storage = FileStorage()
+        before = storage.count(Amenity)
+        instance = Amenity()
+        storage.new(instance)
+        self.assertEqual(storage.count(Amenity), before + 1)
+        self.assertEqual(storage.count("Amenity"), before + 1)
+        storage.delete(instance)
+        self.assertEqual(storage.count(Amenity), before)
+        self.assertNotIn("Amenity." + instance.id, storage.all(Amenity))
+
+    @unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+    def test_index_rebuilt_when_objects_replaced(self):
+        """Test that the per-class index follows a swapped __objects"""
+        storage = FileStorage()
+        save = FileStorage._FileStorage__objects
+        instance = Review()
+        FileStorage._FileStorage__objects = {
+            "Review." + instance.id: instance}
+        try:
+            self.assertEqual(storage.count(Review), 1)
+            self.assertEqual(storage.count(User), 0)
+            self.assertEqual(list(storage.all(Review).values()), [instance])
+        finally:
+            FileStorage._FileStorage__objects = save
+        self.assertNotIn("Review." + instance.id, storage.all(Review))
+
+    @unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+    def test_get_checks_class(self):
+        """Test that get only returns an object of the requested class"""
+        storage = FileStorage()
+        instance = City()
+        storage.new(instance)
+        self.addCleanup(storage.delete, instance)
+        self.assertIs(storage.get(City, instance.id), instance)
+        self.assertIs(storage.get("City", instance.id), instance)
+        self.assertIsNone(storage.get(State, instance.id))
+        self.assertIsNone(storage.get(None, instance.id))
+
+    @unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+    def test_related_follows_foreign_keys(self):
+        """Test that related() tracks new(), attribute updates and delete()"""
+        storage = FileStorage()
+        state = State()
+        other = State()
+        city = City(state_id=state.id)
+        storage.new(city)
+        self.assertEqual(storage.related(City, "state_id", state.id), [city])
+        self.assertEqual(state.cities, [city])
+        city.state_id = other.id
+        self.assertEqual(state.cities, [])
+        self.assertEqual(other.cities, [city])
+        storage.delete(city)
+        self.assertEqual(other.cities, [])
+
+    @unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+    def test_related_properties(self):
+        """Test the City, Place and User relationship getters"""
+        storage = FileStorage()
+        user = User()
+        city = City()
+        place = Place(city_id=city.id, user_id=user.id)
+        review = Review(place_id=place.id, user_id=user.id)
+        for obj in (user, city, place, review):
+            storage.new(obj)
+        self.assertEqual(city.places, [place])
+        self.assertEqual(place.reviews, [review])
+        self.assertEqual(user.places, [place])
+        self.assertEqual(user.reviews, [review])
+        for obj in (review, place, city, user):
+            storage.delete(obj)
+
+    @unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+    def test_changed_only_once_stored(self):
+        """Test that attribute updates reach changed() only once the
+        object is stored, and that the stored flag is not an attribute"""
+        storage = FileStorage()
+        calls = []
+        storage.changed = lambda *args: calls.append(args[1])
+        saved = models.storage
+        models.storage = storage
+        try:
+            city = City(name="c")
+            city.state_id = "s"
+            self.assertEqual(calls, [])
+            storage.new(city)
+            city.state_id = "t"
+            self.assertEqual(calls, ["state_id"])
+        finally:
+            models.storage = saved
+            del storage.changed
+            storage.delete(city)
+        self.assertNotIn("_stored", city.to_dict())
+        self.assertNotIn("_stored", str(city))
+
+    def test_db_models_not_flagged(self):
+        """Test that FileStorage used on the models of DBStorage, which
+        have no stored flag, does not add one to their attributes"""
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        env = dict(os.environ, HBNB_TYPE_STORAGE="sqlite", PYTHONPATH=root)
+        out = subprocess.check_output(
+            [sys.executable, "-c",
+             "from models.engine.file_storage import FileStorage\n"
+             "from models.state import State\n"
+             "state = State(name='Idaho')\n"
+             "FileStorage().new(state)\n"
+             "print('_stored' in state.to_dict())"],
+            cwd=tmp, env=env)
+        self.assertEqual(out.split(), [b"False"])
+
+
+class IsolatedStorageTest(unittest.TestCase):
+    """Base for tests that need an empty FileStorage in a scratch directory
+
+    options holds FileStorage settings without their underscores
+    """
+    options = {}
+
+    def setUp(self):
+        """Point FileStorage at an empty store in a scratch directory"""
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "file.json")
+        options = {"objects": {}, "file_path": self.path, "dirty": set(),
+                   "deleted": set(), "indexed": None, "rewrite_all": False,
+                   "seen": {}, "journal_offset": 0, "raw": {},
+                   "raw_by_class": {}, "journal": False, "layout": "file",
+                   "lazy": False, "codec": codecs.get_codec("json"),
+                   "depth": 0, "pending": False, "undo": None,
+                   "write_behind": False, "requested": 0, "flushed": 0,
+                   "shared": False, "shards": 1, "compression": None,
+                   "compression_level": None}
+        options.update(self.options)
+        self.save = {}
+        for name, value in options.items():
+            attr = "_FileStorage__" + name
+            self.save[attr] = getattr(FileStorage, attr)
+            setattr(FileStorage, attr, value)
+        self.storage = FileStorage()
+
+    def tearDown(self):
+        """Restore FileStorage and remove the scratch directory"""
+        for name, value in self.save.items():
+            setattr(FileStorage, name, value)
+        shutil.rmtree(self.tmp)
+
+    def restart(self):
+        """Drop the objects in memory and reload them from disk"""
+        FileStorage._FileStorage__objects = {}
+        FileStorage._FileStorage__indexed = None
+        FileStorage._FileStorage__seen = {}
+        FileStorage._FileStorage__journal_offset = 0
+        FileStorage._FileStorage__raw = {}
+        FileStorage._FileStorage__raw_by_class = {}
+        self.storage.reload()
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageJournal(IsolatedStorageTest):
+    """Test the append-only journal mode of FileStorage"""
+    options = {"journal": True, "journal_max": 1024 * 1024}
+
+    def journal(self):
+        """Return the journal records as a list of dictionaries"""
+        with open(self.path + ".log", "r") as f:
+            return [json.loads(line) for line in f]
+
+    def test_save_appends_records(self):
+        """Test that save appends put and delete records only"""
+        state = State(name="California")
+        state.save()
+        self.assertFalse(os.path.exists(self.path))
+        self.storage.delete(state)
+        records = self.journal()
+        self.assertEqual([r["op"] for r in records], ["put", "delete"])
+        self.assertEqual(records[0]["obj"], state.to_dict())
+        self.assertEqual(records[1]["id"], state.id)
+
+    def test_reload_replays_journal(self):
+        """Test that reload applies the journal on top of the file"""
+        kept = State(name="Nevada")
+        gone = State(name="Texas")
+        kept.save()
+        gone.save()
+        self.storage.delete(gone)
+        with open(self.path + ".log", "a") as f:
+            f.write('{"op": "put", "cla')
+        self.restart()
+        self.assertEqual(list(self.storage.all(State)), ["State." + kept.id])
+        self.assertEqual(self.storage.get(State, kept.id).name, "Nevada")
+
+    def test_compaction(self):
+        """Test that a journal past its size limit is folded into the file"""
+        FileStorage._FileStorage__journal_max = 0
+        user = User(email="a@b.c")
+        user.save()
+        self.assertEqual(os.path.getsize(self.path + ".log"), 0)
+        with open(self.path, "r") as f:
+            self.assertEqual(json.load(f), {"User." + user.id:
+                                            user.to_dict()})
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageSegments(IsolatedStorageTest):
+    """Test dirty tracking and the per-class segment layout"""
+    options = {"layout": "segments"}
+
+    def segment(self, name):
+        """Return the path of a class segment file"""
+        return os.path.join(self.path + ".d", name + ".json")
+
+    def test_save_rewrites_dirty_segments_only(self):
+        """Test that save only rewrites segments with changed objects"""
+        state = State(name="Ohio")
+        user = User(email="a@b.c")
+        state.save()
+        user.save()
+        os.utime(self.segment("User"), ns=(0, 0))
+        state.name = "Iowa"
+        self.storage.save()
+        self.assertEqual(os.stat(self.segment("User")).st_mtime_ns, 0)
+        with open(self.segment("State"), "r") as f:
+            self.assertEqual(json.load(f)["State." + state.id]["name"],
+                             "Iowa")
+
+    def test_delete_rewrites_segment(self):
+        """Test that deleting the last object of a class drops its segment"""
+        amenity = Amenity(name="Wifi")
+        amenity.save()
+        self.assertTrue(os.path.exists(self.segment("Amenity")))
+        self.storage.delete(amenity)
+        self.assertFalse(os.path.exists(self.segment("Amenity")))
+
+    def test_reload_segments(self):
+        """Test that reload reads every segment back"""
+        state = State(name="Utah")
+        city = City(name="Provo", state_id=state.id)
+        state.save()
+        city.save()
+        self.restart()
+        self.assertEqual(self.storage.get(State, state.id).name, "Utah")
+        self.assertEqual([c.id for c in self.storage.get(
+            State, state.id).cities], [city.id])
+
+    def test_reload_splits_single_file(self):
+        """Test that an existing file.json is split on the next save"""
+        state = State(name="Maine")
+        with open(self.path, "w") as f:
+            json.dump({"State." + state.id: state.to_dict()}, f)
+        self.storage.reload()
+        self.storage.save()
+        with open(self.segment("State"), "r") as f:
+            self.assertIn("State." + state.id, json.load(f))
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageShards(IsolatedStorageTest):
+    """Test splitting each class segment into shards"""
+    options = {"layout": "segments", "shards": 4, "load_threads": 4}
+
+    def files(self):
+        """Return the segment file names"""
+        return sorted(os.listdir(self.path + ".d"))
+
+    def test_save_rewrites_one_shard(self):
+        """Test that a change only rewrites the shard of the object"""
+        states = [State(name=str(i)) for i in range(40)]
+        for state in states:
+            self.storage.new(state)
+        self.storage.save()
+        self.assertEqual(self.files(), ["State.{}.json".format(i)
+                                        for i in range(4)])
+        directory = self.path + ".d"
+        for name in self.files():
+            os.utime(os.path.join(directory, name), ns=(0, 0))
+        states[7].name = "changed"
+        self.storage.save()
+        touched = [name for name in self.files() if os.stat(
+            os.path.join(directory, name)).st_mtime_ns != 0]
+        self.assertEqual(touched, [file_storage.segment_of(
+            "State." + states[7].id, 4) + ".json"])
+        self.restart()
+        self.assertEqual(self.storage.count(State), 40)
+        self.assertEqual(self.storage.get(State, states[7].id).name,
+                         "changed")
+
+    def test_reshard(self):
+        """Test moving from one file to shards and between shard counts"""
+        FileStorage._FileStorage__layout = "file"
+        FileStorage._FileStorage__shards = 1
+        for i in range(30):
+            self.storage.new(User(email=str(i)))
+        self.storage.save()
+        FileStorage._FileStorage__journal = True
+        self.storage.new(User(email="30"))
+        self.storage.save()
+        self.assertTrue(os.path.exists(self.path + ".log"))
+        self.storage.reshard(3)
+        self.assertEqual(self.files(), ["User.{}.json".format(i)
+                                        for i in range(3)])
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(self.path + ".log"))
+        self.restart()
+        self.assertEqual(self.storage.count(User), 31)
+        self.storage.reshard(2)
+        self.assertEqual(self.files(), ["User.0.json", "User.1.json"])
+        self.restart()
+        self.assertEqual(self.storage.count(User), 31)
+
+    def test_shard_count_changed(self):
+        """Test that files of another shard count are rewritten on save"""
+        for i in range(30):
+            self.storage.new(User(email=str(i)))
+        self.storage.save()
+        FileStorage._FileStorage__shards = 2
+        self.restart()
+        self.assertEqual(self.storage.count(User), 30)
+        self.storage.save()
+        self.assertEqual(self.files(), ["User.0.json", "User.1.json"])
+        self.restart()
+        self.assertEqual(self.storage.count(User), 30)
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageProcesses(IsolatedStorageTest):
+    """Test decoding the snapshot in chunks across a process pool"""
+    options = {"load_processes": 3, "parallel_min": 0}
+
+    def test_reload_in_chunks(self):
+        """Test that the objects come back whole and in file order"""
+        state = State(name="California")
+        self.storage.new(state)
+        cities = [City(name=str(i), state_id=state.id) for i in range(50)]
+        for city in cities:
+            self.storage.new(city)
+        self.storage.save()
+        with mock.patch.object(file_storage, "json_chunks",
+                               wraps=codecs.json_chunks) as chunks:
+            self.restart()
+        chunks.assert_called_once_with(self.path, 12)
+        keys = ["State." + state.id] + ["City." + c.id for c in cities]
+        self.assertEqual(list(self.storage.all()), keys)
+        city = self.storage.get(City, cities[7].id)
+        self.assertIs(type(city), City)
+        self.assertEqual(city.to_dict(), cities[7].to_dict())
+        self.assertEqual(len(self.storage.related(City, "state_id",
+                                                  state.id)), 50)
+        city.name = "renamed"
+        self.storage.save()
+        self.restart()
+        self.assertEqual(self.storage.get(City, city.id).name, "renamed")
+
+    def test_reload_with_threads_running(self):
+        """Test that a reload does not fork while other threads run"""
+        for i in range(5):
+            self.storage.new(State(name=str(i)))
+        self.storage.save()
+        stop = threading.Event()
+        thread = threading.Thread(target=stop.wait)
+        thread.start()
+        try:
+            with mock.patch.object(file_storage, "json_chunks") as chunks:
+                self.restart()
+        finally:
+            stop.set()
+            thread.join()
+        chunks.assert_not_called()
+        self.assertEqual(self.storage.count(State), 5)
+
+    def test_reload_single_line(self):
+        """Test that a snapshot of one line is read in this process"""
+        state = State(name="Nevada")
+        with open(self.path, "w") as f:
+            json.dump({"State." + state.id: state.to_dict()}, f)
+        self.restart()
+        self.assertEqual(self.storage.get(State, state.id).to_dict(),
+                         state.to_dict())
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageCounts(IsolatedStorageTest):
+    """Test counts() and iter()"""
+
+    def fill(self):
+        """Save a state with three cities"""
+        state = State(name="California")
+        self.storage.new(state)
+        for i in range(3):
+            self.storage.new(City(name=str(i), state_id=state.id))
+        self.storage.save()
+
+    def test_counts(self):
+        """Test that counts() has every class, with the pending objects"""
+        self.fill()
+        self.storage.new(User(email="a@b.c"))
+        counts = self.storage.counts()
+        self.assertEqual(set(counts), set(classes))
+        self.assertEqual((counts["City"], counts["State"], counts["User"],
+                          counts["Place"]), (3, 1, 1, 0))
+
+    def test_counts_lazy(self):
+        """Test that counts() does not build undecoded records"""
+        self.fill()
+        FileStorage._FileStorage__lazy = True
+        self.restart()
+        self.assertEqual(self.storage.counts()["City"], 3)
+        self.assertEqual(self.storage._FileStorage__objects, {})
+
+    def test_iter(self):
+        """Test that iter() yields every object of cls, or of all classes"""
+        self.fill()
+        self.assertEqual(sorted(c.name for c in self.storage.iter(City)),
+                         ["0", "1", "2"])
+        self.assertEqual(len(list(self.storage.iter("State"))), 1)
+        self.assertEqual(len(list(self.storage.iter())), 4)
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageBulk(IsolatedStorageTest):
+    """Test bulk_new() and bulk_upsert()"""
+
+    def count_writes(self):
+        """Patch FileStorage to count the files it writes"""
+        write = FileStorage._FileStorage__write_records
+        patcher = mock.patch.object(FileStorage,
+                                    "_FileStorage__write_records",
+                                    autospec=True, side_effect=write)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def test_bulk_new(self):
+        """Test that instances and dicts are stored with one write and a
+        timing per chunk"""
+        writes = self.count_writes()
+        state = State(name="California")
+        items = [state, State(name="Nevada").to_dict()]
+        items += [{"name": str(i), "state_id": state.id} for i in range(3)]
+        timings = self.storage.bulk_new(iter(items), City, chunk_size=2)
+        self.assertEqual(len(timings), 3)
+        self.assertEqual(writes.call_count, 1)
+        self.restart()
+        self.assertEqual(self.storage.count(State), 2)
+        self.assertEqual(sorted(c.name for c in
+                                self.storage.get(State, state.id).cities),
+                         ["0", "1", "2"])
+
+    def test_bulk_upsert(self):
+        """Test that a dict updates the stored object with its id, keeping
+        created_at and refreshing updated_at, and others are added"""
+        state = State(name="California")
+        self.storage.bulk_new([state])
+        created, updated = state.created_at, state.updated_at
+        self.storage.bulk_upsert([{"id": state.id, "name": "Nevada",
+                                   "created_at": "2000-01-01T00:00:00.0"},
+                                  {"id": "new", "name": "Oregon"}], State)
+        self.assertIs(self.storage.get(State, state.id), state)
+        self.assertEqual(state.name, "Nevada")
+        self.assertEqual(state.created_at, created)
+        self.assertGreater(state.updated_at, updated)
+        self.restart()
+        self.assertEqual(sorted(s.name for s in
+                                self.storage.all(State).values()),
+                         ["Nevada", "Oregon"])
+
+    def test_unknown_class(self):
+        """Test that an item of an unknown class raises ValueError"""
+        with self.assertRaises(ValueError):
+            self.storage.bulk_new([{"__class__": "Nope"}])
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageReload(IsolatedStorageTest):
+    """Test that reload skips the files that did not change"""
+    options = {"stats": {"reloads": 0, "partial_reloads": 0,
+                         "reloads_avoided": 0}}
+
+    def test_reload_after_own_save_is_avoided(self):
+        """Test that reload after our own save does not parse anything"""
+        state = State(name="Idaho")
+        state.save()
+        self.storage.close()
+        self.storage.close()
+        self.assertEqual(self.storage.metrics()["reloads_avoided"], 2)
+        self.assertEqual(self.storage.metrics()["reloads"], 0)
+
+    def test_reload_picks_up_external_write(self):
+        """Test that a file rewritten by another process is read again"""
+        state = State(name="Idaho")
+        state.save()
+        other = State(name="Oregon")
+        with open(self.path + ".new", "w") as f:
+            json.dump({"State." + state.id: state.to_dict(),
+                       "State." + other.id: other.to_dict()}, f)
+        os.replace(self.path + ".new", self.path)
+        self.storage.reload()
+        self.assertEqual(self.storage.get(State, other.id).name, "Oregon")
+        self.assertEqual(self.storage.metrics()["reloads"], 1)
+
+    def test_reload_applies_journal_tail(self):
+        """Test that only records appended by another writer are replayed"""
+        FileStorage._FileStorage__journal = True
+        mine = State(name="Idaho")
+        mine.save()
+        theirs = State(name="Oregon")
+        with open(self.path + ".log", "a") as f:
+            f.write(json.dumps({"op": "put", "class": "State",
+                                "id": theirs.id,
+                                "obj": theirs.to_dict()}) + "\n")
+        mine.name = "changed in memory"
+        self.storage.reload()
+        self.assertEqual(self.storage.get(State, theirs.id).name, "Oregon")
+        self.assertEqual(mine.name, "changed in memory")
+        self.assertIs(self.storage.get(State, mine.id), mine)
+        self.assertEqual(self.storage.metrics()["partial_reloads"], 1)
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageLazy(IsolatedStorageTest):
+    """Test that lazy reload builds objects on first access only"""
+    options = {"lazy": True}
+
+    def setUp(self):
+        """Save a small graph of objects and reload it lazily"""
+        super().setUp()
+        self.state = State(name="Vermont")
+        self.city = City(name="Burlington", state_id=self.state.id)
+        self.user = User(email="a@b.c")
+        for obj in (self.state, self.city, self.user):
+            self.storage.new(obj)
+        self.storage.save()
+        self.restart()
+
+    def built(self):
+        """Return the keys that were built into objects"""
+        return set(FileStorage._FileStorage__objects)
+
+    def test_count_does_not_build(self):
+        """Test that count works on undecoded records"""
+        self.assertEqual(self.storage.count(), 3)
+        self.assertEqual(self.storage.count(State), 1)
+        self.assertEqual(self.built(), set())
+
+    def test_get_builds_one_object(self):
+        """Test that get only builds the object asked for"""
+        user = self.storage.get(User, self.user.id)
+        self.assertIsInstance(user, User)
+        self.assertEqual(user.email, "a@b.c")
+        self.assertIsInstance(user.created_at, datetime)
+        self.assertIs(self.storage.get(User, self.user.id), user)
+        self.assertEqual(self.built(), {"User." + self.user.id})
+
+    def test_related_and_all(self):
+        """Test that relationships and all(cls) build their objects"""
+        state = self.storage.get(State, self.state.id)
+        self.assertEqual([c.name for c in state.cities], ["Burlington"])
+        self.assertEqual(list(self.storage.all(User)),
+                         ["User." + self.user.id])
+        self.assertEqual(len(self.storage.all()), 3)
+        self.assertEqual(self.storage.count(), 3)
+
+    def test_save_and_delete_without_building(self):
+        """Test that records are saved and deleted without being built"""
+        self.storage.delete(self.city)
+        self.assertEqual(self.built(), set())
+        self.restart()
+        self.assertEqual(self.storage.count(City), 0)
+        self.assertEqual(self.storage.get(User, self.user.id).to_dict(),
+                         self.user.to_dict())
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageBinary(IsolatedStorageTest):
+    """Test saving and reloading with the binary codecs"""
+    def roundtrip(self, codec):
+        """Save a few objects with codec, reload them and compare"""
+        FileStorage._FileStorage__codec = codecs.get_codec(codec)
+        state = State(name="Georgia")
+        place = Place(name="Loft", number_rooms=3, latitude=1.5,
+                      amenity_ids=["a", "b"])
+        for obj in (state, place):
+            self.storage.new(obj)
+        self.storage.save()
+        self.restart()
+        for obj in (state, place):
+            loaded = self.storage.get(type(obj), obj.id)
+            self.assertIsNot(loaded, obj)
+            self.assertEqual(loaded.to_dict(), obj.to_dict())
+            self.assertEqual(loaded.created_at, obj.created_at)
+
+    def test_pickle(self):
+        """Test the pickle codec"""
+        self.roundtrip("pickle")
+
+    @unittest.skipIf(codecs.msgpack is None, "msgpack is not installed")
+    def test_msgpack(self):
+        """Test the msgpack codec"""
+        self.roundtrip("msgpack")
+
+    def test_convert(self):
+        """Test converting a JSON snapshot to pickle and back"""
+        user = User(email="a@b.c")
+        self.storage.new(user)
+        self.storage.save()
+        binary = os.path.join(self.tmp, "file.pickle")
+        back = os.path.join(self.tmp, "back.json")
+        self.assertEqual(codecs.convert(self.path, binary), 1)
+        self.assertEqual(codecs.convert(binary, back), 1)
+        with open(self.path, "r") as f, open(back, "r") as g:
+            self.assertEqual(json.load(f), json.load(g))
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageCompressed(IsolatedStorageTest):
+    """Test saving and reloading compressed snapshots"""
+    options = {"compression": codecs.get_compression("gzip")}
+
+    def setUp(self):
+        """Name the snapshot like FileStorage does for gzip"""
+        super().setUp()
+        self.path += ".gz"
+        FileStorage._FileStorage__file_path = self.path
+
+    def test_file_layout(self):
+        """Test that the snapshot is written as one gzip stream"""
+        states = [State(name=str(i)) for i in range(100)]
+        for state in states:
+            self.storage.new(state)
+        self.storage.save()
+        with gzip.open(self.path, "rt") as f:
+            self.assertEqual(len(json.load(f)), 100)
+        self.restart()
+        self.assertEqual(self.storage.get(State, states[5].id).to_dict(),
+                         states[5].to_dict())
+
+    def test_segments_layout(self):
+        """Test that segment files carry the compression extension"""
+        FileStorage._FileStorage__layout = "segments"
+        FileStorage._FileStorage__compression_level = 1
+        self.storage.new(State(name="Ohio"))
+        self.storage.new(User(email="a@b.c"))
+        self.storage.save()
+        self.assertEqual(sorted(os.listdir(self.path + ".d")),
+                         ["State.json.gz", "User.json.gz"])
+        self.restart()
+        self.assertEqual(self.storage.count(), 2)
+
+    @unittest.skipIf(codecs.zstandard is None, "zstandard is not installed")
+    def test_zstd_pickle(self):
+        """Test a zstd stream of the pickle codec"""
+        FileStorage._FileStorage__compression = codecs.get_compression(
+            "zstd")
+        FileStorage._FileStorage__codec = codecs.get_codec("pickle")
+        place = Place(name="Loft", amenity_ids=["a"])
+        self.storage.new(place)
+        self.storage.save()
+        self.restart()
+        self.assertEqual(self.storage.get(Place, place.id).to_dict(),
+                         place.to_dict())
+
+    def test_convert(self):
+        """Test converting a compressed snapshot to plain JSON and back"""
+        self.storage.new(User(email="a@b.c"))
+        self.storage.save()
+        plain = os.path.join(self.tmp, "plain.json")
+        back = os.path.join(self.tmp, "back.json.gz")
+        self.assertEqual(codecs.convert(self.path, plain), 1)
+        self.assertEqual(codecs.convert(plain, back), 1)
+        with gzip.open(self.path, "rt") as f, gzip.open(back, "rt") as g:
+            self.assertEqual(json.load(f), json.load(g))
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageTransaction(IsolatedStorageTest):
+    """Test that transaction() saves once and rolls back on errors"""
+
+    def count_writes(self):
+        """Patch FileStorage to count the files it writes"""
+        write = FileStorage._FileStorage__write_records
+        patcher = mock.patch.object(FileStorage,
+                                    "_FileStorage__write_records",
+                                    autospec=True, side_effect=write)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def test_saves_once_on_exit(self):
+        """Test that the saves of the block are merged into one write"""
+        first = State(name="Idaho")
+        first.save()
+        writes = self.count_writes()
+        with self.storage.transaction():
+            second = State(name="Oregon")
+            second.save()
+            self.storage.delete(first)
+            self.storage.save()
+            self.assertEqual(writes.call_count, 0)
+        self.assertEqual(writes.call_count, 1)
+        self.restart()
+        self.assertIsNone(self.storage.get(State, first.id))
+        self.assertEqual(self.storage.get(State, second.id).name, "Oregon")
+
+    def test_no_save_no_write(self):
+        """Test that a block that never calls save() writes nothing"""
+        writes = self.count_writes()
+        with self.storage.transaction():
+            self.storage.new(State(name="Idaho"))
+        self.assertEqual(writes.call_count, 0)
+
+    def test_nested_blocks_join(self):
+        """Test that only the outermost block saves"""
+        writes = self.count_writes()
+        with self.storage.transaction():
+            with self.storage.transaction():
+                State(name="Idaho").save()
+            self.assertEqual(writes.call_count, 0)
+        self.assertEqual(writes.call_count, 1)
+
+    def test_rollback(self):
+        """Test that an exception undoes the changes made in the block"""
+        state = State(name="Idaho")
+        city = City(name="Boise", state_id=state.id)
+        other = City(name="Reno", state_id="nevada")
+        for obj in (state, city, other):
+            self.storage.new(obj)
+        self.storage.save()
+        writes = self.count_writes()
+        with self.assertRaises(KeyError):
+            with self.storage.transaction():
+                state.name = "Oregon"
+                other.state_id = state.id
+                self.storage.delete(city)
+                self.storage.new(City(name="Portland", state_id=state.id))
+                raise KeyError("boom")
+        self.assertEqual(writes.call_count, 0)
+        self.assertEqual(state.name, "Idaho")
+        self.assertIs(self.storage.get(City, city.id), city)
+        self.assertEqual(self.storage.count(City), 2)
+        self.assertEqual(self.storage.related(City, "state_id", state.id),
+                         [city])
+        self.storage.save()
+        self.restart()
+        self.assertEqual(self.storage.get(State, state.id).name, "Idaho")
+        self.assertEqual(self.storage.count(City), 2)
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageWriteBehind(IsolatedStorageTest):
+    """Test the write-behind mode of FileStorage"""
+    options = {"write_behind": True, "flush_interval": 60,
+               "flush_threshold": 1000}
+
+    def wait_for_file(self):
+        """Wait up to 5 seconds for the flusher to write the file"""
+        deadline = time.time() + 5
+        while not os.path.exists(self.path) and time.time() < deadline:
+            time.sleep(0.01)
+        return os.path.exists(self.path)
+
+    def test_flush_merges_saves(self):
+        """Test that save() defers and flush() writes every save once"""
+        write = FileStorage._FileStorage__write_records
+        with mock.patch.object(FileStorage, "_FileStorage__write_records",
+                               autospec=True, side_effect=write) as writes:
+            states = [State(name=str(i)) for i in range(20)]
+            for state in states:
+                state.save()
+            self.assertFalse(os.path.exists(self.path))
+            self.storage.flush()
+            self.storage.flush()
+            self.assertEqual(writes.call_count, 1)
+        self.restart()
+        self.assertEqual(self.storage.count(State), 20)
+
+    def test_flush_after_interval(self):
+        """Test that the flusher writes once the interval is up"""
+        FileStorage._FileStorage__flush_interval = 0.05
+        State(name="Idaho").save()
+        self.assertTrue(self.wait_for_file())
+        os.remove(self.path)
+        State(name="Oregon").save()
+        self.assertTrue(self.wait_for_file())
+        self.restart()
+        self.assertEqual(self.storage.count(State), 2)
+
+    def test_flush_at_threshold(self):
+        """Test that enough pending changes start a flush right away"""
+        FileStorage._FileStorage__flush_threshold = 5
+        for i in range(5):
+            State(name=str(i)).save()
+        self.assertTrue(self.wait_for_file())
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageThreads(IsolatedStorageTest):
+    """Hammer the API from many threads and check the store afterwards"""
+
+    def test_api_stress(self):
+        """Test concurrent creates, updates, deletes and listings"""
+        from api.v1.app import app
+        errors = []
+        kept = []
+
+        def client():
+            """creates, renames and lists states, deleting every other"""
+            http = app.test_client()
+            try:
+                for i in range(20):
+                    r = http.post("/api/v1/states", json={"name": str(i)})
+                    id = r.get_json()["id"]
+                    r = http.put("/api/v1/states/" + id,
+                                 json={"name": "renamed"})
+                    self.assertEqual(r.status_code, 200)
+                    self.assertEqual(http.get("/api/v1/states").status_code,
+                                     200)
+                    self.assertEqual(http.get("/api/v1/stats").status_code,
+                                     200)
+                    if i % 2:
+                        r = http.delete("/api/v1/states/" + id)
+                        self.assertEqual(r.status_code, 200)
+                    else:
+                        kept.append(id)
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=client) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(self.storage.count(State), len(kept))
+        self.assertEqual(len(self.storage.all(State)), len(kept))
+        self.restart()
+        self.assertEqual(set(self.storage.all(State)),
+                         {"State." + id for id in kept})
+        for id in kept:
+            self.assertEqual(self.storage.get(State, id).name, "renamed")
+
+
+def save_states(count):
+    """Save count new states, run in a forked process"""
+    for i in range(count):
+        State(name=str(i)).save()
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageShared(IsolatedStorageTest):
+    """Test several processes sharing the same files"""
+    options = {"shared": True, "journal": True, "journal_max": 1024 * 1024,
+               "lock_file": None}
+
+    def test_concurrent_processes(self):
+        """Test that no process loses the saves of another"""
+        context = multiprocessing.get_context("fork")
+        processes = [context.Process(target=save_states, args=(25,))
+                     for _ in range(4)]
+        for process in processes:
+            process.start()
+        save_states(25)
+        for process in processes:
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+        self.storage.reload()
+        self.assertEqual(self.storage.count(State), 125)
+        self.restart()
+        self.assertEqual(self.storage.count(State), 125)
+
+    def test_catch_up_keeps_pending_changes(self):
+        """Test that a save applies the other writers' records first,
+        without letting them overwrite changes still in memory"""
+        mine = State(name="Idaho")
+        mine.save()
+        theirs = State(name="Oregon")
+        stale = dict(mine.to_dict(), name="stale")
+        with open(self.path + ".log", "a") as f:
+            for obj in (theirs.to_dict(), stale):
+                f.write(json.dumps({"op": "put", "class": "State",
+                                    "id": obj["id"], "obj": obj}) + "\n")
+        mine.name = "Utah"
+        mine.save()
+        self.assertEqual(self.storage.get(State, theirs.id).name, "Oregon")
+        self.assertEqual(self.storage.get(State, mine.id).name, "Utah")
+        self.restart()
+        self.assertEqual(self.storage.get(State, mine.id).name, "Utah")
+        self.assertEqual(self.storage.count(State), 2)
+
+    def test_saves_leave_reload_counters(self):
+        """Test that the catch-up read of a save is not counted as a
+        reload, only reload() is"""
+        before = self.storage.metrics()
+        for i in range(3):
+            State(name=str(i)).save()
+        self.assertEqual(self.storage.metrics(), before)
+        self.storage.reload()
+        after = self.storage.metrics()
+        self.assertEqual(after["reloads_avoided"],
+                         before["reloads_avoided"] + 1)
+
+    def test_catch_up_sees_compacted_deletes(self):
+        """Test that an object another process deleted, then compacted
+        the journal into the file, is dropped here and not written back"""
+        FileStorage._FileStorage__journal_max = 10
+        kept, gone = State(name="Idaho"), State(name="Oregon")
+        kept.save()
+        gone.save()
+        # the child gets none of the runner's layout or format settings
+        env = {k: v for k, v in os.environ.items()
+               if not k.startswith("HBNB_FILE_")}
+        env.pop("HBNB_TYPE_STORAGE", None)
+        env.update(HBNB_FILE_SHARED="1", HBNB_FILE_JOURNAL_MAX="10",
+                   PYTHONPATH=root)
+        subprocess.check_call(
+            [sys.executable, "-c",
+             "import sys, models\n"
+             "from models.state import State\n"
+             "models.storage.get(State, sys.argv[1]).delete()", gone.id],
+            cwd=self.tmp, env=env)
+        self.assertEqual(os.path.getsize(self.path + ".log"), 0)
+        self.storage.reload()
+        self.assertIsNone(self.storage.get(State, gone.id))
+        kept.name = "Utah"
+        kept.save()
+        self.restart()
+        self.assertIsNone(self.storage.get(State, gone.id))
+        self.assertEqual(self.storage.get(State, kept.id).name, "Utah")
+
+    def test_catch_up_sees_removed_segments(self):
+        """Test that the objects of a segment file another process
+        removed are dropped here"""
+        FileStorage._FileStorage__journal_max = 10
+        FileStorage._FileStorage__layout = "segments"
+        state, city = State(name="Idaho"), City(name="Boise")
+        state.save()
+        city.save()
+        context = multiprocessing.get_context("fork")
+        process = context.Process(target=city.delete)
+        process.start()
+        process.join()
+        self.assertEqual(process.exitcode, 0)
+        self.assertEqual(os.listdir(self.path + ".d"), ["State.json"])
+        self.storage.reload()
+        self.assertIsNone(self.storage.get(City, city.id))
+        self.assertEqual(self.storage.get(State, state.id).name, "Idaho")
@@ -0,0 +1,118 @@
+#!/usr/bin/python3
+"""
+Contains the TestLocksDocs and TestRWLock classes
+"""
+
+import inspect
+from models.engine import locks
+from models.engine.locks import RWLock
+import pep8
+import threading
+import time
+import unittest
+
+
+class TestLocksDocs(unittest.TestCase):
+    """Tests to check the documentation and style of the locks module"""
+    @classmethod
+    def setUpClass(cls):
+        """Set up for the doc tests"""
+        cls.funcs = inspect.getmembers(RWLock, inspect.isfunction)
+
+    def test_pep8_conformance_locks(self):
+        """Test that models/engine/locks.py conforms to PEP8."""
+        pep8s = pep8.StyleGuide(quiet=True)
+        result = pep8s.check_files(['models/engine/locks.py'])
+        self.assertEqual(result.total_errors, 0,
+                         "Found code style errors (and warnings).")
+
+    def test_pep8_conformance_test_locks(self):
+        """Test that tests/test_models/test_engine/test_locks.py conforms
+        to PEP8."""
+        pep8s = pep8.StyleGuide(quiet=True)
+        result = pep8s.check_files(['tests/test_models/test_engine/\
+test_locks.py'])
+        self.assertEqual(result.total_errors, 0,
+                         "Found code style errors (and warnings).")
+
+    def test_locks_module_docstring(self):
+        """Test for the locks.py module docstring"""
+        self.assertIsNot(locks.__doc__, None,
+                         "locks.py needs a docstring")
+        self.assertTrue(len(locks.__doc__) >= 1,
+                        "locks.py needs a docstring")
+
+    def test_rwlock_func_docstrings(self):
+        """Test for the presence of docstrings in RWLock methods"""
+        for func in self.funcs:
+            self.assertIsNot(func[1].__doc__, None,
+                             "{:s} needs a docstring".format(func[0]))
+            self.assertTrue(len(func[1].__doc__) >= 1,
+                            "{:s} needs a docstring".format(func[0]))
+
+
+class TestRWLock(unittest.TestCase):
+    """Test the reader/writer lock"""
+
+    def run_thread(self, target):
+        """Start target in a thread and return the thread"""
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        return thread
+
+    def test_readers_share(self):
+        """Test that a second thread reads while the first one reads"""
+        lock = RWLock()
+        entered = threading.Event()
+        with lock.read():
+            self.run_thread(lambda: lock.acquire_read() or entered.set())
+            self.assertTrue(entered.wait(2))
+
+    def test_writer_excludes_readers(self):
+        """Test that readers wait for the writer to finish"""
+        lock = RWLock()
+        events = []
+        with lock.write():
+            thread = self.run_thread(lambda: lock.acquire_read() or
+                                     events.append("read"))
+            time.sleep(0.05)
+            events.append("write done")
+        thread.join(2)
+        self.assertEqual(events, ["write done", "read"])
+
+    def test_reentrant(self):
+        """Test that the writer may write and read again"""
+        lock = RWLock()
+        with lock.write():
+            with lock.write():
+                with lock.read():
+                    pass
+        with lock.read():
+            with lock.read():
+                pass
+        with lock.write():
+            pass
+
+    def test_no_upgrade(self):
+        """Test that a reader cannot upgrade to writing"""
+        lock = RWLock()
+        with lock.read():
+            with self.assertRaises(RuntimeError):
+                lock.acquire_write()
+
+    def test_counter(self):
+        """Test that writers do not lose updates"""
+        lock = RWLock()
+        counter = [0]
+
+        def bump():
+            """increments the counter under the write lock"""
+            for _ in range(1000):
+                with lock.write():
+                    value = counter[0]
+                    time.sleep(0)
+                    counter[0] = value + 1
+        threads = [self.run_thread(bump) for _ in range(8)]
+        for thread in threads:
+            thread.join(10)
+        self.assertEqual(counter[0], 8000)
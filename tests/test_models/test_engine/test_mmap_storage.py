@@ -0,0 +1,334 @@
+#!/usr/bin/python3
+"""
+Contains the TestMmapStorageDocs and TestMmapStorage classes
+"""
+
+import inspect
+import json
+from models.city import City
+from models.engine import codecs, mmap_storage
+from models.engine.mmap_storage import MmapStorage
+from models.state import State
+import multiprocessing
+import os
+import pep8
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+
+class TestMmapStorageDocs(unittest.TestCase):
+    """Tests to check the documentation and style of MmapStorage class"""
+    @classmethod
+    def setUpClass(cls):
+        """Set up for the doc tests"""
+        cls.funcs = inspect.getmembers(MmapStorage, inspect.isfunction)
+        cls.funcs += inspect.getmembers(mmap_storage, inspect.isfunction)
+
+    def test_pep8_conformance_mmap_storage(self):
+        """Test that models/engine/mmap_storage.py conforms to PEP8."""
+        pep8s = pep8.StyleGuide(quiet=True)
+        result = pep8s.check_files(['models/engine/mmap_storage.py'])
+        self.assertEqual(result.total_errors, 0,
+                         "Found code style errors (and warnings).")
+
+    def test_pep8_conformance_test_mmap_storage(self):
+        """Test tests/test_models/test_engine/test_mmap_storage.py conforms
+        to PEP8."""
+        pep8s = pep8.StyleGuide(quiet=True)
+        result = pep8s.check_files(['tests/test_models/test_engine/\
+test_mmap_storage.py'])
+        self.assertEqual(result.total_errors, 0,
+                         "Found code style errors (and warnings).")
+
+    def test_mmap_storage_module_docstring(self):
+        """Test for the mmap_storage.py module docstring"""
+        self.assertIsNot(mmap_storage.__doc__, None,
+                         "mmap_storage.py needs a docstring")
+        self.assertTrue(len(mmap_storage.__doc__) >= 1,
+                        "mmap_storage.py needs a docstring")
+
+    def test_mmap_storage_class_docstring(self):
+        """Test for the MmapStorage class docstring"""
+        self.assertIsNot(MmapStorage.__doc__, None,
+                         "MmapStorage class needs a docstring")
+        self.assertTrue(len(MmapStorage.__doc__) >= 1,
+                        "MmapStorage class needs a docstring")
+
+    def test_mmap_storage_func_docstrings(self):
+        """Test for the presence of docstrings in MmapStorage methods"""
+        for func in self.funcs:
+            self.assertIsNot(func[1].__doc__, None,
+                             "{:s} needs a docstring".format(func[0]))
+            self.assertTrue(len(func[1].__doc__) >= 1,
+                            "{:s} needs a docstring".format(func[0]))
+
+
+class TestMmapStorage(unittest.TestCase):
+    """Test the memory-mapped storage engine"""
+
+    def setUp(self):
+        """Point MmapStorage at an empty snapshot in a scratch directory"""
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "file.mmap")
+        options = {"file_path": self.path,
+                   "import_path": os.path.join(self.tmp, "file.json"),
+                   "map": None, "count": 0, "seen": None, "objects": {},
+                   "by_class": {}, "added": set(), "dirty": set(),
+                   "deleted": set(), "by_fk": {}, "depth": 0,
+                   "pending": False, "undo": None, "lock_file": None}
+        self.save = {}
+        for name, value in options.items():
+            attr = "_MmapStorage__" + name
+            self.save[attr] = getattr(MmapStorage, attr)
+            setattr(MmapStorage, attr, value)
+        self.storage = MmapStorage()
+
+    def tearDown(self):
+        """Restore MmapStorage and remove the scratch directory"""
+        if MmapStorage._MmapStorage__map is not None:
+            MmapStorage._MmapStorage__map.close()
+        for name, value in self.save.items():
+            setattr(MmapStorage, name, value)
+        shutil.rmtree(self.tmp)
+
+    def restart(self):
+        """Forget the mapping and the objects, then map the file again"""
+        MmapStorage._MmapStorage__map.close()
+        MmapStorage._MmapStorage__map = None
+        MmapStorage._MmapStorage__seen = None
+        MmapStorage._MmapStorage__objects = {}
+        MmapStorage._MmapStorage__by_class = {}
+        self.storage.reload()
+
+    def add(self, *objs):
+        """Add objs to the storage and save it"""
+        for obj in objs:
+            self.storage.new(obj)
+        self.storage.save()
+
+    def test_get_decodes_one_record(self):
+        """Test that get() decodes the requested record only"""
+        states = [State(name="State {}".format(i)) for i in range(20)]
+        self.add(*states)
+        self.restart()
+        decoded = self.storage.metrics()["records_decoded"]
+        state = self.storage.get(State, states[7].id)
+        self.assertEqual(state.to_dict(), states[7].to_dict())
+        self.assertEqual(self.storage.metrics()["records_decoded"],
+                         decoded + 1)
+        self.assertIs(self.storage.get("State", states[7].id), state)
+        self.assertIsNone(self.storage.get(State, "missing"))
+        self.assertIsNone(self.storage.get(City, states[7].id))
+
+    def test_all_class_region(self):
+        """Test that all(cls) only decodes the records of cls"""
+        state = State(name="California")
+        cities = [City(name=str(i), state_id=state.id) for i in range(5)]
+        self.add(state, *cities)
+        self.restart()
+        decoded = self.storage.metrics()["records_decoded"]
+        self.assertEqual(set(self.storage.all(City)),
+                         {"City." + c.id for c in cities})
+        self.assertEqual(self.storage.metrics()["records_decoded"],
+                         decoded + 5)
+        self.assertEqual(len(self.storage.all()), 6)
+        self.assertEqual(self.storage.count(), 6)
+        self.assertEqual(self.storage.count(City), 5)
+
+    def test_save_keeps_untouched_records(self):
+        """Test that save rewrites changes and copies the other records"""
+        first, second = State(name="A"), State(name="B")
+        self.add(first, second)
+        self.restart()
+        obj = self.storage.get(State, first.id)
+        obj.name = "C"
+        self.storage.changed(obj, "name", "A")
+        self.storage.delete(self.storage.get(State, second.id))
+        third = State(name="D")
+        self.add(third)
+        self.assertEqual(self.storage.count(State), 2)
+        self.restart()
+        self.assertEqual(self.storage.get(State, first.id).name, "C")
+        self.assertIsNone(self.storage.get(State, second.id))
+        self.assertEqual(self.storage.get(State, third.id).name, "D")
+        self.assertEqual(self.storage.count(), 2)
+
+    def test_counts_and_iter(self):
+        """Test counts() and iter() with unsaved and deleted objects"""
+        state = State(name="California")
+        cities = [City(name=str(i), state_id=state.id) for i in range(4)]
+        self.add(state, *cities)
+        self.restart()
+        self.storage.delete(self.storage.get(City, cities[0].id))
+        added = City(name="new", state_id=state.id)
+        self.storage.new(added)
+        counts = self.storage.counts()
+        self.assertEqual((counts["City"], counts["State"], counts["User"]),
+                         (4, 1, 0))
+        self.assertEqual({c.id for c in self.storage.iter(City)},
+                         {c.id for c in cities[1:]} | {added.id})
+        self.assertEqual(len(list(self.storage.iter())), 5)
+
+    def test_bulk(self):
+        """Test that bulk_new() writes one snapshot and bulk_upsert()
+        updates the stored objects"""
+        state = State(name="California")
+        items = [state] + [{"name": str(i), "state_id": state.id}
+                           for i in range(3)]
+        with mock.patch("models.engine.mmap_storage.write_snapshot",
+                        wraps=mmap_storage.write_snapshot) as write:
+            timings = self.storage.bulk_new(items, City, chunk_size=3)
+        self.assertEqual((len(timings), write.call_count), (2, 1))
+        self.restart()
+        self.assertEqual(self.storage.count(City), 3)
+        self.storage.bulk_upsert([{"__class__": "State", "id": state.id,
+                                   "name": "Nevada",
+                                   "created_at": "2000-01-01T00:00:00.0"}])
+        self.restart()
+        stored = self.storage.get(State, state.id)
+        self.assertEqual(stored.name, "Nevada")
+        self.assertEqual(stored.created_at, state.created_at)
+        self.assertGreater(stored.updated_at, state.updated_at)
+        self.assertEqual(self.storage.count(), 4)
+
+    def test_related(self):
+        """Test related() including unsaved and deleted objects"""
+        state = State(name="California")
+        cities = [City(name=str(i), state_id=state.id) for i in range(3)]
+        other = City(name="Reno", state_id="nevada")
+        self.add(state, other, *cities)
+        self.restart()
+        found = self.storage.related(City, "state_id", state.id)
+        self.assertEqual({c.id for c in found}, {c.id for c in cities})
+        extra = City(name="4", state_id=state.id)
+        self.storage.new(extra)
+        self.storage.delete(self.storage.get(City, cities[0].id))
+        found = self.storage.related(City, "state_id", state.id)
+        self.assertEqual({c.id for c in found},
+                         {cities[1].id, cities[2].id, extra.id})
+
+    def test_imports_json_snapshot(self):
+        """Test that reload builds the snapshot from file.json"""
+        state = State(name="California")
+        with open(os.path.join(self.tmp, "file.json"), "w") as f:
+            json.dump({"State." + state.id: state.to_dict()}, f)
+        self.storage.reload()
+        self.assertTrue(os.path.exists(self.path))
+        self.assertEqual(self.storage.get(State, state.id).to_dict(),
+                         state.to_dict())
+
+    def test_imports_native_snapshot(self):
+        """Test that a snapshot with datetime values imports like one
+        with the timestamps of to_dict()"""
+        state = State(name="California")
+        path = os.path.join(self.tmp, "file.pickle")
+        MmapStorage._MmapStorage__import_path = path
+        codec = codecs.get_codec("pickle")
+        with codecs.open_snapshot(path, "w", codec) as f:
+            codec.dump(f, [("State." + state.id,
+                            codecs.native_record(state.to_dict()))])
+        self.storage.reload()
+        self.assertEqual(self.storage.get(State, state.id).to_dict(),
+                         state.to_dict())
+
+    def test_save_keeps_other_process_records(self):
+        """Test that a save does not drop what another process saved
+        since the snapshot was mapped"""
+        mine = State(name="Idaho")
+        self.add(mine)
+        theirs = State(name="Oregon")
+        context = multiprocessing.get_context("fork")
+        process = context.Process(target=self.add, args=(theirs,))
+        process.start()
+        process.join()
+        self.assertEqual(process.exitcode, 0)
+        mine.name = "Utah"
+        self.storage.changed(mine, "name", "Idaho")
+        self.storage.save()
+        self.restart()
+        self.assertEqual(self.storage.get(State, mine.id).name, "Utah")
+        self.assertEqual(self.storage.get(State, theirs.id).name, "Oregon")
+
+    def test_reload_unchanged_file(self):
+        """Test that reload keeps the mapping of an unchanged file"""
+        self.add(State(name="California"))
+        avoided = self.storage.metrics()["reloads_avoided"]
+        self.storage.reload()
+        self.assertEqual(self.storage.metrics()["reloads_avoided"],
+                         avoided + 1)
+
+    def test_transaction(self):
+        """Test that transaction() saves once and rolls back on errors"""
+        state = State(name="Idaho")
+        self.add(state)
+        remaps = self.storage.metrics()["remaps"]
+        with self.storage.transaction():
+            self.add(State(name="Oregon"))
+            self.storage.delete(state)
+        self.assertEqual(self.storage.metrics()["remaps"], remaps + 1)
+        self.assertEqual(self.storage.count(State), 1)
+        other = self.storage.all(State).popitem()[1]
+        with self.assertRaises(KeyError):
+            with self.storage.transaction():
+                other.name = "Nevada"
+                self.storage.changed(other, "name", "Oregon")
+                self.add(State(name="Utah"))
+                raise KeyError("boom")
+        self.assertEqual(other.name, "Oregon")
+        self.assertEqual(self.storage.count(State), 1)
+        self.assertEqual(self.storage.metrics()["remaps"], remaps + 1)
+
+    def test_transaction_other_threads(self):
+        """Test that the saves of another thread wait for an open
+        transaction instead of being held back or rolled back by it"""
+        theirs = State(name="Oregon")
+        worker = threading.Thread(target=self.add, args=(theirs,))
+        with self.assertRaises(KeyError):
+            with self.storage.transaction():
+                worker.start()
+                self.storage.new(State(name="Utah"))
+                raise KeyError("boom")
+        worker.join()
+        self.restart()
+        self.assertEqual([obj.id for obj in self.storage.iter(State)],
+                         [theirs.id])
+
+    def test_readers_during_remaps(self):
+        """Test that threads reading the mapping are not broken by
+        another thread saving and remapping it"""
+        states = [State(name=str(i)) for i in range(50)]
+        self.add(*states)
+        errors = []
+        done = threading.Event()
+
+        def read():
+            """reads the store until the writer is done"""
+            try:
+                while not done.is_set():
+                    for state in states[::7]:
+                        self.storage.get(State, state.id)
+                    self.storage.count(State)
+                    self.storage.all(State)
+                    list(self.storage.iter(State))
+            except Exception as e:
+                errors.append(e)
+
+        readers = [threading.Thread(target=read) for i in range(4)]
+        for reader in readers:
+            reader.start()
+        try:
+            for i in range(40):
+                self.storage.new(State(name="new {}".format(i)))
+                self.storage.save()
+                # another writer replaced the file: close() remaps it
+                os.utime(self.path, ns=(i, i))
+                self.storage.close()
+        finally:
+            done.set()
+            for reader in readers:
+                reader.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(self.storage.count(State), 90)
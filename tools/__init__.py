@@ -0,0 +1,5 @@
+#!/usr/bin/python3
+"""
+Maintenance scripts for the storage engines, run from the repository
+root with python3 -m tools.<name>
+"""
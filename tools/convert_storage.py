@@ -0,0 +1,21 @@
+#!/usr/bin/python3
+"""
+Converts a FileStorage snapshot between formats (json, pickle, msgpack)
+and compressions (.gz, .zst), each picked from the file extension; a .mmap
+destination is written as the indexed snapshot read by MmapStorage
+
+usage: python3 -m tools.convert_storage <source> <destination>
+"""
+
+from models.engine import codecs, mmap_storage
+import sys
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(__doc__.strip().splitlines()[-1])
+        sys.exit(1)
+    if sys.argv[2].endswith(".mmap"):
+        count = mmap_storage.convert(sys.argv[1], sys.argv[2])
+    else:
+        count = codecs.convert(sys.argv[1], sys.argv[2])
+    print("{} records written to {}".format(count, sys.argv[2]))
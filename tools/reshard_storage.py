@@ -0,0 +1,21 @@
+#!/usr/bin/python3
+"""
+Rewrites the FileStorage files of the current directory (file.json, its
+journal or its segment directory, per the HBNB_FILE_* settings in effect)
+as segment files with each class split into <shards> files; run the
+application with HBNB_FILE_SHARDS=<shards> afterwards
+
+usage: python3 -m tools.reshard_storage <shards>
+"""
+
+import models
+import sys
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or not sys.argv[1].isdigit() or \
+            int(sys.argv[1]) < 1:
+        print(__doc__.strip().splitlines()[-1])
+        sys.exit(1)
+    models.storage.reshard(int(sys.argv[1]))
+    print("{} objects written to {} shards per class".format(
+        models.storage.count(), sys.argv[1]))